@@ -0,0 +1,23 @@
+# Gunicorn settings, picked up automatically by: gunicorn lost_found_project.wsgi
+from decouple import config
+
+bind = config('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = config('WEB_CONCURRENCY', default=2, cast=int)
+
+# Import the app in the master and map the model weights once before forking,
+# so every worker shares the same physical copy of the parameters
+preload_app = config('AI_PRELOAD_MODEL', default=False, cast=bool)
+
+
+def post_fork(server, worker):
+    # Split the cores between the web workers for torch's threads (commands keep every core)
+    from lost_found_app.inference_backends import mark_web_worker
+
+    mark_web_worker(server.cfg.workers)
+
+
+def worker_exit(server, worker):
+    # Write classification log records still buffered in the exiting worker
+    from lost_found_app.classification_log import classification_log
+
+    classification_log.flush()
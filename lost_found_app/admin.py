@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Category, LostItem, FoundItem, Claim, Notification, AIClassificationLog
+from .models import User, Category, LostItem, FoundItem, Claim, Notification, AIClassificationLog, AIClassificationDailyRollup, ClassificationJob, PredictionCacheEntry, MatchDiscoveryCursor
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -25,10 +25,10 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(LostItem)
 class LostItemAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'category', 'ai_suggested_category', 'ai_confidence', 'status', 'lost_location', 'lost_date', 'created_at')
-    list_filter = ('status', 'category', 'lost_date', 'created_at')
+    list_display = ('title', 'user', 'category', 'ai_suggested_category', 'ai_confidence', 'ai_status', 'status', 'lost_location', 'lost_date', 'created_at')
+    list_filter = ('status', 'ai_status', 'category', 'lost_date', 'created_at')
     search_fields = ('title', 'description', 'lost_location', 'ai_suggested_category')
-    readonly_fields = ('created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions')
+    readonly_fields = ('created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_status', 'ai_image_hash', 'ai_model_version')
     list_per_page = 20
     
     fieldsets = (
@@ -36,7 +36,7 @@ class LostItemAdmin(admin.ModelAdmin):
             'fields': ('user', 'title', 'description', 'category')
         }),
         ('AI Classification', {
-            'fields': ('ai_suggested_category', 'ai_confidence', 'ai_top_predictions'),
+            'fields': ('ai_status', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_image_hash', 'ai_model_version'),
             'classes': ('collapse',)
         }),
         ('Location & Time', {
@@ -56,10 +56,10 @@ class LostItemAdmin(admin.ModelAdmin):
 
 @admin.register(FoundItem)
 class FoundItemAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'category', 'ai_suggested_category', 'ai_confidence', 'status', 'found_location', 'found_date', 'created_at')
-    list_filter = ('status', 'category', 'found_date', 'created_at')
+    list_display = ('title', 'user', 'category', 'ai_suggested_category', 'ai_confidence', 'ai_status', 'status', 'found_location', 'found_date', 'created_at')
+    list_filter = ('status', 'ai_status', 'category', 'found_date', 'created_at')
     search_fields = ('title', 'description', 'found_location', 'ai_suggested_category')
-    readonly_fields = ('created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions')
+    readonly_fields = ('created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_status', 'ai_image_hash', 'ai_model_version')
     list_per_page = 20
     
     fieldsets = (
@@ -67,7 +67,7 @@ class FoundItemAdmin(admin.ModelAdmin):
             'fields': ('user', 'title', 'description', 'category')
         }),
         ('AI Classification', {
-            'fields': ('ai_suggested_category', 'ai_confidence', 'ai_top_predictions'),
+            'fields': ('ai_status', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_image_hash', 'ai_model_version'),
             'classes': ('collapse',)
         }),
         ('Finding Details', {
@@ -124,6 +124,8 @@ class AIClassificationLogAdmin(admin.ModelAdmin):
     search_fields = ('predicted_category', 'image_path')
     readonly_fields = ('created_at',)
     list_per_page = 20
+    # COUNT(*) over the whole (large) table on every page is skipped
+    show_full_result_count = False
     
     fieldsets = (
         ('Classification Results', {
@@ -136,4 +138,33 @@ class AIClassificationLogAdmin(admin.ModelAdmin):
             'fields': ('created_at',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(AIClassificationDailyRollup)
+class AIClassificationDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'model_version', 'predicted_category', 'count', 'mean_confidence', 'latency_p50', 'latency_p95', 'latency_p99')
+    list_filter = ('model_version', 'date')
+    search_fields = ('predicted_category',)
+    readonly_fields = ('updated_at',)
+    list_per_page = 50
+
+@admin.register(ClassificationJob)
+class ClassificationJobAdmin(admin.ModelAdmin):
+    list_display = ('item_type', 'item_id', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'created_at')
+    list_filter = ('status', 'item_type', 'created_at')
+    search_fields = ('item_id', 'last_error', 'locked_by')
+    readonly_fields = ('created_at', 'updated_at', 'locked_by', 'locked_at')
+    list_per_page = 20
+
+@admin.register(PredictionCacheEntry)
+class PredictionCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'model_version', 'predicted_category', 'confidence_score', 'created_at')
+    list_filter = ('model_version', 'created_at')
+    search_fields = ('content_hash', 'predicted_category')
+    readonly_fields = ('created_at',)
+    list_per_page = 20
+
+@admin.register(MatchDiscoveryCursor)
+class MatchDiscoveryCursorAdmin(admin.ModelAdmin):
+    list_display = ('item_type', 'last_created_at', 'last_item_id', 'updated_at')
+    readonly_fields = ('updated_at',)
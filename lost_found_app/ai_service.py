@@ -1,27 +1,100 @@
-import torch
-from torchvision import models, transforms
 from PIL import Image
+import io
 import time
 import logging
 import os
+import threading
 from django.conf import settings
+from .batching import MicroBatcher
+from .embeddings import encode_embeddings
+from .inference_backends import configure_torch_threads, inference_context, prepare_input, prepare_model
+from .metrics import metrics
+from .prediction_cache import content_hash, prediction_cache
+from .preprocessing import open_image, to_model_input
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL_VERSION = getattr(settings, 'AI_MODEL_VERSION', 'resnet101')
+DEFAULT_BACKEND = getattr(settings, 'AI_INFERENCE_BACKEND', 'eager')
+# Cheapest model first, e.g. ['resnet18', 'resnet101']; empty means a single model
+MODEL_CASCADE = [m.strip() for m in getattr(settings, 'AI_MODEL_CASCADE', '').split(',') if m.strip()]
+CASCADE_THRESHOLD = getattr(settings, 'AI_CASCADE_THRESHOLD', 60.0)
+# Unix socket of manage.py run_inference_server; empty runs the model in this process
+INFERENCE_SERVER_SOCKET = getattr(settings, 'AI_INFERENCE_SERVER_SOCKET', '')
+# A remote service that could not reach the server tries again after this many seconds
+SERVER_RETRY_SECONDS = 5.0
+
+
+def _current_rss_bytes():
+    """Resident set size of this process in bytes (0 if unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:
+            return 0
+
+
 class PyTorchAIClassificationService:
-    def __init__(self):
+    def __init__(self, model_version=DEFAULT_MODEL_VERSION, backend=DEFAULT_BACKEND):
         self.model = None
         self.classes = []
         self.transform = None
         self.model_loaded = False
-        self.model_version = "resnet101"
-        self.load_model()
+        self.architecture = model_version
+        self.backend = backend
+        self.model_version = self._version_label()
+        self.load_time = 0.0
+        self.parameter_bytes = 0
+        self.rss_delta_bytes = 0
+        self.weights_source = ''
+        self.embedding_dim = 0
+        self.torch_threads = None
+        self._captured = threading.local()
+        # Bounds forward passes running at once in this process (request threads without batching)
+        self._forward_slots = threading.BoundedSemaphore(max(getattr(settings, 'AI_MAX_CONCURRENT_FORWARD', 1), 1))
+        self.batcher = None
+        max_batch_size = getattr(settings, 'AI_BATCH_MAX_SIZE', 1)
+        if max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                self._forward_batch,
+                max_batch_size=max_batch_size,
+                max_wait=getattr(settings, 'AI_BATCH_MAX_WAIT_MS', 10) / 1000.0,
+                name=f'{self.model_version}-batcher'
+            )
+        # torch is imported and the weights loaded on first use, not at construction
+        self.load_attempted = False
+        self._load_lock = threading.Lock()
+
+    def ensure_loaded(self):
+        """Load the model on first use; later calls return immediately"""
+        if not self.load_attempted:
+            with self._load_lock:
+                if not self.load_attempted:
+                    self.load_model()
+                    self.load_attempted = True
+        return self.model_loaded
     
+    def _version_label(self):
+        """Architecture plus the inference backend when it is not plain fp32 eager"""
+        if self.backend == 'eager':
+            return self.architecture
+        return f'{self.architecture}+{self.backend}'
+
     def load_model(self):
-        """Load the ResNet101 model and classes"""
+        """Load the ResNet model and classes"""
+        start_time = time.time()
+        rss_before = _current_rss_bytes()
         try:
-            # Initialize ResNet101 model (pretrained on ImageNet)
-            self.model = models.resnet101(pretrained=True)
+            from torchvision import models
+
+            self.torch_threads = configure_torch_threads()
+
+            # Initialize the torchvision model (pretrained on ImageNet)
+            self.model = self._build_model(models)
             self.model.eval()
 
             # Load ImageNet class names from txt file if available
@@ -36,107 +109,333 @@ class PyTorchAIClassificationService:
                 self.classes = ResNet101_Weights.IMAGENET1K_V2.meta["categories"]
                 logger.warning("imagenet_classes.txt not found. Using default ImageNet categories")
 
-            # Define transformations same as Streamlit version
-            self.transform = transforms.Compose([
-                transforms.Resize(256),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225]
-                )
-            ])
+            # Same Resize(256) / CenterCrop(224) / ImageNet normalisation as the Streamlit
+            # version, done as one resample plus one vectorised NumPy step
+            self.transform = to_model_input
+
+            self.parameter_bytes = sum(
+                t.numel() * t.element_size()
+                for t in list(self.model.parameters()) + list(self.model.buffers())
+            )
+
+            # Convert for the configured CPU backend; unsupported backends fall back to eager
+            calibration_inputs = self._calibration_inputs() if self.backend == 'int8_static' else None
+            self.model, self.backend = prepare_model(self.model, self.backend, calibration_inputs)
+            self.model_version = self._version_label()
+            self._attach_embedding_hook()
 
             self.model_loaded = True
-            logger.info("PyTorch AI Service (ResNet101 pretrained) initialized successfully")
+            logger.info(f"PyTorch AI Service ({self.model_version} pretrained) initialized successfully")
 
         except Exception as e:
             logger.error(f"Failed to load PyTorch model: {str(e)}")
             self.model_loaded = False
+        finally:
+            self.load_time = time.time() - start_time
+            self.rss_delta_bytes = max(_current_rss_bytes() - rss_before, 0)
+
+    def _attach_embedding_hook(self):
+        """
+        Capture the pooled penultimate features (the classifier head's input)
+        during the normal forward pass, so embeddings cost no extra model work.
+        Captured per thread because predict() may run on several request threads.
+        """
+        head = getattr(self.model, 'fc', None) or getattr(self.model, 'classifier', None)
+
+        def capture(module, inputs):
+            self._captured.features = inputs[0]
 
-    def preprocess_image(self, image_path):
-        """Preprocess image for model prediction"""
         try:
-            if isinstance(image_path, str):
-                image = Image.open(image_path)
-            else:
-                image = Image.open(image_path)
+            head.register_forward_pre_hook(capture)
+            self.embedding_dim = getattr(head, 'in_features', 0) or getattr(head[0], 'in_features', 0)
+        except Exception:
+            # Frozen TorchScript graphs have no hookable head
+            self.embedding_dim = 0
+            logger.warning(f"Image embeddings are not available for {self.model_version}")
+
+    @property
+    def embedding_service(self):
+        """Service whose pooled features are stored as item embeddings"""
+        return self
+
+    @property
+    def embedding_model_version(self):
+        return self.embedding_service.model_version
+
+    def weights_path(self):
+        """Local state_dict file for this model version"""
+        return os.path.join(str(getattr(settings, 'AI_MODEL_WEIGHTS_DIR', settings.BASE_DIR / 'ai_models')),
+                            f'{self.architecture}.pth')
+
+    def _build_model(self, models):
+        """
+        Build the network from local weights when available.
+        The state_dict is memory-mapped and assigned straight into a model
+        created on the meta device, so parameters are views of the file's
+        page cache: every worker process shares one physical copy and no
+        network access is needed.
+        """
+        import torch
+
+        builder = getattr(models, self.architecture)
+        weights_path = self.weights_path()
+
+        if os.path.exists(weights_path):
+            with torch.device('meta'):
+                model = builder(weights=None)
+            state_dict = torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
+            model.load_state_dict(state_dict, assign=True)
+            self.weights_source = f'mmap:{weights_path}'
+            return model
+
+        if not getattr(settings, 'AI_ALLOW_WEIGHT_DOWNLOAD', False):
+            raise FileNotFoundError(
+                f"No local weights at {weights_path}. "
+                f"Run 'python manage.py export_model_weights --model {self.architecture}' "
+                f"or set AI_ALLOW_WEIGHT_DOWNLOAD=True"
+            )
 
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+        self.weights_source = 'torchvision-download'
+        return builder(pretrained=True)
 
-            return image
+    def _calibration_inputs(self):
+        """Preprocessed batches of local images used to calibrate static int8 quantization"""
+        import torch
+
+        calibration_dir = str(getattr(settings, 'AI_CALIBRATION_DIR', settings.MEDIA_ROOT))
+        max_images = getattr(settings, 'AI_CALIBRATION_MAX_IMAGES', 32)
+        tensors = []
+        for root, _, files in os.walk(calibration_dir):
+            for name in sorted(files):
+                if len(tensors) >= max_images:
+                    break
+                if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    try:
+                        tensors.append(self.transform(self.preprocess_image(os.path.join(root, name))))
+                    except Exception as e:
+                        logger.warning(f"Skipping calibration image {name}: {str(e)}")
+        return [torch.stack(tensors[i:i + 8]) for i in range(0, len(tensors), 8)]
+
+    def load_info(self):
+        """Load time and memory footprint of this model"""
+        return {
+            'model_version': self.model_version,
+            'backend': self.backend,
+            'model_loaded': self.model_loaded,
+            'load_attempted': self.load_attempted,
+            'weights_source': self.weights_source,
+            'load_time': round(self.load_time, 4),
+            'parameter_memory_mb': round(self.parameter_bytes / (1024 * 1024), 2),
+            'rss_delta_mb': round(self.rss_delta_bytes / (1024 * 1024), 2),
+            'torch_threads': self.torch_threads,
+        }
+
+    def preprocess_image(self, image_path):
+        """Preprocess image for model prediction"""
+        try:
+            # JPEGs are decoded at reduced resolution, close to the 256 px the model needs
+            return open_image(image_path)
         except Exception as e:
             logger.error(f"Image preprocessing failed: {str(e)}")
             raise e
 
-    def predict(self, image):
-        """Make prediction using pretrained ResNet101"""
-        if not self.model_loaded:
-            raise Exception("Model not loaded properly")
+    def _forward_batch(self, tensors):
+        """Run a single forward pass over a list of preprocessed image tensors"""
+        import torch
 
-        try:
-            # Preprocess and batchify
-            processed_image = self.transform(image)
-            batch_t = torch.unsqueeze(processed_image, 0)
+        batch_t = prepare_input(torch.stack(tensors), self.backend)
 
-            # Predict
-            with torch.no_grad():
-                start_time = time.time()
+        with self._forward_slots, torch.no_grad():
+            self._captured.features = None
+            start_time = time.time()
+            with inference_context(self.backend):
                 out = self.model(batch_t)
-                processing_time = time.time() - start_time
+            out = out.float()
+            processing_time = time.time() - start_time
+            metrics.observe('forward', processing_time)
+            postprocess_start = time.perf_counter()
+            features = self._captured.features
+            self._captured.features = None
+            embeddings = encode_embeddings(features) if features is not None else [None] * len(tensors)
+
+            # Compute probabilities and keep the top 5 per image
+            probabilities = torch.nn.functional.softmax(out, dim=1) * 100
+            top_probs, top_indices = torch.topk(probabilities, k=min(5, probabilities.shape[1]), dim=1)
+
+        results = []
+        for probs, indices, embedding in zip(top_probs.tolist(), top_indices.tolist(), embeddings):
+            predictions = [
+                {'category': self.classes[idx], 'confidence': prob}
+                for idx, prob in zip(indices, probs)
+            ]
+            results.append((predictions, processing_time, embedding))
+        metrics.observe('postprocess', time.perf_counter() - postprocess_start)
+        return results
+
+    def predict_batch(self, images, with_embeddings=False):
+        """
+        Make predictions for several PIL images (or crops cached at ingest) in one forward pass.
+        With ``with_embeddings`` each result also carries the image's packed embedding.
+        """
+        if not self.ensure_loaded():
+            raise Exception("Model not loaded properly")
+
+        try:
+            with metrics.timer('preprocess'):
+                tensors = [self.transform(image) for image in images]
+            results = self._forward_batch(tensors)
+            return results if with_embeddings else [result[:2] for result in results]
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {str(e)}")
+            raise e
 
-                # Compute probabilities and sort
-                probabilities = torch.nn.functional.softmax(out, dim=1)[0] * 100
-                _, indices = torch.sort(out, descending=True)
-                indices = indices[0][:5]
+    def predict(self, image, with_embedding=False):
+        """Make prediction using pretrained ResNet101"""
+        if not self.ensure_loaded():
+            raise Exception("Model not loaded properly")
 
-                predictions = []
-                for idx in indices:
-                    label = self.classes[idx]
-                    prob = probabilities[idx].item()
-                    predictions.append({
-                        'category': label,
-                        'confidence': prob
-                    })
+        try:
+            with metrics.timer('preprocess'):
+                processed_image = self.transform(image)
 
-                return predictions, processing_time
+            # Concurrent callers share one batched forward pass when batching is enabled
+            if self.batcher is not None:
+                result = self.batcher.run(processed_image)
+            else:
+                result = self._forward_batch([processed_image])[0]
+            return result if with_embedding else result[:2]
 
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
             raise e
 
-    def classify_image(self, image_path):
-        """Classify image and return formatted results"""
-        if not self.model_loaded:
-            return {
-                'suggested_category': 'unknown',
-                'confidence': 0.0,
-                'top_predictions': {'predictions': []},
-                'processing_time': 0.0,
-                'error': 'Model not loaded'
-            }
+    def _predict_with_version(self, image):
+        """Predictions, processing time, the model version that produced them and the image embedding"""
+        predictions, processing_time, embedding = self.predict(image, with_embedding=True)
+        return predictions, processing_time, self.model_version, embedding
+
+    def _predict_batch_with_versions(self, images):
+        """predict_batch() with embeddings, plus the model version that answered each image"""
+        return [
+            (predictions, processing_time, self.model_version, embedding)
+            for predictions, processing_time, embedding in self.predict_batch(images, with_embeddings=True)
+        ]
+
+    def cascade_stats(self):
+        """Escalation metrics; only cascades have any"""
+        return None
+
+    def server_status(self):
+        """Health of the inference server; only remote services have one"""
+        return None
+
+    def read_image_bytes(self, image_path):
+        """Raw bytes of an image given as a path, an open file or a Django UploadedFile"""
+        if isinstance(image_path, (str, os.PathLike)):
+            with open(image_path, 'rb') as f:
+                return f.read()
+        # Upload validation may already have read the file, so rewind first
+        if hasattr(image_path, 'seek'):
+            image_path.seek(0)
+        return image_path.read()
+
+    def _classify_bytes(self, data):
+        """Decode and classify one encoded image (see _predict_with_version)"""
+        with metrics.timer('decode'):
+            image = self.preprocess_image(io.BytesIO(data))
+            image.load()
+        return self._predict_with_version(image)
+
+    def build_result(self, predictions, processing_time, answered_by, image_hash, embedding=None):
+        """classify_image result for one image's predictions"""
+        result = {
+            'suggested_category': predictions[0]['category'] if predictions else 'unknown',
+            'confidence': predictions[0]['confidence'] if predictions else 0.0,
+            'top_predictions': {
+                'predictions': predictions,
+                'count': len(predictions)
+            },
+            'processing_time': processing_time,
+            'model_version': answered_by,
+            'content_hash': image_hash
+        }
+        if embedding is not None:
+            result['embedding'] = embedding
+            result['embedding_model_version'] = self.embedding_model_version
+        return result
+
+    def classify_image(self, image_path, include_embedding=False):
+        """
+        Classify image and return formatted results.
+        With ``include_embedding`` the result also holds the packed image
+        embedding ('embedding', bytes) and 'embedding_model_version'.
+        """
+        def read():
+            data = self.read_image_bytes(image_path)
+            image_hash = content_hash(data)
+            # Stored images are logged by path, uploads by a stable content identifier
+            source = image_path if isinstance(image_path, (str, os.PathLike)) else f'sha256:{image_hash}'
+            return image_hash, source, lambda: self._classify_bytes(data)
+
+        return self._classify(read, include_embedding)
 
+    def classify_patch(self, patch, image_hash, source, include_embedding=False):
+        """
+        classify_image() of a stored image from the model input crop cached
+        at upload (image_derivatives.load_patch), without reading or decoding
+        the image. ``image_hash`` is the image's content hash (the
+        derivatives' source_hash), so both share prediction cache entries.
+        """
+        return self._classify(lambda: (image_hash, source, lambda: self._predict_with_version(patch)), include_embedding)
+
+    def _classify(self, read, include_embedding):
+        """
+        classify_image() given ``read()``, which returns the image's content
+        hash, the source to log it under and a callable running the model
+        """
+        started = time.perf_counter()
         try:
-            image = self.preprocess_image(image_path)
-            predictions, processing_time = self.predict(image)
-
-            result = {
-                'suggested_category': predictions[0]['category'] if predictions else 'unknown',
-                'confidence': predictions[0]['confidence'] if predictions else 0.0,
-                'top_predictions': {
-                    'predictions': predictions,
-                    'count': len(predictions)
-                },
-                'processing_time': processing_time,
-                'model_version': self.model_version
-            }
+            image_hash, source, predict = read()
+
+            # Loading settles the version label (backend fallback, the server's model), so
+            # results are cached and looked up under the configuration that really runs
+            if not self.ensure_loaded():
+                metrics.count('error')
+                return {
+                    'suggested_category': 'unknown',
+                    'confidence': 0.0,
+                    'top_predictions': {'predictions': []},
+                    'processing_time': 0.0,
+                    'error': 'Model not loaded'
+                }
+            model_version = self.model_version
+
+            # Unchanged images are answered from the cache without running the model
+            cached = prediction_cache.get(image_hash, model_version)
+            if cached is not None:
+                cached['cached'] = True
+                if not include_embedding:
+                    cached.pop('embedding', None)
+                    cached.pop('embedding_model_version', None)
+                metrics.count('cached')
+                return cached
 
-            self.log_classification(image_path, result)
+            predictions, processing_time, answered_by, embedding = predict()
+
+            result = self.build_result(predictions, processing_time, answered_by, image_hash, embedding)
+
+            prediction_cache.put(image_hash, model_version, result)
+            self.log_classification(source, result)
+            result['cached'] = False
+            if not include_embedding:
+                result.pop('embedding', None)
+                result.pop('embedding_model_version', None)
+            metrics.count('ok')
             return result
 
         except Exception as e:
             logger.error(f"Image classification failed: {str(e)}")
+            metrics.count('error')
             return {
                 'suggested_category': 'unknown',
                 'confidence': 0.0,
@@ -144,45 +443,426 @@ class PyTorchAIClassificationService:
                 'processing_time': 0.0,
                 'error': str(e)
             }
+        finally:
+            metrics.observe('total', time.perf_counter() - started)
 
     def log_classification(self, image_path, result):
-        """Optional: Log classification result to database"""
+        """Log the classification result (buffered and written in batches, see classification_log)"""
         try:
+            from .classification_log import classification_log
             from .models import AIClassificationLog
-            AIClassificationLog.objects.create(
+            classification_log.add(AIClassificationLog(
                 image_path=str(image_path),
                 predicted_category=result['suggested_category'],
                 confidence_score=result['confidence'],
                 top_predictions=result['top_predictions'],
                 model_version=result['model_version'],
                 processing_time=result['processing_time']
-            )
+            ))
         except Exception as e:
             logger.warning(f"Failed to log classification: {str(e)}")
 
     def real_time_classify(self, image_file):
         """Real-time classification for API endpoint"""
         try:
-            temp_path = os.path.join(settings.MEDIA_ROOT, 'temp', f'temp_{int(time.time())}.jpg')
-            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+            # Decode straight from the upload's buffer (in memory, or Django's own spooled
+            # temporary file for large uploads); nothing is written under MEDIA_ROOT
+            return self.classify_image(image_file)
+
+        except Exception as e:
+            logger.error(f"Real-time classification failed: {str(e)}")
+            raise e
+
+
+class CascadeClassificationService(PyTorchAIClassificationService):
+    """
+    Model cascade: each image goes to the cheapest stage first and is only
+    escalated to the next (larger) model while the top-1 confidence stays
+    below ``threshold`` percent. Results record which stage answered.
+    """
+    def __init__(self, stages, threshold=CASCADE_THRESHOLD):
+        self.stages = stages
+        self.threshold = threshold
+        super().__init__(stages[-1].architecture, stages[-1].backend)
+        self.batcher = None  # every stage batches on its own
+        self._stats_lock = threading.Lock()
+        self.answered_by_stage = [0] * len(stages)
+        self.stage_latency = [0.0] * len(stages)
+        self.stage_calls = [0] * len(stages)
+
+    def _version_label(self):
+        # Cache key for results of this cascade configuration
+        return '>'.join(stage.model_version for stage in self.stages) + f'@{self.threshold:g}'
+
+    def ensure_loaded(self):
+        if not self.load_attempted:
+            with self._load_lock:
+                if not self.load_attempted:
+                    for stage in self.stages:
+                        stage.ensure_loaded()
+                    # A stage that fell back to another backend changed its label
+                    self.model_version = self._version_label()
+                    final = self.stages[-1]
+                    self.classes = final.classes
+                    self.transform = final.transform
+                    self.load_time = sum(stage.load_time for stage in self.stages)
+                    self.parameter_bytes = sum(stage.parameter_bytes for stage in self.stages)
+                    self.rss_delta_bytes = sum(stage.rss_delta_bytes for stage in self.stages)
+                    self.model_loaded = all(stage.model_loaded for stage in self.stages)
+                    self.load_attempted = True
+        return self.model_loaded
+
+    def load_model(self):
+        self.ensure_loaded()
+
+    def load_info(self):
+        info = super().load_info()
+        info['stages'] = [stage.load_info() for stage in self.stages]
+        return info
+
+    def _record(self, stage_index, answered, elapsed, calls=1):
+        with self._stats_lock:
+            self.stage_calls[stage_index] += calls
+            self.stage_latency[stage_index] += elapsed
+            self.answered_by_stage[stage_index] += answered
+
+    def _confident(self, predictions):
+        return bool(predictions) and predictions[0]['confidence'] >= self.threshold
+
+    @property
+    def embedding_service(self):
+        # The first stage sees every image, so its features give one consistent embedding space
+        return self.stages[0]
+
+    def _predict_with_version(self, image):
+        if not self.ensure_loaded():
+            raise Exception("Model not loaded properly")
+
+        embedding = None
+        for index, stage in enumerate(self.stages):
+            start = time.time()
+            predictions, processing_time, stage_embedding = stage.predict(image, with_embedding=True)
+            if index == 0:
+                embedding = stage_embedding
+            final = index == len(self.stages) - 1
+            answered = final or self._confident(predictions)
+            self._record(index, int(answered), time.time() - start)
+            if answered:
+                return predictions, processing_time, stage.model_version, embedding
+
+    def predict(self, image, with_embedding=False):
+        predictions, processing_time, _, embedding = self._predict_with_version(image)
+        if with_embedding:
+            return predictions, processing_time, embedding
+        return predictions, processing_time
+
+    def predict_batch(self, images, with_embeddings=False):
+        return [
+            (predictions, processing_time, embedding) if with_embeddings else (predictions, processing_time)
+            for predictions, processing_time, _, embedding in self._predict_batch_with_versions(images)
+        ]
+
+    def _predict_batch_with_versions(self, images):
+        if not self.ensure_loaded():
+            raise Exception("Model not loaded properly")
+
+        results = [None] * len(images)
+        embeddings = [None] * len(images)
+        pending = list(range(len(images)))
+        for index, stage in enumerate(self.stages):
+            if not pending:
+                break
+            start = time.time()
+            stage_results = stage.predict_batch([images[i] for i in pending], with_embeddings=True)
+            if index == 0:
+                embeddings = [result[2] for result in stage_results]
+            final = index == len(self.stages) - 1
+            still_pending = []
+            for image_index, result in zip(pending, stage_results):
+                if final or self._confident(result[0]):
+                    results[image_index] = result[:2] + (stage.model_version,)
+                else:
+                    still_pending.append(image_index)
+            self._record(index, len(pending) - len(still_pending), time.time() - start, calls=len(pending))
+            pending = still_pending
+
+        return [result + (embedding,) for result, embedding in zip(results, embeddings)]
+
+    def cascade_stats(self):
+        with self._stats_lock:
+            total = self.stage_calls[0]
+            calls = list(self.stage_calls)
+            latency = list(self.stage_latency)
+            answered = list(self.answered_by_stage)
+
+        mean_latency = [latency[i] / calls[i] if calls[i] else 0.0 for i in range(len(calls))]
+        # Estimated cost of sending every request straight to the final model, minus what the cascade spent
+        full_cost = total * mean_latency[-1] if calls[-1] else 0.0
+        return {
+            'threshold': self.threshold,
+            'requests': total,
+            'escalation_rate': round(calls[-1] / total, 4) if total and len(calls) > 1 else 0.0,
+            'latency_saved_seconds': round(full_cost - sum(latency), 4) if calls[-1] else None,
+            'stages': [
+                {
+                    'model_version': stage.model_version,
+                    'calls': calls[i],
+                    'answered': answered[i],
+                    'mean_latency': round(mean_latency[i], 4),
+                }
+                for i, stage in enumerate(self.stages)
+            ],
+        }
+
+
+class PooledClassificationService(PyTorchAIClassificationService):
+    """
+    Same service, but forward passes run in AI_INFERENCE_POOL_SIZE dedicated
+    inference processes (see inference_pool.InferencePool). The web worker
+    only decodes and preprocesses images and never loads the weights itself.
+    """
+    def __init__(self, model_version=DEFAULT_MODEL_VERSION, backend=DEFAULT_BACKEND, pool_size=1):
+        super().__init__(model_version, backend)
+        from .inference_pool import InferencePool
+
+        self.pool = InferencePool(model_version, backend, pool_size)
+
+    def load_model(self):
+        """Start the pool and take the class names and model details from a pool process"""
+        start_time = time.time()
+        try:
+            info = self.pool.describe()
+            self.classes = info['classes']
+            self.model_version = info['model_version']
+            self.backend = info['backend']
+            self.embedding_dim = info['embedding_dim']
+            self.weights_source = info['weights_source']
+            self.parameter_bytes = info['parameter_bytes']
+            self.torch_threads = info['torch_threads']
+            self.transform = to_model_input
+            self.model_loaded = info['model_loaded']
+            logger.info(f"Inference pool for {self.model_version} ready ({self.pool.size} process(es))")
+        except Exception as e:
+            logger.error(f"Failed to start inference pool: {str(e)}")
+            self.model_loaded = False
+        finally:
+            self.load_time = time.time() - start_time
 
-            with open(temp_path, 'wb') as f:
-                for chunk in image_file.chunks():
-                    f.write(chunk)
+    def _forward_batch(self, tensors):
+        # Timed here, including the hand-over to the pool process (its own metrics stay in the pool)
+        with metrics.timer('forward'):
+            return self.pool.forward(tensors)
 
-            result = self.classify_image(temp_path)
+    def load_info(self):
+        info = super().load_info()
+        info['inference_pool_size'] = self.pool.size
+        return info
 
-            try:
-                os.remove(temp_path)
-            except:
-                pass
 
-            return result
+class RemoteClassificationService(PyTorchAIClassificationService):
+    """
+    Client of manage.py run_inference_server. Images go to the server over
+    a Unix socket (encoded bytes from classify_image, decoded pixels from
+    predict/predict_batch) and the model lives only in the server process,
+    so this process never imports torch or maps the weights. Caching and
+    classification logging still happen here.
+    """
+    def __init__(self, socket_path, timeout=30.0):
+        from .inference_server import InferenceClient
+
+        super().__init__(DEFAULT_MODEL_VERSION, DEFAULT_BACKEND)
+        self.batcher = None  # the server batches requests from every worker
+        self.socket_path = socket_path
+        self.client = InferenceClient(socket_path, timeout)
+        self.transform = to_model_input
+        self.remote_embedding_model_version = ''
+        self._last_attempt = 0.0
+
+    def ensure_loaded(self):
+        # Unlike a local model, a server that was unreachable is asked again later
+        if not self.model_loaded and time.time() - self._last_attempt >= SERVER_RETRY_SECONDS:
+            with self._load_lock:
+                if not self.model_loaded and time.time() - self._last_attempt >= SERVER_RETRY_SECONDS:
+                    self.load_model()
+                    self._last_attempt = time.time()
+                    self.load_attempted = True
+        return self.model_loaded
 
+    def load_model(self):
+        """Take the model details and class names from the server"""
+        start_time = time.time()
+        try:
+            status = self.client.status(include_classes=True)
+            self.classes = status['classes']
+            self.model_version = status['model_version']
+            self.remote_embedding_model_version = status['embedding_model_version']
+            self.embedding_dim = status['embedding_dim']
+            self.backend = status['load_info'].get('backend', self.backend)
+            self.parameter_bytes = 0  # held by the server process
+            self.model_loaded = status['model_loaded']
+            logger.info(f"Using inference server at {self.socket_path} ({self.model_version})")
         except Exception as e:
-            logger.error(f"Real-time classification failed: {str(e)}")
-            raise e
+            logger.error(f"Inference server unavailable: {str(e)}")
+            self.model_loaded = False
+        finally:
+            self.load_time = time.time() - start_time
+
+    @property
+    def embedding_model_version(self):
+        return self.remote_embedding_model_version
+
+    def _remote(self, call, *args):
+        from .inference_server import InferenceServerUnavailable
+
+        if not self.ensure_loaded():
+            raise Exception("Inference server not available")
+        try:
+            return call(*args)
+        except InferenceServerUnavailable:
+            # Re-read the server's model details once it is back (it may have been restarted with another model)
+            self.model_loaded = False
+            raise
+
+    def _classify_bytes(self, data):
+        with metrics.timer('remote'):
+            return self._remote(self.client.classify, data, True)
+
+    def _predict_with_version(self, image):
+        with metrics.timer('remote'):
+            return self._remote(self.client.classify_images, [image], True)[0]
+
+    def predict(self, image, with_embedding=False):
+        predictions, processing_time, _, embedding = self._predict_with_version(image)
+        if with_embedding:
+            return predictions, processing_time, embedding
+        return predictions, processing_time
+
+    def _predict_batch_with_versions(self, images):
+        with metrics.timer('remote'):
+            return self._remote(self.client.classify_images, images, True)
+
+    def predict_batch(self, images, with_embeddings=False):
+        with metrics.timer('remote'):
+            results = self._remote(self.client.classify_images, images, with_embeddings)
+        return [
+            (predictions, processing_time, embedding) if with_embeddings else (predictions, processing_time)
+            for predictions, processing_time, _, embedding in results
+        ]
+
+    def load_info(self):
+        info = super().load_info()
+        info['inference_server'] = self.socket_path
+        return info
+
+    def server_status(self):
+        try:
+            status = self.client.status()
+            status['reachable'] = True
+        except Exception as e:
+            status = {'reachable': False, 'error': str(e)}
+        status['socket'] = self.socket_path
+        return status
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of classification services.
+    Each model version is loaded at most once per process and the same
+    instance is shared by every caller (models, views, management commands).
+    """
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_version=DEFAULT_MODEL_VERSION, backend=DEFAULT_BACKEND):
+        key = (model_version, backend)
+        service = self._services.get(key)
+        if service is None:
+            with self._lock:
+                # Re-check under the lock so concurrent first callers load only once
+                service = self._services.get(key)
+                if service is None:
+                    pool_size = getattr(settings, 'AI_INFERENCE_POOL_SIZE', 0)
+                    if pool_size > 0:
+                        service = PooledClassificationService(model_version, backend, pool_size)
+                    else:
+                        service = PyTorchAIClassificationService(model_version, backend)
+                    self._services[key] = service
+        return service
+
+    def get_cascade(self, model_versions, threshold=CASCADE_THRESHOLD, backend=DEFAULT_BACKEND):
+        """Shared cascade over ``model_versions`` (cheapest first); stages come from the registry too"""
+        key = ('cascade', tuple(model_versions), threshold, backend)
+        service = self._services.get(key)
+        if service is None:
+            stages = [self.get(model_version, backend) for model_version in model_versions]
+            with self._lock:
+                service = self._services.get(key)
+                if service is None:
+                    service = CascadeClassificationService(stages, threshold)
+                    self._services[key] = service
+        return service
+
+    def get_remote(self, socket_path):
+        """Shared client of the inference server listening on ``socket_path``"""
+        key = ('remote', socket_path)
+        service = self._services.get(key)
+        if service is None:
+            with self._lock:
+                service = self._services.get(key)
+                if service is None:
+                    timeout = getattr(settings, 'AI_INFERENCE_SERVER_TIMEOUT', 30.0)
+                    service = RemoteClassificationService(socket_path, timeout)
+                    self._services[key] = service
+        return service
+
+    def loaded_versions(self):
+        return [service.model_version for service in list(self._services.values())]
+
+    def status(self):
+        """Load time and memory for every model loaded in this process"""
+        return {
+            'process_rss_mb': round(_current_rss_bytes() / (1024 * 1024), 2),
+            'models': [service.load_info() for service in list(self._services.values())],
+        }
+
+
+model_registry = ModelRegistry()
+
+
+def get_ai_service(model_version=None, backend=DEFAULT_BACKEND, local=False):
+    """
+    Return the shared classification service for ``model_version`` on ``backend``.
+    Without a model version this is the configured cascade (AI_MODEL_CASCADE),
+    or the single AI_MODEL_VERSION model when no cascade is configured.
+    With AI_INFERENCE_SERVER_SOCKET set, the default service is a client of
+    the inference server unless ``local`` is given (the server itself).
+    """
+    if model_version is None and INFERENCE_SERVER_SOCKET and not local:
+        return model_registry.get_remote(INFERENCE_SERVER_SOCKET)
+    if model_version is None:
+        if len(MODEL_CASCADE) > 1:
+            return model_registry.get_cascade(MODEL_CASCADE, CASCADE_THRESHOLD, backend)
+        model_version = MODEL_CASCADE[0] if MODEL_CASCADE else DEFAULT_MODEL_VERSION
+    return model_registry.get(model_version, backend)
+
+
+def warm_up(run_inference=True):
+    """
+    Opt-in hook for web workers: load the default model and run one dummy
+    prediction so the first real request does not pay for it.
+    Pass ``run_inference=False`` in a pre-fork master: the weights are
+    mapped once and inherited copy-on-write, while torch's thread pools
+    are only started in the forked workers.
+    """
+    service = get_ai_service()
+    if service.ensure_loaded() and run_inference:
+        try:
+            service.predict(Image.new('RGB', (256, 256)))
+        except Exception as e:
+            logger.warning(f"AI warm-up prediction failed: {str(e)}")
+    return service.model_loaded
 
 
-# Global instance
-pytorch_ai_service = PyTorchAIClassificationService()
+# Global instance (cheap: the model itself is loaded lazily on first classification)
+pytorch_ai_service = get_ai_service()
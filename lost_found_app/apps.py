@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class LostFoundAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lost_found_app'
+
+    def ready(self):
+        from .search import check_search_triggers
+
+        checks.register(check_search_triggers, checks.Tags.database)
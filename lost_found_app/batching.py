@@ -0,0 +1,106 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler.
+    Callers submit single items; a background thread collects pending items
+    until either ``max_batch_size`` is reached or ``max_wait`` seconds have
+    passed since the first item arrived, runs ``batch_fn`` once on the whole
+    batch and hands each caller its own result.
+    ``batch_fn`` receives a list of items and must return a list of results
+    in the same order.
+    """
+    def __init__(self, batch_fn, max_batch_size=8, max_wait=0.01, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait), 0.0)
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches_run = 0
+        self.items_processed = 0
+
+    def _ensure_worker(self):
+        # The worker thread does not survive fork(), so restart it in children
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Queue ``item`` for the next batch and return a Future for its result"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item, timeout=None):
+        """Submit ``item`` and block until its result is available"""
+        return self.submit(item).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                metrics.observe('queue_wait', started - queued_at)
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"batch_fn returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.items_processed += len(items)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+            'batches_run': self.batches_run,
+            'items_processed': self.items_processed,
+            'mean_batch_size': round(self.items_processed / self.batches_run, 2) if self.batches_run else 0.0,
+            'queue_depth': self.queue_depth(),
+        }
@@ -0,0 +1,196 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .metrics import metrics, percentiles
+
+logger = logging.getLogger(__name__)
+
+
+class ClassificationLogBuffer:
+    """
+    In-memory buffer of AIClassificationLog rows, written with one
+    bulk_create once AI_LOG_BUFFER_SIZE records are waiting or the oldest
+    has waited AI_LOG_FLUSH_SECONDS. Writes happen on a background thread,
+    never in the request; the buffer is also flushed at interpreter exit and
+    by gunicorn's worker_exit hook, so a graceful shutdown loses nothing.
+    """
+    def __init__(self, max_size=None, flush_interval=None):
+        self.max_size = max(max_size or getattr(settings, 'AI_LOG_BUFFER_SIZE', 200), 1)
+        self.flush_interval = flush_interval or getattr(settings, 'AI_LOG_FLUSH_SECONDS', 5.0)
+        # Records kept while the database is unavailable, beyond which the oldest are dropped
+        self.max_pending = self.max_size * 10
+        self._records = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.records_written = 0
+        self.records_dropped = 0
+        self.flushes = 0
+
+    def _ensure_worker(self):
+        # Like MicroBatcher, the flush thread does not survive fork(); restart it in children
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._records = []  # the parent process writes its own records
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='classification-log-writer', daemon=True)
+            self._thread.start()
+
+    def add(self, record):
+        """Queue an unsaved AIClassificationLog instance"""
+        self._ensure_worker()
+        with self._lock:
+            self._records.append(record)
+            full = len(self._records) >= self.max_size
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+    def flush(self):
+        """Write every buffered record now; returns how many were written"""
+        from .models import AIClassificationLog
+
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+            if not records:
+                return 0
+            try:
+                with metrics.timer('log_write'):
+                    AIClassificationLog.objects.bulk_create(records, batch_size=500)
+            except Exception as e:
+                logger.warning(f"Failed to write {len(records)} classification log record(s): {str(e)}")
+                with self._lock:
+                    self._records = records + self._records
+                    overflow = len(self._records) - self.max_pending
+                    if overflow > 0:
+                        del self._records[:overflow]
+                        self.records_dropped += overflow
+                return 0
+            self.records_written += len(records)
+            self.flushes += 1
+            return len(records)
+
+    def stats(self):
+        return {
+            'buffered': len(self._records),
+            'max_size': self.max_size,
+            'flush_interval_seconds': self.flush_interval,
+            'records_written': self.records_written,
+            'records_dropped': self.records_dropped,
+            'flushes': self.flushes,
+        }
+
+
+classification_log = ClassificationLogBuffer()
+atexit.register(classification_log.flush)
+
+
+def _day_bounds(day):
+    """[start, end) of a local calendar day as datetimes comparable with created_at"""
+    start = datetime.combine(day, datetime.min.time())
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start, start + timedelta(days=1)
+
+
+def rollup_day(day):
+    """
+    Recompute the AIClassificationDailyRollup rows of ``day`` from the raw
+    log (per model_version and category: count, mean confidence and
+    p50/p95/p99 latency). Returns the number of rollup rows written.
+    """
+    from .models import AIClassificationDailyRollup, AIClassificationLog
+
+    start, end = _day_bounds(day)
+    groups = defaultdict(lambda: ([], []))
+    rows = AIClassificationLog.objects.filter(created_at__gte=start, created_at__lt=end).values_list(
+        'model_version', 'predicted_category', 'confidence_score', 'processing_time'
+    )
+    for model_version, category, confidence, latency in rows.iterator(chunk_size=2000):
+        confidences, latencies = groups[(model_version, category)]
+        confidences.append(confidence)
+        latencies.append(latency)
+
+    rollups = []
+    for (model_version, category), (confidences, latencies) in groups.items():
+        latency = percentiles(latencies)
+        rollups.append(AIClassificationDailyRollup(
+            date=day,
+            model_version=model_version,
+            predicted_category=category,
+            count=len(confidences),
+            mean_confidence=sum(confidences) / len(confidences),
+            latency_p50=latency[50],
+            latency_p95=latency[95],
+            latency_p99=latency[99],
+        ))
+    with transaction.atomic():
+        AIClassificationDailyRollup.objects.filter(date=day).delete()
+        AIClassificationDailyRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
+
+
+def archive_day(day, directory):
+    """
+    Move the raw log rows of ``day`` to ``directory`` as gzipped NDJSON.
+    The file is complete and synced before any row is deleted, and the
+    rows of a day are deleted in one transaction, so a day is always either
+    fully in the table or fully archived. Returns ``(rows, path)``.
+    """
+    from .models import AIClassificationLog
+
+    start, end = _day_bounds(day)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'ai_classification_log-{day.isoformat()}.ndjson.gz')
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(directory, f'ai_classification_log-{day.isoformat()}.{suffix}.ndjson.gz')
+
+    ids = []
+    rows = AIClassificationLog.objects.filter(created_at__gte=start, created_at__lt=end).order_by('created_at', 'id')
+    fields = ['id', 'created_at', 'image_path', 'predicted_category', 'confidence_score', 'top_predictions',
+              'model_version', 'processing_time']
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            for row in rows.values(*fields).iterator(chunk_size=2000):
+                row['id'] = str(row['id'])
+                row['created_at'] = row['created_at'].isoformat()
+                archive.write(json.dumps(row, separators=(',', ':')).encode() + b'\n')
+                ids.append(row['id'])
+        raw.flush()
+        os.fsync(raw.fileno())
+    if not ids:
+        os.remove(tmp_path)
+        return 0, None
+    os.replace(tmp_path, path)
+
+    with transaction.atomic():
+        for i in range(0, len(ids), 500):
+            AIClassificationLog.objects.filter(pk__in=ids[i:i + 500]).delete()
+    return len(ids), path
@@ -0,0 +1,54 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Claim, FoundItem, Notification, User
+
+
+def adjust_counter(model, pk, field, delta):
+    """Atomically add ``delta`` to a maintained counter column of one row (never below zero)"""
+    if delta:
+        model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _count_of(queryset, key):
+    """Correlated COUNT of ``queryset`` rows whose ``key`` is the outer row, 0 when there are none"""
+    counted = queryset.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def actual_claim_count():
+    """FoundItem.claim_count as it should be, as an expression over FoundItem rows"""
+    return _count_of(Claim.objects.all(), 'found_item')
+
+
+def actual_unread_count():
+    """User.unread_notification_count as it should be, as an expression over User rows"""
+    return _count_of(Notification.objects.filter(is_read=False), 'user')
+
+
+# Counter column -> (model, expression of its true value)
+COUNTERS = {
+    'claim_count': (FoundItem, actual_claim_count),
+    'unread_notification_count': (User, actual_unread_count),
+}
+
+
+def reconcile_counter(field, queryset=None, dry_run=False):
+    """
+    Recount the ``field`` counter (a COUNTERS key) of the rows of
+    ``queryset`` (default: all) and repair the ones that drifted.
+    Returns the number of rows whose stored value was wrong.
+    """
+    model, actual = COUNTERS[field]
+    queryset = model.objects.all() if queryset is None else queryset
+    drifted = queryset.annotate(actual=actual()).exclude(**{field: F('actual')})
+    count = drifted.count()
+    if count and not dry_run:
+        model.objects.filter(pk__in=drifted.values('pk')).update(**{field: actual()})
+    return count
+
+
+def refresh_unread_counts(user_ids):
+    """Recount the unread notifications of ``user_ids`` (after bulk inserts whose row count is unknown)"""
+    if user_ids:
+        User.objects.filter(pk__in=user_ids).update(unread_notification_count=actual_unread_count())
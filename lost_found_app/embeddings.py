@@ -0,0 +1,23 @@
+EMBEDDING_DTYPE = 'float16'
+
+
+def encode_embeddings(features):
+    """
+    L2-normalise a [batch, dim] feature tensor and pack each row into a
+    compact float16 blob (4 KB for ResNet101's 2048-d pooled features).
+    """
+    import torch
+
+    if features.is_quantized:
+        features = features.dequantize()
+    features = torch.flatten(features.float(), 1)
+    features = torch.nn.functional.normalize(features, dim=1)
+    packed = features.to(torch.float16).cpu().numpy()
+    return [row.tobytes() for row in packed]
+
+
+def decode_embedding(blob):
+    """float16 blob -> unit-length float32 NumPy vector"""
+    import numpy as np
+
+    return np.frombuffer(bytes(blob), dtype=EMBEDDING_DTYPE).astype(np.float32)
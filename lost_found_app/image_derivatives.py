@@ -0,0 +1,158 @@
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .prediction_cache import content_hash
+from .preprocessing import CROP_SIZE, model_patch, open_image
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_sizes():
+    """Longest-side pixel sizes of the thumbnails written for every item image"""
+    return sorted({int(v) for v in str(getattr(settings, 'IMAGE_THUMBNAIL_SIZES', '160,480')).split(',') if v.strip()},
+                  reverse=True)
+
+
+def thumbnail_formats():
+    """WebP for clients that take it and JPEG for the rest (JPEG only if Pillow lacks WebP)"""
+    return ['webp', 'jpeg'] if features.check('webp') else ['jpeg']
+
+
+def normalise_master(upload):
+    """
+    Re-encode an uploaded image as the stored master: EXIF orientation
+    applied, all metadata (EXIF/GPS, comments) dropped and the longest side
+    capped at IMAGE_MASTER_MAX_SIDE. Photos become JPEG; images with
+    transparency stay PNG. Returns ``(ContentFile, bytes)``.
+    """
+    max_side = getattr(settings, 'IMAGE_MASTER_MAX_SIDE', 2048)
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.format == 'JPEG':
+        # DCT-scaled decode when the photo is at least twice the cap
+        image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image, image_format, extension, options = image.convert('RGBA'), 'PNG', 'png', {'optimize': True}
+    else:
+        image, image_format, extension = image.convert('RGB'), 'JPEG', 'jpg'
+        options = {'quality': getattr(settings, 'IMAGE_MASTER_QUALITY', 88), 'optimize': True, 'progressive': True}
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    data = buffer.getvalue()
+    name = f'{os.path.splitext(os.path.basename(upload.name or "image"))[0]}.{extension}'
+    return ContentFile(data, name=name), data
+
+
+def write_derivatives(data, directory):
+    """
+    Write the thumbnails and the model's input crop for master image bytes
+    ``data`` under ``directory``. Returns the ``image_derivatives`` dict:
+    ``{'source_hash', 'thumbnails': {size: {format: path}}, 'patch'}``.
+    """
+    source_hash = content_hash(data)
+    base = f'{directory}/{source_hash[:16]}'
+    derivatives = {'source_hash': source_hash, 'thumbnails': {}, 'patch': ''}
+
+    image = Image.open(io.BytesIO(data))
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    source = image
+    for size in thumbnail_sizes():
+        # Each thumbnail is scaled down from the previous (larger) one
+        thumbnail = source.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        source = thumbnail
+        for image_format in thumbnail_formats():
+            buffer = io.BytesIO()
+            if image_format == 'webp':
+                thumbnail.save(buffer, 'WEBP', quality=75, method=4)
+            else:
+                thumbnail.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True)
+            path = default_storage.save(f'{base}_{size}.{image_format}', ContentFile(buffer.getvalue()))
+            derivatives['thumbnails'].setdefault(str(size), {})[image_format] = path
+
+    # Decoded exactly like classify_image decodes the stored master, so predictions from the crop match
+    import numpy as np
+    buffer = io.BytesIO()
+    np.save(buffer, model_patch(open_image(io.BytesIO(data))))
+    derivatives['patch'] = default_storage.save(f'{base}_patch{CROP_SIZE}.npy', ContentFile(buffer.getvalue()))
+    return derivatives
+
+
+def derivative_paths(derivatives):
+    paths = [path for formats in (derivatives or {}).get('thumbnails', {}).values() for path in formats.values()]
+    if (derivatives or {}).get('patch'):
+        paths.append(derivatives['patch'])
+    return paths
+
+
+def delete_derivatives(derivatives):
+    for path in derivative_paths(derivatives):
+        try:
+            default_storage.delete(path)
+        except Exception as e:
+            logger.warning(f"Could not delete image derivative {path}: {str(e)}")
+
+
+def derivatives_directory(item):
+    """derivatives/<upload_to>/<item id>, e.g. derivatives/lost_items/<uuid>"""
+    upload_to = type(item)._meta.get_field('item_image').upload_to.strip('/')
+    return f"{getattr(settings, 'IMAGE_DERIVATIVES_DIR', 'derivatives')}/{upload_to}/{item.pk}"
+
+
+def ingest_item_image(item):
+    """
+    For a newly assigned (not yet stored) item_image: swap in the
+    normalised master and write its derivatives. Returns the derivatives
+    the item had before, which the caller deletes once the save succeeded.
+    An image Pillow cannot process is stored unchanged, without derivatives.
+    """
+    previous = item.image_derivatives
+    image_file = item.item_image
+    if not image_file:
+        item.image_derivatives = {}
+        return previous
+    if image_file._committed:
+        return {}
+    if not getattr(settings, 'IMAGE_INGEST_DERIVATIVES', True):
+        item.image_derivatives = {}
+        return previous
+
+    try:
+        master, data = normalise_master(image_file.file)
+        item.image_derivatives = write_derivatives(data, derivatives_directory(item))
+        item.item_image = master
+    except Exception as e:
+        logger.warning(f"Image ingest failed for {item.pk}, storing the upload as-is: {str(e)}")
+        item.image_derivatives = {}
+    return previous
+
+
+def load_patch(derivatives):
+    """The cached model input crop (uint8 HWC array) or None"""
+    path = (derivatives or {}).get('patch')
+    if not path:
+        return None
+    import numpy as np
+    with default_storage.open(path, 'rb') as f:
+        return np.load(f)
+
+
+def thumbnail_urls(derivatives, request=None):
+    """``{size: {format: url}}`` for an item's image_derivatives"""
+    urls = {}
+    for size, formats in (derivatives or {}).get('thumbnails', {}).items():
+        urls[size] = {}
+        for image_format, path in formats.items():
+            url = default_storage.url(path)
+            urls[size][image_format] = request.build_absolute_uri(url) if request is not None else url
+    return urls
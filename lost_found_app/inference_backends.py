@@ -0,0 +1,196 @@
+import contextlib
+import logging
+import os
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Selected with AI_INFERENCE_BACKEND and recorded in the service's model_version
+INFERENCE_BACKENDS = (
+    'eager',          # fp32 eager PyTorch (baseline)
+    'torchscript',    # traced, frozen and optimised TorchScript graph
+    'channels_last',  # fp32 eager with NHWC memory format for oneDNN convolutions
+    'int8_dynamic',   # dynamic int8 quantization of Linear layers
+    'int8_static',    # post-training static int8 quantization (ResNet family), calibrated on local images
+    'bf16',           # bfloat16 autocast on CPUs with native bf16 support
+)
+
+
+# CPU flags (x86 "flags", ARM "Features" in /proc/cpuinfo) of native bfloat16 arithmetic
+BF16_CPU_FLAGS = {'avx512_bf16', 'amx_bf16', 'bf16'}
+
+
+def _cpu_flags():
+    """Feature flags of the first CPU in /proc/cpuinfo (empty where there is none)"""
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith(('flags', 'Features')):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def bf16_supported():
+    """
+    True when the CPU has native bfloat16 instructions (AVX512-BF16 / AMX /
+    ARM BF16). AVX-512 alone is not enough: oneDNN then emulates bf16, which
+    is slower than fp32. Without /proc/cpuinfo, oneDNN's own check decides.
+    """
+    flags = _cpu_flags()
+    if flags:
+        return bool(flags & BF16_CPU_FLAGS)
+    import torch
+
+    return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+# Web worker processes sharing this machine's cores (see mark_web_worker); 1 outside gunicorn
+_web_workers = 1
+_configured_threads = None
+
+
+def web_workers():
+    return _web_workers
+
+
+def mark_web_worker(workers):
+    """
+    Declare this process one of ``workers`` web workers sharing the machine
+    (gunicorn's post_fork hook), so thread_budget() gives it its share of
+    the cores. Management commands and the inference server never call it
+    and keep every core. Threads already configured before the fork
+    (preload_app) are re-applied.
+    """
+    global _web_workers, _configured_threads
+    _web_workers = max(int(workers), 1)
+    if _configured_threads is not None:
+        _configured_threads = None
+        configure_torch_threads()
+
+
+def thread_budget():
+    """
+    ``(intra_op, inter_op)`` torch threads for one inference process.
+    An intra-op count of 0 (the default) splits the cores evenly between the
+    web workers (only inside them, see mark_web_worker) and the
+    AI_INFERENCE_POOL_SIZE pool processes each of them starts, instead of
+    every process using every core.
+    """
+    intra = getattr(settings, 'AI_TORCH_INTRA_OP_THREADS', 0)
+    inter = max(getattr(settings, 'AI_TORCH_INTER_OP_THREADS', 1), 1)
+    if intra <= 0:
+        processes = _web_workers * max(getattr(settings, 'AI_INFERENCE_POOL_SIZE', 0), 1)
+        intra = max((os.cpu_count() or 1) // processes, 1)
+    return intra, inter
+
+
+def configure_torch_threads():
+    """
+    Apply thread_budget() to this process's torch thread pools (once).
+    Returns the ``(intra_op, inter_op)`` counts in effect.
+    """
+    global _configured_threads
+    import torch
+
+    if _configured_threads is None:
+        intra, inter = thread_budget()
+        torch.set_num_threads(intra)
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError as e:
+            # Only possible before the inter-op pool has started (e.g. not after a warm-up in this process)
+            logger.warning(f"Could not set torch inter-op threads to {inter}: {str(e)}")
+        _configured_threads = (torch.get_num_threads(), torch.get_num_interop_threads())
+        logger.info(f"torch threads: {_configured_threads[0]} intra-op, {_configured_threads[1]} inter-op")
+    return _configured_threads
+
+
+def _quantize_static(model, calibration_inputs):
+    """Eager-mode post-training static quantization of a torchvision ResNet"""
+    import torch
+    from torchvision.models.resnet import ResNet, Bottleneck
+    from torchvision.models.quantization.resnet import (
+        QuantizableBasicBlock,
+        QuantizableBottleneck,
+        QuantizableResNet,
+    )
+
+    if not isinstance(model, ResNet):
+        raise ValueError(f"int8_static supports ResNet models only, not {type(model).__name__}")
+    if not calibration_inputs:
+        raise ValueError("int8_static needs calibration images (AI_CALIBRATION_DIR)")
+
+    block = QuantizableBottleneck if isinstance(model.layer1[0], Bottleneck) else QuantizableBasicBlock
+    layers = [len(model.layer1), len(model.layer2), len(model.layer3), len(model.layer4)]
+    qmodel = QuantizableResNet(
+        block, layers,
+        num_classes=model.fc.out_features,
+        groups=model.groups,
+        width_per_group=model.base_width
+    )
+    qmodel.load_state_dict(model.state_dict())
+    qmodel.eval()
+    qmodel.fuse_model(is_qat=False)
+
+    engines = torch.backends.quantized.supported_engines
+    engine = 'x86' if 'x86' in engines else ('fbgemm' if 'fbgemm' in engines else 'qnnpack')
+    torch.backends.quantized.engine = engine
+    qmodel.qconfig = torch.ao.quantization.get_default_qconfig(engine)
+    torch.ao.quantization.prepare(qmodel, inplace=True)
+    with torch.no_grad():
+        for batch in calibration_inputs:
+            qmodel(batch)
+    torch.ao.quantization.convert(qmodel, inplace=True)
+    return qmodel
+
+
+def prepare_model(model, backend, calibration_inputs=None):
+    """
+    Convert an fp32 eval-mode model for ``backend``.
+    Returns ``(model, backend)``; the backend falls back to 'eager' when the
+    requested one cannot be used on this machine or model.
+    """
+    import torch
+
+    if backend not in INFERENCE_BACKENDS:
+        logger.warning(f"Unknown inference backend '{backend}', using eager")
+        return model, 'eager'
+
+    try:
+        if backend == 'torchscript':
+            with torch.no_grad():
+                traced = torch.jit.trace(model, torch.rand(1, 3, 224, 224))
+                model = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+        elif backend == 'channels_last':
+            model = model.to(memory_format=torch.channels_last)
+        elif backend == 'int8_dynamic':
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == 'int8_static':
+            model = _quantize_static(model, calibration_inputs)
+        elif backend == 'bf16' and not bf16_supported():
+            logger.warning("bf16 autocast requested but the CPU has no native bf16 support, using eager")
+            return model, 'eager'
+    except Exception as e:
+        logger.error(f"Failed to prepare '{backend}' backend, using eager: {str(e)}")
+        return model, 'eager'
+
+    return model, backend
+
+
+def prepare_input(batch, backend):
+    """Lay out an NCHW input batch the way ``backend`` expects"""
+    if backend == 'channels_last':
+        import torch
+        return batch.contiguous(memory_format=torch.channels_last)
+    return batch
+
+
+def inference_context(backend):
+    """Autocast context for ``backend`` (a no-op for fp32/int8 backends)"""
+    if backend == 'bf16':
+        import torch
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
@@ -0,0 +1,109 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .inference_backends import web_workers
+
+logger = logging.getLogger(__name__)
+
+# The classification service of a pool process (set by _init_process)
+_service = None
+
+
+def _init_process(model_version, backend, web_workers):
+    """Pool process initializer: set up Django and load the model once"""
+    global _service
+    import django
+
+    django.setup()
+    from .ai_service import PyTorchAIClassificationService
+    from .inference_backends import mark_web_worker
+
+    if web_workers > 1:
+        # Started by a web worker: its share of the cores is split between the pool processes
+        mark_web_worker(web_workers)
+
+    _service = PyTorchAIClassificationService(model_version, backend)
+    _service.batcher = None  # batches are formed by the web worker that hands them over
+    _service.ensure_loaded()
+
+
+def _describe():
+    """What the web worker's service needs to know about the model loaded here"""
+    return {
+        'model_loaded': _service.model_loaded,
+        'classes': _service.classes,
+        'model_version': _service.model_version,
+        'backend': _service.backend,
+        'embedding_dim': _service.embedding_dim,
+        'weights_source': _service.weights_source,
+        'parameter_bytes': _service.parameter_bytes,
+        'torch_threads': _service.torch_threads,
+        'pid': os.getpid(),
+    }
+
+
+def _forward(arrays):
+    import torch
+
+    return _service._forward_batch([torch.from_numpy(array) for array in arrays])
+
+
+class InferencePool:
+    """
+    A fixed set of dedicated inference processes for one model.
+    Web workers send preprocessed batches (as NumPy arrays) and get the
+    predictions back, so at most ``size`` forward passes run at once however
+    many request threads are waiting. Processes are started with 'spawn'
+    (torch's thread pools do not survive fork) and a pool created before a
+    fork is replaced in the child, like MicroBatcher's thread.
+    """
+    def __init__(self, model_version, backend, size):
+        self.model_version = model_version
+        self.backend = backend
+        self.size = max(int(size), 1)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_process,
+                    initargs=(self.model_version, self.backend, web_workers()),
+                )
+                self._pid = os.getpid()
+                logger.info(f"Started {self.size} inference process(es) for {self.model_version}")
+            return self._executor
+
+    def _call(self, fn, *args):
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed): start a fresh pool for the next call
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    def describe(self):
+        return self._call(_describe)
+
+    def forward(self, tensors):
+        """Same contract as PyTorchAIClassificationService._forward_batch, run in a pool process"""
+        return self._call(_forward, [tensor.numpy() for tensor in tensors])
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,333 @@
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Wire format (all integers big-endian). A request is a header plus payload:
+#   opcode (1 byte), flags (1 byte), payload length (4 bytes)
+# and every reply is: status (1 byte), payload length (4 bytes), payload.
+REQUEST_HEADER = struct.Struct('!BBI')
+RESPONSE_HEADER = struct.Struct('!BI')
+
+OP_CLASSIFY = 1         # payload: one encoded image file (JPEG, PNG, ...)
+OP_CLASSIFY_PIXELS = 2  # payload: image count, then per image width, height, kind and raw RGB pixels
+OP_STATUS = 3           # payload: empty; reply payload is UTF-8 JSON
+
+FLAG_EMBEDDING = 1      # classify: also return each image's packed embedding
+FLAG_CLASSES = 2        # status: include the class names
+
+STATUS_OK = 0
+STATUS_ERROR = 1        # reply payload is a UTF-8 error message
+
+# Classify replies: image count, then per image
+#   processing time, prediction count, answered_by length, embedding length, answered_by,
+#   per prediction (confidence, label length, label), embedding bytes
+COUNT = struct.Struct('!H')
+PIXELS_HEADER = struct.Struct('!HHB')
+PIXELS_IMAGE = 0        # a decoded image, preprocessed by the server
+PIXELS_PATCH = 1        # a model input crop cached at ingest (model_patch), only normalised
+RESULT_HEADER = struct.Struct('!fBBI')
+PREDICTION = struct.Struct('!fB')
+
+MAX_PAYLOAD_BYTES = 64 * 1024 * 1024
+
+
+class InferenceServerError(Exception):
+    """The inference server could not classify the image"""
+
+
+class InferenceServerUnavailable(InferenceServerError):
+    """The inference server could not be reached"""
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("inference server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def encode_results(results):
+    """[(predictions, processing_time, answered_by, embedding)] -> classify reply payload"""
+    parts = [COUNT.pack(len(results))]
+    for predictions, processing_time, answered_by, embedding in results:
+        answered_by = answered_by.encode()
+        embedding = embedding or b''
+        parts.append(RESULT_HEADER.pack(processing_time, len(predictions), len(answered_by), len(embedding)))
+        parts.append(answered_by)
+        for prediction in predictions:
+            label = prediction['category'].encode()[:255]
+            parts.append(PREDICTION.pack(prediction['confidence'], len(label)))
+            parts.append(label)
+        parts.append(embedding)
+    return b''.join(parts)
+
+
+def decode_results(payload):
+    """Inverse of encode_results (embeddings are None when none were sent)"""
+    view = memoryview(payload)
+    (count,), offset = COUNT.unpack_from(view), COUNT.size
+    results = []
+    for _ in range(count):
+        processing_time, prediction_count, version_length, embedding_length = RESULT_HEADER.unpack_from(view, offset)
+        offset += RESULT_HEADER.size
+        answered_by = bytes(view[offset:offset + version_length]).decode()
+        offset += version_length
+        predictions = []
+        for _ in range(prediction_count):
+            confidence, label_length = PREDICTION.unpack_from(view, offset)
+            offset += PREDICTION.size
+            predictions.append({'category': bytes(view[offset:offset + label_length]).decode(), 'confidence': confidence})
+            offset += label_length
+        embedding = bytes(view[offset:offset + embedding_length]) or None
+        offset += embedding_length
+        results.append((predictions, processing_time, answered_by, embedding))
+    return results
+
+
+def encode_pixels(images):
+    """
+    PIL images or cached uint8 crops -> OP_CLASSIFY_PIXELS payload
+    (already decoded images are not re-encoded)
+    """
+    parts = [COUNT.pack(len(images))]
+    for image in images:
+        if hasattr(image, 'dtype'):
+            height, width = image.shape[:2]
+            parts.append(PIXELS_HEADER.pack(width, height, PIXELS_PATCH))
+            parts.append(image.tobytes())
+            continue
+        image = image.convert('RGB')
+        parts.append(PIXELS_HEADER.pack(image.width, image.height, PIXELS_IMAGE))
+        parts.append(image.tobytes())
+    return b''.join(parts)
+
+
+def decode_pixels(payload):
+    from PIL import Image
+
+    view = memoryview(payload)
+    (count,), offset = COUNT.unpack_from(view), COUNT.size
+    images = []
+    for _ in range(count):
+        width, height, kind = PIXELS_HEADER.unpack_from(view, offset)
+        offset += PIXELS_HEADER.size
+        size = width * height * 3
+        if kind == PIXELS_PATCH:
+            import numpy as np
+            images.append(np.frombuffer(view[offset:offset + size], dtype=np.uint8).reshape(height, width, 3))
+        else:
+            images.append(Image.frombytes('RGB', (width, height), bytes(view[offset:offset + size])))
+        offset += size
+    return images
+
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """Serves requests on one client connection until the client disconnects"""
+    def handle(self):
+        server = self.server
+        server.connection_opened()
+        try:
+            while True:
+                try:
+                    opcode, flags, length = REQUEST_HEADER.unpack(_recv_exact(self.request, REQUEST_HEADER.size))
+                    if length > MAX_PAYLOAD_BYTES:
+                        raise ConnectionError(f"request of {length} bytes refused")
+                    payload = _recv_exact(self.request, length)
+                except ConnectionError:
+                    return
+
+                status, reply = STATUS_OK, b''
+                started = time.perf_counter()
+                server.request_started()
+                try:
+                    reply = server.dispatch(opcode, flags, payload)
+                except Exception as e:
+                    logger.error(f"Inference request failed: {str(e)}")
+                    status, reply = STATUS_ERROR, str(e).encode()
+                finally:
+                    server.request_finished(opcode, status == STATUS_OK, time.perf_counter() - started)
+                self.request.sendall(RESPONSE_HEADER.pack(status, len(reply)) + reply)
+        finally:
+            server.connection_closed()
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Owns one classification service and answers classify/status requests
+    on a Unix socket. Every connection gets its own thread, so requests from
+    all web workers meet in the service's micro-batcher.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        self.service = service
+        self.started_at = time.time()
+        self._stats_lock = threading.Lock()
+        self.connections = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.images = 0
+        self.busy_seconds = 0.0
+        super().__init__(socket_path, InferenceRequestHandler)
+
+    def connection_opened(self):
+        with self._stats_lock:
+            self.connections += 1
+
+    def connection_closed(self):
+        with self._stats_lock:
+            self.connections -= 1
+
+    def request_started(self):
+        with self._stats_lock:
+            self.in_flight += 1
+
+    def request_finished(self, opcode, ok, elapsed):
+        with self._stats_lock:
+            self.in_flight -= 1
+            if opcode != OP_STATUS:
+                self.requests += 1
+                self.errors += int(not ok)
+                self.busy_seconds += elapsed
+
+    def dispatch(self, opcode, flags, payload):
+        service = self.service
+        with_embedding = bool(flags & FLAG_EMBEDDING)
+        if opcode == OP_CLASSIFY:
+            predictions, processing_time, answered_by, embedding = service._predict_with_version(
+                service.preprocess_image(io.BytesIO(payload))
+            )
+            self._count_images(1)
+            return encode_results([(predictions, processing_time, answered_by, embedding if with_embedding else None)])
+        if opcode == OP_CLASSIFY_PIXELS:
+            images = decode_pixels(payload)
+            # Each image reports the model that answered it (a cascade stage), not the service's label
+            results = service._predict_batch_with_versions(images) if images else []
+            self._count_images(len(images))
+            return encode_results([
+                (predictions, processing_time, answered_by, embedding if with_embedding else None)
+                for predictions, processing_time, answered_by, embedding in results
+            ])
+        if opcode == OP_STATUS:
+            return json.dumps(self.status(include_classes=bool(flags & FLAG_CLASSES))).encode()
+        raise ValueError(f"unknown opcode {opcode}")
+
+    def _count_images(self, count):
+        with self._stats_lock:
+            self.images += count
+
+    def queue_depth(self):
+        """Images waiting for a forward pass in the service's micro-batcher(s)"""
+        services = getattr(self.service, 'stages', [self.service])
+        return sum(s.batcher.queue_depth() for s in services if s.batcher is not None)
+
+    def status(self, include_classes=False):
+        service = self.service
+        with self._stats_lock:
+            status = {
+                'pid': os.getpid(),
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'connections': self.connections,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queue_depth(),
+                'requests': self.requests,
+                'errors': self.errors,
+                'images': self.images,
+                'busy_seconds': round(self.busy_seconds, 3),
+            }
+        status.update({
+            'model_loaded': service.model_loaded,
+            'model_version': service.model_version,
+            'embedding_model_version': service.embedding_model_version,
+            'embedding_dim': service.embedding_service.embedding_dim,
+            'class_count': len(service.classes),
+            'load_info': service.load_info(),
+            'batching': service.batcher.stats() if service.batcher else None,
+            'cascade': service.cascade_stats(),
+            'metrics': metrics.summary(),
+        })
+        if include_classes:
+            status['classes'] = service.classes
+        return status
+
+
+class InferenceClient:
+    """
+    Client for InferenceServer. Each thread keeps its own persistent
+    connection; a connection broken by a server restart is replaced and the
+    request retried once, but only when it cannot have reached the server:
+    a failed connect or send. A timeout or a reply cut off mid-way is not
+    retried, since the server may still be working on the request.
+    """
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def request(self, opcode, payload=b'', flags=0):
+        message = REQUEST_HEADER.pack(opcode, flags, len(payload)) + payload
+        for attempt in (1, 2):
+            sent = False
+            try:
+                sock = self._connection()
+                sock.sendall(message)
+                sent = True
+                status, length = RESPONSE_HEADER.unpack(_recv_exact(sock, RESPONSE_HEADER.size))
+                reply = _recv_exact(sock, length)
+                break
+            except OSError as e:
+                self.close()
+                # FileNotFoundError: the socket file is gone while the server restarts
+                retry = not sent and isinstance(e, (ConnectionError, FileNotFoundError))
+                if attempt == 2 or not retry:
+                    raise InferenceServerUnavailable(f"inference server at {self.socket_path} unavailable: {str(e)}")
+        if status != STATUS_OK:
+            raise InferenceServerError(reply.decode(errors='replace'))
+        return reply
+
+    def classify(self, data, with_embedding=False):
+        """Encoded image bytes -> (predictions, processing_time, answered_by, embedding)"""
+        flags = FLAG_EMBEDDING if with_embedding else 0
+        return decode_results(self.request(OP_CLASSIFY, data, flags))[0]
+
+    def classify_images(self, images, with_embeddings=False):
+        """Decoded PIL images or cached crops -> [(predictions, processing_time, answered_by, embedding)], one forward pass"""
+        flags = FLAG_EMBEDDING if with_embeddings else 0
+        return decode_results(self.request(OP_CLASSIFY_PIXELS, encode_pixels(images), flags))
+
+    def status(self, include_classes=False):
+        return json.loads(self.request(OP_STATUS, flags=FLAG_CLASSES if include_classes else 0))
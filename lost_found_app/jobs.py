@@ -0,0 +1,220 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .image_derivatives import load_patch
+from .models import ClassificationJob, FoundItem, LostItem
+
+logger = logging.getLogger(__name__)
+
+ITEM_MODELS = {
+    'lost': LostItem,
+    'found': FoundItem,
+}
+
+
+def classification_fields(result, model_version=''):
+    """
+    Item field values for a successful classify_image result.
+    ``model_version`` is the service configuration that produced it (the
+    model, backend or cascade label), which reclassify_items compares
+    against to find stale rows.
+    """
+    fields = {
+        'ai_suggested_category': result.get('suggested_category', ''),
+        'ai_confidence': result.get('confidence', 0.0),
+        'ai_top_predictions': result.get('top_predictions', {}),
+        'ai_image_hash': result.get('content_hash', ''),
+        'ai_model_version': model_version,
+        'ai_status': 'done',
+    }
+    if result.get('embedding') is not None:
+        fields['image_embedding'] = result['embedding']
+        fields['embedding_model_version'] = result.get('embedding_model_version', '')
+    return fields
+
+
+def apply_classification_result(item_model, item_id, result, model_version='', image_name=None):
+    """
+    Write AI results back to an item without going through save(). With
+    ``image_name`` (the item_image the result was computed from) nothing is
+    written if the image has been replaced since. Returns the rows updated.
+    """
+    fields = classification_fields(result, model_version)
+    queryset = item_model.objects.filter(pk=item_id)
+    if image_name is not None:
+        queryset = queryset.filter(item_image=image_name)
+    updated = queryset.update(**fields)
+    if updated and 'image_embedding' in fields:
+        from .vector_index import sync_item_embedding
+        item_type = next(key for key, model in ITEM_MODELS.items() if model is item_model)
+        sync_item_embedding(item_type, item_id, fields['image_embedding'], fields['embedding_model_version'])
+    return updated
+
+
+def classify_stored_image(service, item):
+    """
+    classify_image() result for an item's stored image, run on the model
+    input crop cached at upload when there is one, so the master is not read
+    and decoded again; items without it (or whose crop file is gone) are
+    classified from the master.
+    """
+    derivatives = item.image_derivatives or {}
+    if derivatives.get('patch') and derivatives.get('source_hash'):
+        try:
+            patch = load_patch(derivatives)
+        except OSError:
+            patch = None  # derivative missing on disk: decode the master
+        if patch is not None:
+            return service.classify_patch(patch, derivatives['source_hash'], item.item_image.path, include_embedding=True)
+    return service.classify_image(item.item_image.path, include_embedding=True)
+
+
+def classify_item(item):
+    """Classify an item's image inline and store the outcome. Returns True on success."""
+    from .ai_service import get_ai_service
+
+    service = get_ai_service()
+    image_name = item.item_image.name
+    try:
+        result = classify_stored_image(service, item)
+    except Exception as e:
+        result = {'error': str(e)}
+
+    if result and 'error' not in result:
+        # A save that replaced the image meanwhile classifies the new one itself
+        if not apply_classification_result(type(item), item.pk, result, service.model_version, image_name):
+            return False
+        for field, value in classification_fields(result, service.model_version).items():
+            setattr(item, field, value)
+        return True
+
+    logger.warning(f"AI classification failed for {item.pk}: {result.get('error') if result else 'no result'}")
+    type(item).objects.filter(pk=item.pk, item_image=image_name).update(ai_status='failed')
+    item.ai_status = 'failed'
+    return False
+
+
+def release_stale_jobs(lease_seconds):
+    """
+    Return jobs whose worker died mid-run to the queue. A worker that was
+    only slow keeps running, but its outcome is discarded (see _finish_job).
+    """
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    return ClassificationJob.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued',
+        locked_by='',
+        locked_at=None
+    )
+
+
+def claim_jobs(worker_id, limit=1):
+    """
+    Atomically claim up to ``limit`` runnable jobs for ``worker_id``.
+    Each claim is a conditional UPDATE on status, so two workers racing for
+    the same row cannot both win, on any database backend.
+    """
+    now = timezone.now()
+    candidate_ids = list(
+        ClassificationJob.objects.filter(status='queued', run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+    claimed_ids = []
+    for job_id in candidate_ids:
+        claimed = ClassificationJob.objects.filter(id=job_id, status='queued').update(
+            status='running',
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            claimed_ids.append(job_id)
+
+    return list(ClassificationJob.objects.filter(id__in=claimed_ids, locked_by=worker_id).order_by('run_after', 'id'))
+
+
+def _finish_job(job, **fields):
+    """
+    Write the outcome of a claimed job and release its lease, but only while
+    this worker still holds the lease: a job that release_stale_jobs()
+    requeued (and another worker may have claimed since) belongs to its new
+    owner. Returns True when the outcome was written.
+    """
+    fields.update(locked_by='', locked_at=None, updated_at=timezone.now())
+    written = ClassificationJob.objects.filter(
+        pk=job.pk, status='running', locked_by=job.locked_by, locked_at=job.locked_at
+    ).update(**fields)
+    if not written:
+        logger.warning(f"Classification job {job.id} lost its lease to another worker; outcome discarded")
+        return False
+    for field, value in fields.items():
+        setattr(job, field, value)
+    return True
+
+
+def _fail_job(job, error):
+    if job.attempts >= job.max_attempts:
+        # Out of retries: park in the dead-letter state and tell clients
+        if _finish_job(job, status='dead', last_error=error):
+            ITEM_MODELS[job.item_type].objects.filter(pk=job.item_id).update(ai_status='failed')
+            logger.error(f"Classification job {job.id} moved to dead letter after {job.attempts} attempts: {error}")
+    else:
+        backoff = getattr(settings, 'AI_JOB_RETRY_BACKOFF_SECONDS', 30) * (2 ** (job.attempts - 1))
+        if _finish_job(job, status='queued', last_error=error, run_after=timezone.now() + timedelta(seconds=backoff)):
+            logger.warning(f"Classification job {job.id} failed (attempt {job.attempts}), retrying in {backoff}s: {error}")
+
+
+def _requeue_replaced(job):
+    """
+    The item's image was replaced while ``job`` ran, and enqueue() added no
+    job for the new one since this one was running: run it again at once,
+    without counting the attempt
+    """
+    _finish_job(job, status='queued', attempts=job.attempts - 1, run_after=timezone.now(),
+                last_error='Image replaced during classification')
+
+
+def process_job(job, service=None):
+    """Run one claimed job. Returns True when the item was classified."""
+    if service is None:
+        from .ai_service import get_ai_service
+        service = get_ai_service()
+
+    item_model = ITEM_MODELS[job.item_type]
+    item = item_model.objects.filter(pk=job.item_id).first()
+
+    if item is None or not item.item_image:
+        _finish_job(job, status='done', last_error='Item or image no longer exists')
+        return False
+
+    image_name = item.item_image.name
+    try:
+        result = classify_stored_image(service, item)
+    except Exception as e:
+        result = {'error': str(e)}
+
+    if not result or 'error' in result:
+        if item_model.objects.filter(pk=item.pk, item_image=image_name).exists():
+            _fail_job(job, result.get('error', 'Classification failed') if result else 'Classification failed')
+        else:
+            _requeue_replaced(job)
+        return False
+
+    if not apply_classification_result(item_model, item.pk, result, service.model_version, image_name):
+        _requeue_replaced(job)
+        return False
+    _finish_job(job, status='done', last_error='')
+    return True
+
+
+def run_pending_jobs(worker_id, limit=10, service=None):
+    """Claim and process a batch of jobs. Returns the number of jobs processed."""
+    jobs = claim_jobs(worker_id, limit=limit)
+    for job in jobs:
+        process_job(job, service=service)
+    return len(jobs)
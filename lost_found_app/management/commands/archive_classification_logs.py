@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lost_found_app.classification_log import archive_day, rollup_day
+from lost_found_app.models import AIClassificationDailyRollup, AIClassificationLog
+
+
+class Command(BaseCommand):
+    help = "Roll up AIClassificationLog per day, then archive raw rows past retention to gzipped NDJSON (run daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'AI_LOG_RETENTION_DAYS', 30),
+                            help='raw rows are kept this many days')
+        parser.add_argument('--output-dir', default=str(getattr(settings, 'AI_LOG_ARCHIVE_DIR', settings.BASE_DIR / 'log_archive')))
+        parser.add_argument('--rollup-only', action='store_true', help='update the daily rollups but archive nothing')
+        parser.add_argument('--recompute', action='store_true', help='recompute rollups of every day still in the raw log')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        raw_days = list(AIClassificationLog.objects.filter(created_at__lt=timezone.now()).dates('created_at', 'day'))
+
+        # Complete days without a rollup, plus yesterday (records buffered over midnight land late)
+        rolled_up = set(AIClassificationDailyRollup.objects.values_list('date', flat=True).distinct())
+        to_roll_up = [
+            day for day in raw_days
+            if day < today and (options['recompute'] or day not in rolled_up or day == today - timedelta(days=1))
+        ]
+        for day in to_roll_up:
+            groups = rollup_day(day)
+            self.stdout.write(f"Rolled up {day}: {groups} model/category group(s)")
+
+        if options['rollup_only']:
+            return
+
+        cutoff = today - timedelta(days=options['days'])
+        archived = 0
+        for day in raw_days:
+            if day >= cutoff:
+                break
+            if day not in rolled_up and day not in to_roll_up:
+                rollup_day(day)
+            rows, path = archive_day(day, options['output_dir'])
+            archived += rows
+            if rows:
+                self.stdout.write(f"Archived {rows} row(s) from {day} to {path}")
+        self.stdout.write(self.style.SUCCESS(f"{len(to_roll_up)} day(s) rolled up, {archived} raw row(s) archived"))
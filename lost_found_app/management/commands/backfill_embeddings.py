@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from lost_found_app.image_derivatives import load_patch
+from lost_found_app.models import FoundItem, LostItem
+from lost_found_app.vector_index import sync_item_embedding
+
+
+class Command(BaseCommand):
+    help = "Compute image embeddings for items that have none or whose embedding model_version is stale"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=16, help='images per forward pass and per bulk_update')
+        parser.add_argument('--force', action='store_true', help='recompute embeddings that are already current')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import get_ai_service
+
+        classifier = get_ai_service()
+        # A cascade embeds with its first stage only; a remote service forwards to the server
+        service = classifier.embedding_service
+        if not service.ensure_loaded():
+            raise CommandError("AI model could not be loaded")
+        if not service.embedding_dim:
+            raise CommandError(f"{service.model_version} does not expose image embeddings")
+
+        # The label classify_image stamps on embeddings, which score_pair and the vector index compare
+        version = classifier.embedding_model_version
+        self.stdout.write(f"Embedding model: {version} ({service.embedding_dim}-d)")
+
+        for model in (LostItem, FoundItem):
+            queryset = model.objects.exclude(item_image='').exclude(item_image__isnull=True)
+            if not options['force']:
+                queryset = queryset.filter(Q(image_embedding__isnull=True) | ~Q(embedding_model_version=version))
+            queryset = queryset.only('pk', 'item_image', 'image_derivatives').order_by('pk')
+
+            started = time.time()
+            done = failed = 0
+            batch = []
+            for item in queryset.iterator(chunk_size=options['batch_size']):
+                batch.append(item)
+                if len(batch) >= options['batch_size']:
+                    ok, bad = self._embed(model, batch, service, version)
+                    done, failed = done + ok, failed + bad
+                    batch = []
+            if batch:
+                ok, bad = self._embed(model, batch, service, version)
+                done, failed = done + ok, failed + bad
+
+            elapsed = time.time() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"{model.__name__}: {done} embedded, {failed} failed in {elapsed:.1f}s"
+            ))
+
+    def _load(self, service, item):
+        """The item's cached model input crop, or its decoded master when there is none"""
+        try:
+            patch = load_patch(item.image_derivatives)
+        except OSError:
+            patch = None  # derivative missing on disk: decode the master
+        return patch if patch is not None else service.preprocess_image(item.item_image.path)
+
+    def _embed(self, model, items, service, version):
+        images, ready = [], []
+        for item in items:
+            try:
+                images.append(self._load(service, item))
+                ready.append(item)
+            except Exception as e:
+                self.stderr.write(f"Skipping {model.__name__} {item.pk}: {e}")
+
+        if not ready:
+            return 0, len(items)
+
+        results = service.predict_batch(images, with_embeddings=True)
+        for item, (_, _, embedding) in zip(ready, results):
+            item.image_embedding = embedding
+            item.embedding_model_version = version
+        model.objects.bulk_update(ready, ['image_embedding', 'embedding_model_version'])
+        for item in ready:
+            sync_item_embedding('lost' if model is LostItem else 'found', item.pk, item.image_embedding, version)
+        return len(ready), len(items) - len(ready)
@@ -0,0 +1,77 @@
+import statistics
+import threading
+import time
+
+import torch
+from django.core.management.base import BaseCommand
+from torchvision import models
+
+from lost_found_app.batching import MicroBatcher
+from lost_found_app.metrics import percentile
+
+
+class Command(BaseCommand):
+    help = "Measure classification throughput versus micro-batch size and max wait time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='resnet101', help='torchvision architecture (random weights, no download)')
+        parser.add_argument('--batch-sizes', default='1,2,4,8,16', help='comma separated max batch sizes')
+        parser.add_argument('--waits-ms', default='0,5,10,20', help='comma separated max wait times in milliseconds')
+        parser.add_argument('--requests', type=int, default=64, help='requests per configuration')
+        parser.add_argument('--concurrency', type=int, default=16, help='concurrent client threads')
+
+    def handle(self, *args, **options):
+        model = getattr(models, options['model'])(weights=None)
+        model.eval()
+
+        def batch_fn(tensors):
+            with torch.no_grad():
+                out = model(torch.stack(tensors))
+            return list(out.argmax(dim=1).tolist())
+
+        batch_sizes = [int(v) for v in options['batch_sizes'].split(',')]
+        waits = [float(v) for v in options['waits_ms'].split(',')]
+        total = options['requests']
+        concurrency = options['concurrency']
+        image = torch.rand(3, 224, 224)
+
+        # Warm up allocator and kernels before timing anything
+        batch_fn([image])
+
+        self.stdout.write(f"model={options['model']} requests={total} concurrency={concurrency}")
+        self.stdout.write(f"{'batch':>6} {'wait_ms':>8} {'img/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'mean_batch':>11}")
+
+        for batch_size in batch_sizes:
+            for wait_ms in waits:
+                if batch_size == 1 and wait_ms != waits[0]:
+                    continue  # wait time is irrelevant without batching
+                batcher = MicroBatcher(batch_fn, max_batch_size=batch_size, max_wait=wait_ms / 1000.0)
+                latencies = []
+                lock = threading.Lock()
+                counter = iter(range(total))
+
+                def client():
+                    while True:
+                        with lock:
+                            if next(counter, None) is None:
+                                return
+                        start = time.perf_counter()
+                        batcher.run(image)
+                        elapsed = time.perf_counter() - start
+                        with lock:
+                            latencies.append(elapsed)
+
+                threads = [threading.Thread(target=client) for _ in range(concurrency)]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                wall = time.perf_counter() - started
+
+                stats = batcher.stats()
+                self.stdout.write(
+                    f"{batch_size:>6} {wait_ms:>8.1f} {total / wall:>8.2f} "
+                    f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f} "
+                    f"{stats['mean_batch_size']:>11.2f}"
+                )
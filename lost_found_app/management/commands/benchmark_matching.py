@@ -0,0 +1,119 @@
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lost_found_app.matching import MatchProfile, SIDES, find_matches, score_pair
+from lost_found_app.metrics import percentiles
+from lost_found_app.models import Category, FoundItem, LostItem, User
+
+NOUNS = ['wallet', 'phone', 'keys', 'umbrella', 'backpack', 'watch', 'glasses', 'laptop', 'charger', 'jacket',
+         'bottle', 'headphones', 'ring', 'card', 'notebook', 'scarf', 'cap', 'purse', 'tablet', 'bracelet']
+ADJECTIVES = ['leather', 'small', 'old', 'new', 'broken', 'plastic', 'metal', 'striped', 'round', 'heavy',
+              'folding', 'wireless', 'cracked', 'vintage', 'zipped', 'shiny', 'worn', 'large', 'soft', 'engraved']
+COLORS = ['black', 'blue', 'red', 'green', 'white', 'grey', 'brown', 'silver', 'pink', 'yellow']
+BRANDS = ['acme', 'globex', 'initech', 'umbrella', 'hooli', 'stark', 'wayne', 'cyberdyne', 'tyrell', 'wonka']
+PLACES = ['lobby', 'gym', 'parking', 'pool', 'garden', 'lift', 'corridor', 'playground', 'gate', 'cafeteria']
+LABELS = [f'imagenet_label_{i}' for i in range(200)]
+
+
+def _fake_item(rng, today):
+    noun = rng.choice(NOUNS)
+    label = rng.choice(LABELS)
+    return {
+        'title': f'{rng.choice(ADJECTIVES)} {noun}',
+        'description': ' '.join(rng.choice(ADJECTIVES + NOUNS) for _ in range(12)) + f' {noun}',
+        'color': rng.choice(COLORS),
+        'brand': rng.choice(BRANDS) if rng.random() < 0.6 else '',
+        'location': f'tower {rng.randint(1, 12)} {rng.choice(PLACES)}',
+        'date': today - timedelta(days=rng.randint(0, 365)),
+        'ai_suggested_category': label,
+        'ai_top_predictions': {'predictions': [{'category': label, 'confidence': rng.uniform(30, 95)}]
+                               + [{'category': rng.choice(LABELS), 'confidence': rng.uniform(0, 10)} for _ in range(4)]},
+    }
+
+
+class Command(BaseCommand):
+    help = "Latency and top-1 accuracy of the lost/found matching engine on synthetic items (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000', help='comma separated items per side')
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'items':>7} {'direction':>12} {'matches':>8} {'p50_ms':>8} {'p95_ms':>8} "
+                          f"{'full_scan_p50_ms':>16} {'top1':>6}")
+        for size in [int(v) for v in options['sizes'].split(',')]:
+            with transaction.atomic():
+                self._run(size, options['queries'], random.Random(options['seed']))
+                transaction.set_rollback(True)
+
+    def _run(self, size, query_count, rng):
+        today = date.today()
+        loser = User.objects.create(username='bench-loser', email='bench-loser@example.com')
+        finder = User.objects.create(username='bench-finder', email='bench-finder@example.com')
+        categories = [Category.objects.create(name=f'bench-{noun}') for noun in NOUNS]
+
+        def build(model, user, side, fields):
+            location, when = SIDES[side]['location'], SIDES[side]['date']
+            return model(
+                user=user, title=fields['title'], description=fields['description'], color=fields['color'],
+                brand=fields['brand'], category=categories[NOUNS.index(fields['title'].split()[-1])],
+                ai_suggested_category=fields['ai_suggested_category'], ai_top_predictions=fields['ai_top_predictions'],
+                ai_status='done', **{location: fields['location'], when: fields['date']}
+            )
+
+        lost_fields = [_fake_item(rng, today) for _ in range(size)]
+        LostItem.objects.bulk_create([build(LostItem, loser, 'lost', f) for f in lost_fields], batch_size=2000)
+        FoundItem.objects.bulk_create(
+            [build(FoundItem, finder, 'found', _fake_item(rng, today)) for _ in range(size)], batch_size=2000
+        )
+
+        # Planted pairs: a found report of a known lost item, described in slightly different words
+        planted = []
+        for lost in LostItem.objects.filter(user=loser).order_by('?')[:query_count]:
+            words = lost.description.split()
+            rng.shuffle(words)
+            found = build(FoundItem, finder, 'found', {
+                'title': lost.title, 'description': ' '.join(words[:8]), 'color': lost.color, 'brand': lost.brand,
+                'location': lost.lost_location, 'date': min(lost.lost_date + timedelta(days=rng.randint(0, 5)), today),
+                'ai_suggested_category': lost.ai_suggested_category, 'ai_top_predictions': lost.ai_top_predictions,
+            })
+            found.save()
+            planted.append((found, lost))
+
+        for direction, pairs in (('found->lost', [(f, 'found', l.pk) for f, l in planted]),
+                                 ('lost->found', [(l, 'lost', f.pk) for f, l in planted])):
+            latencies, match_counts, hits = [], [], 0
+            for item, item_type, expected in pairs:
+                started = time.perf_counter()
+                matches = find_matches(item, item_type)
+                latencies.append(time.perf_counter() - started)
+                match_counts.append(len(matches))
+                hits += int(bool(matches) and matches[0][0].pk == expected)
+
+            full_scan = [self._full_scan(item, item_type) for item, item_type, _ in pairs[:5]]
+            latency = percentiles(latencies, (50, 95))
+            p50, p95 = latency[50] * 1000, latency[95] * 1000
+            self.stdout.write(
+                f"{size:>7} {direction:>12} {np.mean(match_counts):>8.0f} {p50:>8.1f} {p95:>8.1f} "
+                f"{np.median(full_scan) * 1000:>16.1f} {hits / len(pairs):>6.2f}"
+            )
+
+    def _full_scan(self, item, item_type):
+        """Baseline: score every open item on the other side, as if there were no candidate filters"""
+        target_type = 'found' if item_type == 'lost' else 'lost'
+        target = SIDES[target_type]
+        started = time.perf_counter()
+        profile = MatchProfile(item, item_type)
+        scored = []
+        for candidate in target['model'].objects.filter(status=target['open_status']):
+            other = MatchProfile(candidate, target_type)
+            lost, found = (profile, other) if item_type == 'lost' else (other, profile)
+            scored.append(score_pair(lost, found, 90)[0])
+        scored.sort(reverse=True)
+        return time.perf_counter() - started
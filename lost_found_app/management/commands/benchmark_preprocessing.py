@@ -0,0 +1,141 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Peak memory is measured in a fresh process per pipeline so one run cannot inflate the next
+MEMORY_SCRIPT = """
+import json, sys
+import numpy, torch, torchvision.transforms
+from lost_found_app.management.commands.benchmark_preprocessing import legacy_pipeline, fast_pipeline
+
+def status_kb(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ':'))
+
+path, which = sys.argv[1:3]
+pipeline = legacy_pipeline if which == 'legacy' else fast_pipeline
+with open(path, 'rb') as f:
+    data = f.read()
+# Reset the peak RSS high-water mark, then measure how far one run pushes it
+with open('/proc/self/clear_refs', 'w') as f:
+    f.write('5')
+baseline = status_kb('VmRSS')
+pipeline(data)
+print(json.dumps({'peak_mb': max(status_kb('VmHWM') - baseline, 0) / 1024}))
+"""
+
+
+def legacy_pipeline(data):
+    """Full decode followed by the chained torchvision Compose (the previous implementation)"""
+    from PIL import Image
+    from torchvision import transforms
+
+    image = Image.open(io.BytesIO(data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    return transform(image)
+
+
+def fast_pipeline(data):
+    """Draft-mode JPEG decode and the vectorised preprocessing used by the AI service"""
+    from lost_found_app.preprocessing import open_image, to_model_input
+
+    return to_model_input(open_image(io.BytesIO(data)))
+
+
+def _synthetic_jpeg(megapixels):
+    """A photo-like JPEG (smooth gradients plus sensor noise) at roughly ``megapixels``"""
+    import numpy as np
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    rgb = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200
+    rgb += np.random.default_rng(0).normal(0, 12, rgb.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Compare decode+preprocess time, peak memory and predictions of the legacy and fast pipelines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', default='1,3,12,24', help='comma separated synthetic image sizes')
+        parser.add_argument('--repeat', type=int, default=5, help='timed runs per size')
+        parser.add_argument('--images', default=None, help='directory of real images for the prediction check')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import get_ai_service
+
+        service = get_ai_service()
+        model_ready = service.ensure_loaded()
+
+        self.stdout.write(f"{'MP':>5} {'legacy_ms':>10} {'fast_ms':>8} {'speedup':>8} "
+                          f"{'legacy_peak_mb':>15} {'fast_peak_mb':>13} {'max_abs_diff':>13} {'same_top1':>10}")
+        with tempfile.TemporaryDirectory() as tmp:
+            for megapixels in [float(v) for v in options['megapixels'].split(',')]:
+                data = _synthetic_jpeg(megapixels)
+                path = os.path.join(tmp, f'{megapixels}.jpg')
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+                timings = {}
+                tensors = {}
+                for name, pipeline in (('legacy', legacy_pipeline), ('fast', fast_pipeline)):
+                    tensors[name] = pipeline(data)
+                    start = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        pipeline(data)
+                    timings[name] = (time.perf_counter() - start) / options['repeat']
+
+                peaks = {name: self._peak_memory(path, name) for name in ('legacy', 'fast')}
+                diff = (tensors['legacy'] - tensors['fast']).abs().max().item()
+                same_top1 = self._same_top1(service, [tensors['legacy']], [tensors['fast']]) if model_ready else 'n/a'
+
+                self.stdout.write(
+                    f"{megapixels:>5g} {timings['legacy'] * 1000:>10.1f} {timings['fast'] * 1000:>8.1f} "
+                    f"{timings['legacy'] / timings['fast']:>7.1f}x {peaks['legacy']:>15.1f} {peaks['fast']:>13.1f} "
+                    f"{diff:>13.3f} {same_top1:>10}"
+                )
+
+        if options['images'] and model_ready:
+            paths = [os.path.join(root, name) for root, _, files in os.walk(options['images']) for name in sorted(files)
+                     if name.lower().endswith(('.jpg', '.jpeg', '.png'))]
+            legacy, fast = [], []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                legacy.append(legacy_pipeline(data))
+                fast.append(fast_pipeline(data))
+            self.stdout.write(f"Top-1 agreement on {len(paths)} real images: {self._same_top1(service, legacy, fast)}")
+
+    def _same_top1(self, service, legacy, fast):
+        same = 0
+        for a, b in zip(legacy, fast):
+            top_a = service._forward_batch([a])[0][0][0]['category']
+            top_b = service._forward_batch([b])[0][0][0]['category']
+            same += int(top_a == top_b)
+        return f"{same}/{len(legacy)}"
+
+    def _peak_memory(self, path, which):
+        proc = subprocess.run([sys.executable, '-c', MEMORY_SCRIPT, path, which],
+                              cwd=str(settings.BASE_DIR), capture_output=True, text=True)
+        try:
+            return json.loads(proc.stdout.strip().splitlines()[-1])['peak_mb']
+        except (IndexError, ValueError, KeyError):
+            return float('nan')
@@ -0,0 +1,86 @@
+import random
+import time
+from datetime import date
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from lost_found_app.management.commands.benchmark_matching import ADJECTIVES, BRANDS, NOUNS, PLACES, _fake_item
+from lost_found_app.metrics import percentiles
+from lost_found_app.models import Category, LostItem, User
+from lost_found_app.search import fts_available, fts_search, like_search
+
+CHUNK = 10000
+
+
+class Command(BaseCommand):
+    help = "Latency of the FTS5 item search against the LIKE fallback on synthetic items (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated item counts')
+        parser.add_argument('--queries', type=int, default=50, help='queries per kind')
+        parser.add_argument('--limit', type=int, default=20, help='results per query')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not fts_available(LostItem):
+            raise CommandError("No FTS5 search index on this database")
+
+        self.stdout.write(f"{'items':>8} {'query':>10} {'hits':>6} {'fts_p50_ms':>10} {'fts_p95_ms':>10} "
+                          f"{'like_p50_ms':>11} {'like_p95_ms':>11}")
+        for size in [int(v) for v in options['sizes'].split(',')]:
+            with transaction.atomic():
+                self._run(size, options, random.Random(options['seed']))
+                transaction.set_rollback(True)
+
+    def _run(self, size, options, rng):
+        today = date.today()
+        user = User.objects.create(username='bench-search', email='bench-search@example.com')
+        category = Category.objects.create(name='bench-search')
+        started = time.time()
+        for offset in range(0, size, CHUNK):
+            items = []
+            for index in range(offset, min(offset + CHUNK, size)):
+                fields = _fake_item(rng, today)
+                items.append(LostItem(
+                    user=user, category=category, title=fields['title'],
+                    # A word only this item has, like a serial number or a name written on it
+                    description=f"{fields['description']} sn{index:07d}",
+                    color=fields['color'], brand=fields['brand'], lost_location=fields['location'],
+                    lost_date=fields['date'], ai_suggested_category=fields['ai_suggested_category'],
+                ))
+            LostItem.objects.bulk_create(items, batch_size=2000)
+        self.stdout.write(f"{size:>8} items inserted and indexed in {time.time() - started:.1f}s")
+
+        # Everything, as an admin searches (owners' searches are scoped to their few items)
+        queryset = LostItem.objects.all()
+        kinds = {
+            # As-you-type: an incomplete word
+            'prefix': lambda: rng.choice(ADJECTIVES + NOUNS)[:4],
+            # Two words, the second incomplete
+            'two_words': lambda: f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)[:3]}',
+            # Selective: brand, noun and place
+            'selective': lambda: f'{rng.choice(BRANDS)} {rng.choice(NOUNS)} {rng.choice(PLACES)}',
+            # A word of a single item
+            'rare': lambda: f'sn{rng.randrange(size):07d}',
+        }
+        for kind, make_query in kinds.items():
+            queries = [make_query() for _ in range(options['queries'])]
+            fts_times, like_times, hits = [], [], []
+            for query in queries:
+                fts_times.append(self._time(fts_search, queryset, query, options['limit'], hits))
+                like_times.append(self._time(like_search, queryset, query, options['limit']))
+            fts, like = percentiles(fts_times, (50, 95)), percentiles(like_times, (50, 95))
+            fts_p50, fts_p95 = fts[50] * 1000, fts[95] * 1000
+            like_p50, like_p95 = like[50] * 1000, like[95] * 1000
+            self.stdout.write(f"{size:>8} {kind:>10} {np.mean(hits):>6.1f} {fts_p50:>10.2f} {fts_p95:>10.2f} "
+                              f"{like_p50:>11.2f} {like_p95:>11.2f}")
+
+    def _time(self, search, queryset, query, limit, hits=None):
+        started = time.perf_counter()
+        results = search(queryset, query, limit)
+        elapsed = time.perf_counter() - started
+        if hits is not None:
+            hits.append(len(results))
+        return elapsed
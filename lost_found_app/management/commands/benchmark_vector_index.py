@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from lost_found_app.metrics import percentiles
+from lost_found_app.vector_index import VectorIndex
+
+CLUSTERS = 1000       # synthetic "object kinds" the vectors are drawn around
+GENERATE_CHUNK = 50000
+
+
+def _synthetic_entries(count, dim, centers, rng, keep_every, kept):
+    """Clustered unit vectors with random ids; every ``keep_every``-th vector is kept for queries"""
+    for start in range(0, count, GENERATE_CHUNK):
+        n = min(GENERATE_CHUNK, count - start)
+        vectors = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 0.6, (n, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for i in range(n):
+            if (start + i) % keep_every == 0:
+                kept.append(vectors[i])
+            yield uuid.uuid4(), vectors[i]
+
+
+class Command(BaseCommand):
+    help = "Build time, query latency and recall of the image similarity index on synthetic vectors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated row counts')
+        parser.add_argument('--dim', type=int, default=512,
+                            help='vector size (ResNet101 embeddings are 2048-d; 1M of those need 4 GB of disk)')
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--partitions', type=int, default=None, help='coarse partitions (default sqrt(rows))')
+        parser.add_argument('--nprobe', type=int, default=None)
+
+    def handle(self, *args, **options):
+        dim, k = options['dim'], options['k']
+        rng = np.random.default_rng(0)
+        centers = rng.normal(0, 1, (CLUSTERS, dim)).astype(np.float32)
+
+        self.stdout.write(f"{'rows':>9} {'mode':>12} {'build_s':>8} {'disk_mb':>8} "
+                          f"{'p50_ms':>8} {'p95_ms':>8} {f'recall@{k}':>10}")
+        for size in [int(v) for v in options['sizes'].split(',')]:
+            with tempfile.TemporaryDirectory() as tmp:
+                kept = []
+                keep_every = max(size // options['queries'], 1)
+                index = VectorIndex('bench', directory=tmp, nprobe=options['nprobe'])
+
+                started = time.perf_counter()
+                index.rebuild(_synthetic_entries(size, dim, centers, rng, keep_every, kept), dim, 'synthetic')
+                build_time = time.perf_counter() - started
+                disk_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / (1024 * 1024)
+
+                # Queries are noisy copies of indexed vectors, like a found item photographed differently
+                queries = [q + rng.normal(0, 0.02, dim).astype(np.float32) for q in kept[:options['queries']]]
+                exact, latencies = self._run(index, queries, k)
+                self._report(size, 'brute-force', build_time, disk_mb, latencies, 1.0)
+
+                partitions = options['partitions'] or int(size ** 0.5)
+                started = time.perf_counter()
+                rows = ((key.decode(), vector) for key, vector in zip(index.ids[:size], index.vectors[:size]))
+                index.rebuild(rows, dim, 'synthetic', partitions=partitions)
+                build_time = time.perf_counter() - started
+                approx, latencies = self._run(index, queries, k)
+                recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)])
+                self._report(size, f'ivf{partitions}/{index.nprobe}', build_time, disk_mb, latencies, recall)
+
+    def _run(self, index, queries, k):
+        index.search(queries[0], k)  # map the files before timing
+        results, latencies = [], []
+        for query in queries:
+            started = time.perf_counter()
+            hits = index.search(query, k)
+            latencies.append(time.perf_counter() - started)
+            results.append([item_id for item_id, _ in hits])
+        return results, latencies
+
+    def _report(self, size, mode, build_time, disk_mb, latencies, recall):
+        latency = percentiles(latencies, (50, 95))
+        p50, p95 = latency[50] * 1000, latency[95] * 1000
+        self.stdout.write(f"{size:>9} {mode:>12} {build_time:>8.1f} {disk_mb:>8.1f} "
+                          f"{p50:>8.2f} {p95:>8.2f} {recall:>10.3f}")
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Simulated web worker: load the model one way, run a forward pass, then idle until told to exit
+WORKER_SCRIPT = """
+import sys, torch, torchvision
+mode, path, arch = sys.argv[1:4]
+builder = getattr(torchvision.models, arch)
+if mode == 'mmap':
+    with torch.device('meta'):
+        model = builder(weights=None)
+    model.load_state_dict(torch.load(path, map_location='cpu', mmap=True, weights_only=True), assign=True)
+else:
+    model = builder(weights=None)
+    model.load_state_dict(torch.load(path, map_location='cpu', weights_only=True))
+model.eval()
+with torch.no_grad():
+    model(torch.rand(1, 3, 224, 224))
+print('ready', flush=True)
+sys.stdin.read()
+"""
+
+
+def _memory_kb(pid):
+    """(RSS, PSS) of a process in kB from /proc/<pid>/smaps_rollup"""
+    rss = pss = 0
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                rss = int(line.split()[1])
+            elif line.startswith('Pss:'):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+class Command(BaseCommand):
+    help = "Compare total worker memory with private vs memory-mapped model weights"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=settings.AI_MODEL_VERSION, help='torchvision model name')
+        parser.add_argument('--workers', default='1,4,8', help='comma separated worker counts')
+        parser.add_argument('--weights', default=None,
+                            help='state_dict file (defaults to AI_MODEL_WEIGHTS_DIR, else random weights)')
+
+    def handle(self, *args, **options):
+        import torch
+        from torchvision import models
+
+        arch = options['model']
+        weights_path = options['weights'] or os.path.join(str(settings.AI_MODEL_WEIGHTS_DIR), f'{arch}.pth')
+        temp_file = None
+        if not os.path.exists(weights_path):
+            # Memory behaviour does not depend on the values, so random weights are fine offline
+            temp_file = tempfile.NamedTemporaryFile(suffix='.pth', delete=False)
+            temp_file.close()
+            torch.save(getattr(models, arch)(weights=None).state_dict(), temp_file.name)
+            weights_path = temp_file.name
+            self.stdout.write(f"Using random {arch} weights in {weights_path}")
+
+        try:
+            self.stdout.write(f"{'mode':>8} {'workers':>8} {'total_rss_mb':>13} {'total_pss_mb':>13} {'pss/worker':>11}")
+            for count in [int(v) for v in options['workers'].split(',')]:
+                for mode in ('private', 'mmap'):
+                    rss, pss = self._measure(mode, count, weights_path, arch)
+                    self.stdout.write(
+                        f"{mode:>8} {count:>8} {rss / 1024:>13.1f} {pss / 1024:>13.1f} {pss / 1024 / count:>11.1f}"
+                    )
+        finally:
+            if temp_file is not None:
+                os.unlink(temp_file.name)
+
+    def _measure(self, mode, count, weights_path, arch):
+        procs = [
+            subprocess.Popen(
+                [sys.executable, '-c', WORKER_SCRIPT, mode, weights_path, arch],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            for _ in range(count)
+        ]
+        try:
+            for proc in procs:
+                proc.stdout.readline()
+            totals = [_memory_kb(proc.pid) for proc in procs]
+            return sum(r for r, _ in totals), sum(p for _, p in totals)
+        finally:
+            for proc in procs:
+                proc.stdin.close()
+                proc.wait()
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lost_found_app.image_derivatives import delete_derivatives, derivatives_directory, write_derivatives
+from lost_found_app.models import FoundItem, LostItem
+
+
+class Command(BaseCommand):
+    help = "Write thumbnails and the cached model input crop for item images stored without them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='rebuild derivatives that already exist')
+        parser.add_argument('--chunk-size', type=int, default=200, help='rows read per query')
+
+    def handle(self, *args, **options):
+        for model in (LostItem, FoundItem):
+            queryset = model.objects.exclude(item_image='').exclude(item_image__isnull=True)
+            if not options['force']:
+                queryset = queryset.filter(image_derivatives={})
+            queryset = queryset.only('pk', 'item_image', 'image_derivatives').order_by('pk')
+
+            started = time.time()
+            done = failed = 0
+            for item in queryset.iterator(chunk_size=options['chunk_size']):
+                # Stored masters are left untouched: only uploads from now on are re-encoded
+                try:
+                    with item.item_image.open('rb') as f:
+                        data = f.read()
+                    derivatives = write_derivatives(data, derivatives_directory(item))
+                except Exception as e:
+                    self.stderr.write(f"Skipping {model.__name__} {item.pk}: {e}")
+                    failed += 1
+                    continue
+                model.objects.filter(pk=item.pk).update(image_derivatives=derivatives)
+                if item.image_derivatives:
+                    delete_derivatives(item.image_derivatives)
+                done += 1
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{model.__name__}: {done} built, {failed} failed in {time.time() - started:.1f}s"
+            ))
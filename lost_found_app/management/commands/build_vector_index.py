@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lost_found_app.embeddings import decode_embedding
+from lost_found_app.jobs import ITEM_MODELS
+from lost_found_app.vector_index import get_vector_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lost/found image similarity indexes from the stored item embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item-type', choices=sorted(ITEM_MODELS), default=None, help='rebuild one index only')
+        parser.add_argument('--partitions', type=int, default=0,
+                            help='coarse k-means partitions (0 = exact brute-force search; ~sqrt(rows) for large tables)')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import get_ai_service
+
+        model_version = get_ai_service().embedding_model_version
+        item_types = [options['item_type']] if options['item_type'] else sorted(ITEM_MODELS)
+
+        for item_type in item_types:
+            queryset = (
+                ITEM_MODELS[item_type].objects
+                .filter(image_embedding__isnull=False, embedding_model_version=model_version)
+                .order_by('pk')
+                .values_list('pk', 'image_embedding')
+            )
+            first = queryset.first()
+            if first is None:
+                self.stdout.write(f"{item_type}: no embeddings from {model_version}, run backfill_embeddings first")
+                continue
+
+            started = time.time()
+            dim = len(decode_embedding(first[1]))
+            size = get_vector_index(item_type).rebuild(
+                queryset.iterator(chunk_size=2000), dim, model_version, partitions=options['partitions']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{item_type}: indexed {size} items ({dim}-d, {model_version}) in {time.time() - started:.1f}s"
+            ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lost_found_app.match_discovery import discover_matches
+
+
+class Command(BaseCommand):
+    help = "Match newly created lost/found items and send match_found notifications (run from cron or with --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='new items matched per batch')
+        parser.add_argument('--backfill', action='store_true',
+                            help='on the first run, process existing items instead of starting from the newest')
+        parser.add_argument('--loop', action='store_true', help='keep running every --interval seconds')
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.time()
+                for item_type, (processed, created) in discover_matches(options['batch_size'], options['backfill']).items():
+                    if processed or not options['loop']:
+                        self.stdout.write(f"{item_type}: {processed} new item(s), {created} notification(s) "
+                                          f"in {time.time() - started:.2f}s")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
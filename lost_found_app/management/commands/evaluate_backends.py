@@ -0,0 +1,67 @@
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lost_found_app.inference_backends import INFERENCE_BACKENDS
+from lost_found_app.metrics import percentile
+
+
+class Command(BaseCommand):
+    help = "Compare inference backends against the fp32 eager baseline (top-1/top-5 agreement and latency)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', default=str(settings.AI_CALIBRATION_DIR), help='directory of local test images')
+        parser.add_argument('--model', default=settings.AI_MODEL_VERSION, help='torchvision model name')
+        parser.add_argument('--backends', default=','.join(INFERENCE_BACKENDS), help='comma separated backends')
+        parser.add_argument('--repeat', type=int, default=3, help='timed passes per image')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import PyTorchAIClassificationService
+
+        paths = []
+        for root, _, files in os.walk(options['images']):
+            paths.extend(os.path.join(root, name) for name in sorted(files)
+                         if name.lower().endswith(('.jpg', '.jpeg', '.png')))
+        if not paths:
+            raise CommandError(f"No images found under {options['images']}")
+
+        backends = [b for b in options['backends'].split(',') if b]
+        if 'eager' in backends:
+            backends.remove('eager')
+        backends.insert(0, 'eager')
+
+        baseline = None
+        self.stdout.write(f"model={options['model']} images={len(paths)} repeat={options['repeat']}")
+        self.stdout.write(f"{'backend':>14} {'effective':>14} {'top1_agree':>11} {'top5_agree':>11} {'p50_ms':>8} {'p95_ms':>8}")
+
+        for backend in backends:
+            service = PyTorchAIClassificationService(options['model'], backend=backend)
+            if not service.ensure_loaded():
+                self.stdout.write(self.style.ERROR(f"{backend:>14} failed to load"))
+                continue
+
+            images = [service.preprocess_image(path) for path in paths]
+            tensors = [service.transform(image) for image in images]
+            service._forward_batch([tensors[0]])  # warm-up
+
+            top5 = []
+            latencies = []
+            for tensor in tensors:
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    predictions, _ = service._forward_batch([tensor])[0]
+                    latencies.append(time.perf_counter() - start)
+                top5.append([p['category'] for p in predictions])
+
+            if baseline is None:
+                baseline = top5
+            top1_agree = statistics.mean(1.0 if a[0] == b[0] else 0.0 for a, b in zip(top5, baseline))
+            top5_agree = statistics.mean(len(set(a) & set(b)) / len(b) for a, b in zip(top5, baseline))
+
+            self.stdout.write(
+                f"{backend:>14} {service.backend:>14} {top1_agree:>11.3f} {top5_agree:>11.3f} "
+                f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f}"
+            )
@@ -0,0 +1,39 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Write a model's pretrained state_dict to AI_MODEL_WEIGHTS_DIR so inference can run offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=settings.AI_MODEL_VERSION, help='torchvision model name')
+        parser.add_argument('--from-file', default=None,
+                            help='existing checkpoint to convert instead of downloading from torchvision')
+        parser.add_argument('--force', action='store_true', help='overwrite an existing weights file')
+
+    def handle(self, *args, **options):
+        import torch
+        from torchvision import models
+
+        model_version = options['model']
+        output_path = os.path.join(str(settings.AI_MODEL_WEIGHTS_DIR), f'{model_version}.pth')
+        if os.path.exists(output_path) and not options['force']:
+            raise CommandError(f"{output_path} already exists (use --force to overwrite)")
+
+        if options['from_file']:
+            state_dict = torch.load(options['from_file'], map_location='cpu', weights_only=True)
+            if 'state_dict' in state_dict:
+                state_dict = state_dict['state_dict']
+            # Validate the checkpoint against the architecture before writing it
+            getattr(models, model_version)(weights=None).load_state_dict(state_dict)
+        else:
+            self.stdout.write(f"Downloading pretrained {model_version} weights...")
+            state_dict = getattr(models, model_version)(pretrained=True).state_dict()
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        # Contiguous tensors in the default zipfile format can be loaded with torch.load(mmap=True)
+        torch.save({key: value.contiguous() for key, value in state_dict.items()}, output_path)
+        size_mb = os.path.getsize(output_path) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output_path} ({size_mb:.1f} MB)"))
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lost_found_app.metrics import percentiles
+
+MAX_IMAGES = 16
+
+
+def _web_worker(env, image_paths, clients, duration, barrier, results):
+    """
+    One simulated web worker (a spawned process with its own settings):
+    ``clients`` closed-loop request threads call predict() until ``duration`` is up.
+    """
+    os.environ.update(env)
+    import django
+
+    django.setup()
+    from PIL import Image
+
+    from lost_found_app.ai_service import get_ai_service
+    from lost_found_app.inference_backends import mark_web_worker
+
+    mark_web_worker(int(env['WEB_CONCURRENCY']))
+
+    service = get_ai_service()
+    if not service.ensure_loaded():
+        barrier.abort()
+        return
+    if image_paths:
+        images = [service.preprocess_image(path) for path in image_paths]
+        for image in images:
+            image.load()
+    else:
+        rng = np.random.default_rng(os.getpid())
+        images = [Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)) for _ in range(4)]
+    service.predict(images[0])  # warm-up, outside the measurement
+
+    latencies = []
+    lock = threading.Lock()
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        position = offset
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            service.predict(images[position % len(images)])
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+            position += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((service.torch_threads, latencies))
+    if hasattr(service, 'pool'):
+        service.pool.shutdown()
+
+
+class Command(BaseCommand):
+    help = "Concurrent inference latency percentiles for web worker x torch thread combinations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--combos', default=None,
+                            help='comma separated WORKERSxTHREADS, e.g. 1x4,2x2,4x1 (0 threads = AI_TORCH_INTRA_OP_THREADS '
+                                 'auto budget); default compares the auto budget with every worker using all cores')
+        parser.add_argument('--clients', type=int, default=4, help='concurrent request threads per worker')
+        parser.add_argument('--duration', type=float, default=15.0, help='seconds measured per combination')
+        parser.add_argument('--pool', type=int, default=0, help='AI_INFERENCE_POOL_SIZE for the workers')
+        parser.add_argument('--batch-size', type=int, default=None, help='AI_BATCH_MAX_SIZE (default: the current setting)')
+        parser.add_argument('--images', default=str(settings.MEDIA_ROOT),
+                            help='directory of sample images (random images when it has none)')
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        combos = options['combos'] or f'1x0,2x0,4x0,2x{cores},4x{cores}'
+        try:
+            combos = list(dict.fromkeys(tuple(int(v) for v in combo.split('x')) for combo in combos.split(',')))
+        except ValueError:
+            raise CommandError("--combos takes WORKERSxTHREADS pairs, e.g. 2x2")
+
+        image_paths = self._sample_images(options['images'])
+        batch_size = options['batch_size'] or getattr(settings, 'AI_BATCH_MAX_SIZE', 1)
+        self.stdout.write(f"{cores} CPU(s), {len(image_paths) or 'random'} images, {options['clients']} clients/worker, "
+                          f"batch size {batch_size}, pool {options['pool']}, {options['duration']:.0f}s per combination")
+        self.stdout.write(f"{'workers':>7} {'threads':>8} {'req/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+
+        context = multiprocessing.get_context('spawn')
+        for workers, threads in combos:
+            env = {
+                'WEB_CONCURRENCY': str(workers),
+                'AI_TORCH_INTRA_OP_THREADS': str(threads),
+                'AI_INFERENCE_POOL_SIZE': str(options['pool']),
+                'AI_BATCH_MAX_SIZE': str(batch_size),
+                'AI_WARMUP_ON_STARTUP': 'False',
+            }
+            barrier = context.Barrier(workers + 1)
+            results = context.Queue()
+            processes = [
+                context.Process(target=_web_worker,
+                                args=(env, image_paths, options['clients'], options['duration'], barrier, results))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            try:
+                barrier.wait(timeout=600)
+            except threading.BrokenBarrierError:
+                for process in processes:
+                    process.terminate()
+                raise CommandError("A worker could not load the AI model")
+
+            collected = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            latencies = [latency for _, worker_latencies in collected for latency in worker_latencies]
+            latency = percentiles(latencies)
+            p50, p95, p99 = latency[50] * 1000, latency[95] * 1000, latency[99] * 1000
+            torch_threads = collected[0][0][0] if collected[0][0] else threads
+            self.stdout.write(f"{workers:>7} {torch_threads:>8} {len(latencies) / options['duration']:>8.1f} "
+                              f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {max(latencies) * 1000:>8.1f}")
+
+    def _sample_images(self, directory):
+        paths = []
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    paths.append(os.path.join(root, name))
+                if len(paths) >= MAX_IMAGES:
+                    return paths
+        return paths
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from lost_found_app.models import FoundItem, LostItem
+from lost_found_app.search import check_search_index, fts_available, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 full-text search index of lost and found items from the item tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='only verify the index against the search tables')
+
+    def handle(self, *args, **options):
+        for model in (LostItem, FoundItem):
+            if not fts_available(model):
+                raise CommandError("No FTS5 search index on this database (search uses the LIKE fallback)")
+
+            if options['check']:
+                try:
+                    check_search_index(model)
+                except DatabaseError as e:
+                    raise CommandError(f"{model.__name__} search index is inconsistent ({e}); rebuild it")
+                self.stdout.write(self.style.SUCCESS(f"{model.__name__}: search index OK"))
+                continue
+
+            started = time.time()
+            with transaction.atomic():
+                count = rebuild_search_index(model)
+            self.stdout.write(self.style.SUCCESS(
+                f"{model.__name__}: {count} items indexed in {time.time() - started:.1f}s"
+            ))
@@ -0,0 +1,178 @@
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from lost_found_app.image_derivatives import load_patch
+from lost_found_app.jobs import ITEM_MODELS, classification_fields
+from lost_found_app.prediction_cache import content_hash
+from lost_found_app.vector_index import sync_item_embedding
+
+EMBEDDING_FIELDS = ['image_embedding', 'embedding_model_version']
+UPDATE_FIELDS = [
+    'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_image_hash', 'ai_model_version', 'ai_status',
+] + EMBEDDING_FIELDS
+
+
+def _load(service, item):
+    """
+    Read and fully decode one item's image (runs in the worker pool; PIL
+    releases the GIL while decoding). Items ingested with derivatives load
+    their cached model input crop instead of decoding the master.
+    """
+    try:
+        derivatives = item.image_derivatives or {}
+        if derivatives.get('patch') and derivatives.get('source_hash'):
+            try:
+                return derivatives['source_hash'], load_patch(derivatives), None
+            except OSError:
+                pass  # derivative missing on disk: decode the master
+        with open(item.item_image.path, 'rb') as f:
+            data = f.read()
+        image = service.preprocess_image(io.BytesIO(data))
+        image.load()
+        return content_hash(data), image, None
+    except Exception as e:
+        return None, None, e
+
+
+class Command(BaseCommand):
+    help = "Re-run AI classification over stored item images with batched inference (resumable)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item-type', choices=sorted(ITEM_MODELS), default=None, help='only lost or found items')
+        parser.add_argument('--stale-only', action='store_true',
+                            help='skip items already classified by the current model configuration')
+        parser.add_argument('--batch-size', type=int, default=16, help='images per forward pass')
+        parser.add_argument('--chunk-size', type=int, default=256, help='rows per bulk_update and checkpoint')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='image decoding threads')
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / 'reclassify_checkpoint.json'),
+                            help='progress file; an interrupted run resumes from it')
+        parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import get_ai_service
+
+        self.service = get_ai_service()
+        if not self.service.ensure_loaded():
+            raise CommandError("AI model could not be loaded")
+        self.version = self.service.model_version
+        self.options = options
+
+        self.checkpoint = self._read_checkpoint()
+        self.stdout.write(f"Reclassifying with {self.version}"
+                          + (f", resuming from {options['checkpoint']}" if self.checkpoint['last_pk'] else ''))
+
+        item_types = [options['item_type']] if options['item_type'] else sorted(ITEM_MODELS)
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for item_type in item_types:
+                self._reclassify(item_type, pool)
+
+        # A finished run leaves nothing to resume
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+
+    def _read_checkpoint(self):
+        path = self.options['checkpoint']
+        if not self.options['restart'] and os.path.exists(path):
+            with open(path) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('model_version') == self.version:
+                return checkpoint
+            self.stdout.write(f"Ignoring checkpoint written for {checkpoint.get('model_version')}")
+        return {'model_version': self.version, 'last_pk': {}}
+
+    def _write_checkpoint(self):
+        tmp_path = self.options['checkpoint'] + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.options['checkpoint'])
+
+    def _reclassify(self, item_type, pool):
+        model = ITEM_MODELS[item_type]
+        queryset = model.objects.exclude(item_image='').exclude(item_image__isnull=True)
+        if self.options['stale_only']:
+            queryset = queryset.filter(~Q(ai_model_version=self.version) | ~Q(ai_status='done'))
+        last_pk = self.checkpoint['last_pk'].get(item_type)
+        if last_pk:
+            queryset = queryset.filter(pk__gt=last_pk)
+        queryset = queryset.only('pk', 'item_image', 'image_derivatives').order_by('pk')
+
+        self.started = time.time()
+        self.done = self.failed = 0
+        pending = []
+        previous = None
+        batch = []
+        for item in queryset.iterator(chunk_size=self.options['chunk_size']):
+            batch.append(item)
+            if len(batch) == self.options['batch_size']:
+                # Decode this batch in the pool while the previous one is on the model
+                current = (batch, [pool.submit(_load, self.service, i) for i in batch])
+                if previous:
+                    pending += self._classify(*previous)
+                previous, batch = current, []
+                if len(pending) >= self.options['chunk_size']:
+                    self._flush(model, item_type, pending)
+                    pending = []
+
+        if batch:
+            current = (batch, [pool.submit(_load, self.service, i) for i in batch])
+            if previous:
+                pending += self._classify(*previous)
+            previous = current
+        if previous:
+            pending += self._classify(*previous)
+        if pending:
+            self._flush(model, item_type, pending)
+
+        elapsed = time.time() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"{model.__name__}: {self.done} reclassified, {self.failed} failed in {elapsed:.1f}s "
+            f"({self.done / elapsed if elapsed else 0.0:.1f} images/s)"
+        ))
+
+    def _classify(self, batch, futures):
+        """Run one forward pass over a decoded batch and set the AI fields on its items"""
+        loaded = [future.result() for future in futures]
+        ready = [(item, image_hash, image) for item, (image_hash, image, error) in zip(batch, loaded) if error is None]
+
+        for item, (_, _, error) in zip(batch, loaded):
+            if error is not None:
+                self.stderr.write(f"{type(item).__name__} {item.pk}: {error}")
+                item.ai_status = 'failed'
+                self.failed += 1
+
+        if ready:
+            results = self.service.predict_batch([image for _, _, image in ready], with_embeddings=True)
+            for (item, image_hash, _), (predictions, processing_time, embedding) in zip(ready, results):
+                result = self.service.build_result(predictions, processing_time, self.version, image_hash, embedding)
+                for field, value in classification_fields(result, self.version).items():
+                    setattr(item, field, value)
+            self.done += len(ready)
+        return batch
+
+    def _flush(self, model, item_type, items):
+        """Write a chunk back in one bulk_update, mirror embeddings into the index and checkpoint"""
+        classified = [item for item in items if item.ai_status == 'done']
+        failed = [item for item in items if item.ai_status == 'failed']
+        # Models without an embedding hook leave the (deferred) embedding fields alone
+        with_embeddings = all('image_embedding' in item.__dict__ for item in classified)
+        fields = UPDATE_FIELDS if with_embeddings else [f for f in UPDATE_FIELDS if f not in EMBEDDING_FIELDS]
+        if classified:
+            model.objects.bulk_update(classified, fields)
+        if failed:
+            model.objects.bulk_update(failed, ['ai_status'])
+        if with_embeddings:
+            for item in classified:
+                sync_item_embedding(item_type, item.pk, item.image_embedding, item.embedding_model_version)
+
+        self.checkpoint['last_pk'][item_type] = str(items[-1].pk)
+        self._write_checkpoint()
+        elapsed = time.time() - self.started
+        self.stdout.write(f"  {model.__name__}: {self.done + self.failed} processed "
+                          f"({self.done / elapsed if elapsed else 0.0:.1f} images/s)")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lost_found_app.counters import COUNTERS, reconcile_counter
+
+
+class Command(BaseCommand):
+    help = "Recount the denormalised counters (claims per found item, unread notifications per user) and repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only report the rows that drifted')
+
+    def handle(self, *args, **options):
+        for field, (model, _) in COUNTERS.items():
+            with transaction.atomic():
+                drifted = reconcile_counter(field, dry_run=options['dry_run'])
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS(f"{model.__name__}.{field}: OK"))
+            elif options['dry_run']:
+                self.stdout.write(self.style.WARNING(f"{model.__name__}.{field}: {drifted} row(s) drifted"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{model.__name__}.{field}: {drifted} row(s) repaired"))
@@ -0,0 +1,51 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from lost_found_app.jobs import release_stale_jobs, run_pending_jobs
+from lost_found_app.match_discovery import discover_matches
+
+
+class Command(BaseCommand):
+    help = "Process queued image classification jobs for lost and found items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='jobs claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='seconds to sleep when the queue is empty')
+        parser.add_argument('--lease-seconds', type=int, default=300, help='requeue running jobs locked longer than this')
+        parser.add_argument('--once', action='store_true', help='drain the queue once and exit')
+        parser.add_argument('--no-match-discovery', action='store_true',
+                            help='do not match newly created items after each poll (see discover_matches)')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import get_ai_service
+
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        service = get_ai_service()
+        service.ensure_loaded()
+        self.stdout.write(f"Classification worker {worker_id} started (model loaded: {service.model_loaded})")
+
+        processed = 0
+        try:
+            while True:
+                released = release_stale_jobs(options['lease_seconds'])
+                if released:
+                    self.stdout.write(f"Requeued {released} stale job(s)")
+
+                count = run_pending_jobs(worker_id, limit=options['batch_size'], service=service)
+                processed += count
+
+                # New items are matched once their classification has landed
+                if not options['no_match_discovery']:
+                    discover_matches()
+
+                if count == 0:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker_id} processed {processed} job(s)"))
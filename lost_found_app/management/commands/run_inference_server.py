@@ -0,0 +1,59 @@
+import os
+import socket
+import stat
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+
+class Command(BaseCommand):
+    help = "Serve image classification to web workers over a Unix socket (see AI_INFERENCE_SERVER_SOCKET)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=getattr(settings, 'AI_INFERENCE_SERVER_SOCKET', '') or None,
+                            help='socket path (default: AI_INFERENCE_SERVER_SOCKET)')
+        parser.add_argument('--mode', default='660', help='octal permissions of the socket file')
+
+    def handle(self, *args, **options):
+        from lost_found_app.ai_service import get_ai_service
+        from lost_found_app.inference_server import InferenceServer
+
+        path = options['socket']
+        if not path:
+            raise CommandError("Set AI_INFERENCE_SERVER_SOCKET or pass --socket")
+        self._remove_stale_socket(path)
+
+        service = get_ai_service(local=True)
+        if not service.ensure_loaded():
+            raise CommandError("AI model could not be loaded")
+        service.predict(Image.new('RGB', (256, 256)))  # warm-up before taking traffic
+
+        server = InferenceServer(path, service)
+        os.chmod(path, int(options['mode'], 8))
+        self.stdout.write(f"Inference server {os.getpid()} serving {service.model_version} on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(path):
+                os.remove(path)
+        self.stdout.write(self.style.SUCCESS(f"Inference server stopped after {server.requests} request(s)"))
+
+    def _remove_stale_socket(self, path):
+        """A socket file left by a crashed server is removed; a live server is not replaced"""
+        if not os.path.exists(path):
+            return
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise CommandError(f"{path} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+        else:
+            raise CommandError(f"An inference server is already listening on {path}")
+        finally:
+            probe.close()
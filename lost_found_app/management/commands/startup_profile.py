@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+# Importing any of these during startup means something pulls in the model stack eagerly
+HEAVY_MODULES = ('torch', 'torchvision', 'numpy')
+
+STARTUP_SCRIPT = (
+    "import django; django.setup(); "
+    "import {urlconf}; "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+
+class Command(BaseCommand):
+    help = "Report per-module import time for a cold Django startup (settings, apps and URLconf)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='number of slowest modules to list')
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help='exit with an error if total import time exceeds this')
+        parser.add_argument('--fail-on-heavy', action='store_true',
+                            help='exit with an error if torch/torchvision/numpy are imported at startup')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'lost_found_project.settings'))
+        env.pop('PYTHONPROFILEIMPORTTIME', None)
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT.format(urlconf=settings.ROOT_URLCONF)],
+            cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Startup failed:\n{proc.stderr[-2000:]}")
+
+        modules = []
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+
+        # Top-level imports (depth 0) add up to the whole startup cost
+        total = sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1e6
+        heavy = sorted({name for name, _, _, _ in modules if name.split('.')[0] in HEAVY_MODULES})
+
+        self.stdout.write(f"Modules imported: {len(modules)}")
+        self.stdout.write(f"Total import time: {total:.3f}s")
+        self.stdout.write(f"{'cumulative_ms':>14} {'self_ms':>9}  module")
+        for name, self_us, cumulative_us, _ in sorted(modules, key=lambda m: m[2], reverse=True)[:options['top']]:
+            self.stdout.write(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"Heavy modules imported at startup: {', '.join(sorted({h.split('.')[0] for h in heavy}))}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No heavy ML modules imported at startup"))
+
+        if options['fail_on_heavy'] and heavy:
+            raise CommandError("Heavy ML modules are imported during startup")
+        if options['max_seconds'] is not None and total > options['max_seconds']:
+            raise CommandError(f"Startup import time {total:.3f}s exceeds {options['max_seconds']:.3f}s")
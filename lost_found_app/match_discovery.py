@@ -0,0 +1,143 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import refresh_unread_counts
+from .matching import SCORING_FIELDS, SIDES, find_matches_batch
+from .models import MatchDiscoveryCursor, Notification
+
+logger = logging.getLogger(__name__)
+
+
+def _get_cursor(item_type, backfill=False):
+    """
+    The item type's high-water mark. A new cursor starts at the newest
+    existing item, so enabling discovery does not notify about the whole
+    history unless ``backfill`` is set.
+    """
+    cursor = MatchDiscoveryCursor.objects.filter(item_type=item_type).first()
+    if cursor is not None:
+        return cursor
+
+    cursor = MatchDiscoveryCursor(item_type=item_type)
+    if not backfill:
+        newest = SIDES[item_type]['model'].objects.order_by('-created_at', '-pk').values('created_at', 'pk').first()
+        if newest:
+            cursor.last_created_at, cursor.last_item_id = newest['created_at'], newest['pk']
+    cursor.save()
+    return cursor
+
+
+def _next_batch(item_type, cursor, batch_size):
+    """Items created after the cursor, oldest first, with just the fields scoring reads"""
+    side = SIDES[item_type]
+    queryset = side['model'].objects.order_by('created_at', 'pk')
+    if cursor.last_created_at is not None:
+        # (created_at, pk) > cursor; the leading range makes it an index range scan rather than a full index walk
+        queryset = queryset.filter(created_at__gte=cursor.last_created_at).filter(
+            Q(created_at__gt=cursor.last_created_at) | Q(pk__gt=cursor.last_item_id)
+        )
+    fields = SCORING_FIELDS + [side['location'], side['date'], 'status', 'ai_status', 'created_at']
+    return list(queryset.only(*fields)[:batch_size])
+
+
+def _ready_prefix(items):
+    """
+    Leading items whose AI labels and embedding are in, so they are matched
+    with every signal. A pending item holds back the ones after it, up to
+    MATCH_DISCOVERY_MAX_WAIT_SECONDS (the classification worker may be down).
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'MATCH_DISCOVERY_MAX_WAIT_SECONDS', 600))
+    for position, item in enumerate(items):
+        if item.ai_status == 'pending' and item.created_at > cutoff:
+            return items[:position]
+    return items
+
+
+def _build_notifications(item_type, matches_by_item, items):
+    """Unsent match_found notifications for the lost item's owner, one per lost/found pair"""
+    pairs = []
+    for item in items:
+        for candidate, score, _ in matches_by_item.get(item.pk, []):
+            lost, found = (item, candidate) if item_type == 'lost' else (candidate, item)
+            pairs.append((lost, found, score))
+    if not pairs:
+        return []
+
+    already_sent = set(
+        Notification.objects.filter(
+            notification_type='match_found',
+            lost_item_id__in={lost.pk for lost, _, _ in pairs},
+            found_item_id__in={found.pk for _, found, _ in pairs},
+        ).values_list('lost_item_id', 'found_item_id')
+    )
+
+    notifications = []
+    for lost, found, score in pairs:
+        if (lost.pk, found.pk) in already_sent:
+            continue
+        already_sent.add((lost.pk, found.pk))
+        notifications.append(Notification(
+            user_id=lost.user_id,
+            notification_type='match_found',
+            title='Potential Match Found',
+            message=f'A found item "{found.title}" may be your lost "{lost.title}" ({score:.0%} match).',
+            lost_item_id=lost.pk,
+            found_item_id=found.pk,
+        ))
+    return notifications
+
+
+def discover_matches_for(item_type, batch_size=None, backfill=False):
+    """
+    Match items of ``item_type`` created since the last run against open
+    items on the other side and notify owners of lost items about new
+    pairs. Each batch costs a fixed number of queries, plus one per item
+    with no category, AI label or visual neighbours to narrow its candidates.
+    Returns ``(items_processed, notifications_created)``.
+    """
+    batch_size = batch_size or getattr(settings, 'MATCH_DISCOVERY_BATCH_SIZE', 100)
+    min_score = getattr(settings, 'MATCH_NOTIFY_MIN_SCORE', 0.5)
+    per_item = getattr(settings, 'MATCH_NOTIFY_MAX_PER_ITEM', 5)
+    open_status = SIDES[item_type]['open_status']
+
+    cursor = _get_cursor(item_type, backfill=backfill)
+    processed = created = 0
+    while True:
+        items = _ready_prefix(_next_batch(item_type, cursor, batch_size))
+        if not items:
+            break
+
+        open_items = [item for item in items if item.status == open_status]
+        matches = find_matches_batch(open_items, item_type, min_score=min_score, limit=per_item) if open_items else {}
+        notifications = _build_notifications(item_type, matches, open_items)
+
+        with transaction.atomic():
+            # ignore_conflicts: a concurrent run may have sent the same pair already
+            Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+            # Ids are generated client side, so the skipped rows are the ids that are not in the table
+            inserted = 0
+            if notifications:
+                inserted = Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).count()
+            # bulk_create() bypasses save(), and skipped conflicts are not reported: recount the owners' unread
+            refresh_unread_counts({notification.user_id for notification in notifications})
+            cursor.last_created_at, cursor.last_item_id = items[-1].created_at, items[-1].pk
+            cursor.save(update_fields=['last_created_at', 'last_item_id', 'updated_at'])
+
+        processed += len(items)
+        created += inserted
+        if len(items) < batch_size:
+            break
+
+    if created:
+        logger.info(f"Match discovery: {created} notification(s) for {processed} new {item_type} item(s)")
+    return processed, created
+
+
+def discover_matches(batch_size=None, backfill=False):
+    """Run discovery for new lost and new found items"""
+    return {item_type: discover_matches_for(item_type, batch_size, backfill) for item_type in ('lost', 'found')}
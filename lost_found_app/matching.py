@@ -0,0 +1,289 @@
+import logging
+import re
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import FoundItem, LostItem
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each signal; signals that cannot be computed for a pair
+# (e.g. no brand on one side) are left out and the rest re-normalised
+MATCH_WEIGHTS = {
+    'text': 0.30,
+    'ai_label': 0.20,
+    'image': 0.20,
+    'location': 0.10,
+    'date': 0.08,
+    'color': 0.07,
+    'brand': 0.05,
+}
+
+STOPWORDS = {
+    'a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'is', 'it', 'my', 'near', 'of',
+    'on', 'or', 'the', 'to', 'was', 'with', 'lost', 'found', 'item',
+}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# How each side of a match is stored: model, where/when fields and the status that means "still open"
+SIDES = {
+    'lost': {'model': LostItem, 'location': 'lost_location', 'date': 'lost_date', 'open_status': 'lost'},
+    'found': {'model': FoundItem, 'location': 'found_location', 'date': 'found_date', 'open_status': 'found'},
+}
+
+# Fields read for scoring; everything else stays in the DB until a page is serialised
+SCORING_FIELDS = [
+    'id', 'user', 'category', 'title', 'description', 'brand', 'color',
+    'ai_suggested_category', 'ai_top_predictions', 'image_embedding', 'embedding_model_version',
+]
+
+
+def tokens(text):
+    return {token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOPWORDS and len(token) > 1}
+
+
+def overlap(a, b):
+    """Cosine similarity of two token sets (0 when either is empty)"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / (len(a) * len(b)) ** 0.5
+
+
+def label_scores(item):
+    """AI top-k labels as {label: probability 0-1}"""
+    predictions = (item.ai_top_predictions or {}).get('predictions', [])
+    return {p['category']: p['confidence'] / 100.0 for p in predictions}
+######################################################################################################################################################
+######################################################################################################################################################
+class MatchProfile:
+    """Pre-tokenised view of one item, so each candidate pair is scored without re-parsing text"""
+    def __init__(self, item, item_type):
+        side = SIDES[item_type]
+        self.item = item
+        self.text = tokens(f'{item.title} {item.description}')
+        self.location = tokens(getattr(item, side['location']))
+        self.date = getattr(item, side['date'])
+        self.color = tokens(item.color)
+        self.brand = tokens(item.brand)
+        self.labels = label_scores(item)
+        self._embedding = None
+
+    @property
+    def embedding(self):
+        if self._embedding is None and self.item.image_embedding is not None:
+            from .embeddings import decode_embedding
+            self._embedding = decode_embedding(self.item.image_embedding)
+        return self._embedding
+
+
+def score_pair(lost, found, window_days):
+    """
+    Weighted match score (0-1) of a lost and a found MatchProfile, plus the
+    per-signal breakdown it was computed from.
+    """
+    breakdown = {
+        'text': overlap(lost.text, found.text),
+        'location': overlap(lost.location, found.location),
+    }
+
+    if lost.labels and found.labels:
+        # Probability mass both sides give the same labels; agreeing at 50% each counts as a full match
+        shared = lost.labels.keys() & found.labels.keys()
+        breakdown['ai_label'] = min(sum(min(lost.labels[label], found.labels[label]) for label in shared) * 2, 1.0)
+
+    if (lost.item.embedding_model_version and lost.item.embedding_model_version == found.item.embedding_model_version
+            and lost.embedding is not None and found.embedding is not None):
+        breakdown['image'] = max(float(lost.embedding @ found.embedding), 0.0)
+
+    if lost.color and found.color:
+        breakdown['color'] = 1.0 if lost.color & found.color else 0.0
+    if lost.brand and found.brand:
+        breakdown['brand'] = 1.0 if lost.brand & found.brand else 0.0
+
+    if lost.date and found.date:
+        days = (found.date - lost.date).days
+        # Found well before it was lost cannot be the same item; a zero-day window scores same-day finds only
+        breakdown['date'] = 0.0 if days < -1 else max(0.0, 1.0 - max(days, 0) / max(window_days, 1))
+
+    total_weight = sum(MATCH_WEIGHTS[signal] for signal in breakdown)
+    score = sum(MATCH_WEIGHTS[signal] * value for signal, value in breakdown.items()) / total_weight
+    return score, {signal: round(value, 4) for signal, value in breakdown.items()}
+
+
+def date_window(item_date, item_type, window_days):
+    """(first, last) date an item on the other side may carry: found items turn up after the loss"""
+    if item_type == 'lost':
+        return item_date - timedelta(days=1), item_date + timedelta(days=window_days)
+    return item_date - timedelta(days=window_days), item_date + timedelta(days=1)
+
+
+def candidate_filter(item, item_type, window_days, visual_ids=()):
+    """
+    Q() selecting the open items on the other side worth scoring against
+    ``item``: not its owner's, inside its date window and sharing the
+    category or AI label (or visually close). ``is_candidate()`` is the same
+    test in memory.
+    """
+    target = SIDES['found' if item_type == 'lost' else 'lost']
+    item_date = getattr(item, SIDES[item_type]['date'])
+
+    condition = ~Q(user_id=item.user_id)
+    if item_date:
+        condition &= Q(**{f"{target['date']}__range": date_window(item_date, item_type, window_days)})
+
+    related = Q()
+    if item.category_id:
+        related |= Q(category_id=item.category_id)
+    if item.ai_suggested_category:
+        related |= Q(ai_suggested_category=item.ai_suggested_category)
+    if visual_ids:
+        related |= Q(pk__in=visual_ids)
+    return condition & related if related else condition
+
+
+def is_candidate(item, item_type, window_days, visual_ids, candidate):
+    """Whether ``candidate`` (an open item on the other side) passes candidate_filter() for ``item``"""
+    target = SIDES['found' if item_type == 'lost' else 'lost']
+    if candidate.user_id == item.user_id:
+        return False
+    item_date = getattr(item, SIDES[item_type]['date'])
+    if item_date:
+        first, last = date_window(item_date, item_type, window_days)
+        candidate_date = getattr(candidate, target['date'])
+        if not (candidate_date and first <= candidate_date <= last):
+            return False
+    if not (item.category_id or item.ai_suggested_category or visual_ids):
+        return True
+    return bool(
+        (item.category_id and candidate.category_id == item.category_id)
+        or (item.ai_suggested_category and candidate.ai_suggested_category == item.ai_suggested_category)
+        or candidate.pk in visual_ids
+    )
+
+
+def _open_candidates(item_type, condition):
+    """Open items on the other side matching ``condition``, closest in time first (as every cap expects)"""
+    target_type = 'found' if item_type == 'lost' else 'lost'
+    target = SIDES[target_type]
+    ordering = target['date'] if item_type == 'lost' else f"-{target['date']}"
+    return (target['model'].objects.filter(status=target['open_status']).filter(condition)
+            .only(*SCORING_FIELDS, target['location'], target['date']).order_by(ordering, 'pk'))
+
+
+def candidate_queryset(item, item_type, window_days, visual_ids=()):
+    """
+    Open items on the other side worth scoring (see candidate_filter()).
+    Every filter here is served by an index on the target table.
+    """
+    # Closest in time first, so the MATCH_MAX_CANDIDATES cap drops the least likely items
+    return _open_candidates(item_type, candidate_filter(item, item_type, window_days, visual_ids))
+
+
+def visual_neighbours_batch(items, item_type, k):
+    """
+    Ids of the ``k`` most visually similar items on the other side for each
+    of ``items``, as ``{item.pk: [id, ...]}``, from one pass over the image index
+    """
+    neighbours = {item.pk: [] for item in items}
+    queried = [item for item in items if item.image_embedding is not None and item.embedding_model_version]
+    if not queried:
+        return neighbours
+    try:
+        from .vector_index import get_vector_index
+        index = get_vector_index('found' if item_type == 'lost' else 'lost')
+        queried = [item for item in queried if item.embedding_model_version == index.model_version]
+        for item, hits in zip(queried, index.search_many([item.image_embedding for item in queried], k=k)):
+            neighbours[item.pk] = [item_id for item_id, _ in hits]
+    except Exception as e:
+        logger.warning(f"Image index lookup failed for {len(queried)} {item_type} item(s): {str(e)}")
+    return neighbours
+
+
+def visual_neighbours(item, item_type, k):
+    """Ids of the ``k`` most visually similar items on the other side, from the image index"""
+    return visual_neighbours_batch([item], item_type, k)[item.pk]
+
+
+def find_matches(item, item_type):
+    """
+    Rank open items on the other side against ``item`` (a LostItem for
+    ``item_type='lost'``, a FoundItem for 'found').
+    Returns ``[(candidate, score, breakdown)]`` best first.
+    """
+    window_days = getattr(settings, 'MATCH_DATE_WINDOW_DAYS', 90)
+    max_candidates = getattr(settings, 'MATCH_MAX_CANDIDATES', 500)
+    min_score = getattr(settings, 'MATCH_MIN_SCORE', 0.15)
+    target_type = 'found' if item_type == 'lost' else 'lost'
+
+    visual_ids = visual_neighbours(item, item_type, getattr(settings, 'MATCH_IMAGE_CANDIDATES', 50))
+    candidates = candidate_queryset(item, item_type, window_days, visual_ids)[:max_candidates]
+
+    profile = MatchProfile(item, item_type)
+    matches = []
+    for candidate in candidates:
+        other = MatchProfile(candidate, target_type)
+        lost, found = (profile, other) if item_type == 'lost' else (other, profile)
+        score, breakdown = score_pair(lost, found, window_days)
+        if score >= min_score:
+            matches.append((candidate, score, breakdown))
+
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches
+
+
+def find_matches_batch(items, item_type, min_score=None, limit=None):
+    """
+    find_matches() for many items of one type, with the same results.
+    One index pass finds every item's visual neighbours and one query reads
+    the union of the items' candidate_filter()s, closest in time first.
+    Each row is handed to the items it is a candidate for until an item
+    holds MATCH_MAX_CANDIDATES, which is exactly the prefix its own capped
+    candidate_queryset() would return; the read stops once every item is full.
+    Returns ``{item.pk: [(candidate, score, breakdown)]}``.
+    """
+    window_days = getattr(settings, 'MATCH_DATE_WINDOW_DAYS', 90)
+    max_candidates = getattr(settings, 'MATCH_MAX_CANDIDATES', 500)
+    min_score = getattr(settings, 'MATCH_MIN_SCORE', 0.15) if min_score is None else min_score
+    target_type = 'found' if item_type == 'lost' else 'lost'
+
+    visual_ids = {
+        pk: {uuid.UUID(item_id) for item_id in ids}
+        for pk, ids in visual_neighbours_batch(items, item_type, getattr(settings, 'MATCH_IMAGE_CANDIDATES', 50)).items()
+    }
+    candidates = {item.pk: [] for item in items}
+    filling = [item for item in items if max_candidates > 0]
+    if filling:
+        condition = Q()
+        for item in filling:
+            condition |= candidate_filter(item, item_type, window_days, visual_ids[item.pk])
+        item_dates = [getattr(item, SIDES[item_type]['date']) for item in filling]
+        if all(item_dates):
+            # The span of all the windows, so the read is a range of the (status, date) index
+            windows = [date_window(item_date, item_type, window_days) for item_date in item_dates]
+            target_date = SIDES[target_type]['date']
+            condition &= Q(**{f'{target_date}__range': (min(w[0] for w in windows), max(w[1] for w in windows))})
+        for candidate in _open_candidates(item_type, condition).iterator(chunk_size=max_candidates):
+            other = None
+            for item in filling:
+                if is_candidate(item, item_type, window_days, visual_ids[item.pk], candidate):
+                    other = other or MatchProfile(candidate, target_type)
+                    candidates[item.pk].append((candidate, other))
+            filling = [item for item in filling if len(candidates[item.pk]) < max_candidates]
+            if not filling:
+                break
+
+    results = {}
+    for item in items:
+        profile = MatchProfile(item, item_type)
+        matches = []
+        for candidate, other in candidates[item.pk]:
+            lost, found = (profile, other) if item_type == 'lost' else (other, profile)
+            score, breakdown = score_pair(lost, found, window_days)
+            if score >= min_score:
+                matches.append((candidate, score, breakdown))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        results[item.pk] = matches[:limit] if limit else matches
+    return results
@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Stages of one classification, in the order a request goes through them
+STAGES = (
+    'upload',       # multipart parsing / spooling of the uploaded file (API views)
+    'decode',       # JPEG/PNG decode to an RGB image
+    'preprocess',   # resize, crop and normalise to the model's input tensor
+    'queue_wait',   # waiting in the micro-batcher for a forward pass
+    'forward',      # the model's forward pass
+    'postprocess',  # softmax, top-k, labels and embedding packing
+    'remote',       # round trip to the inference server (AI_INFERENCE_SERVER_SOCKET)
+    'log_write',    # buffered AIClassificationLog bulk insert (one observation per flush)
+    'total',        # classify_image end to end
+)
+# Histogram bucket upper bounds in seconds (Prometheus 'le' labels)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Percentiles are computed over each stage's most recent observations
+RECENT_SAMPLES = 2048
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    Nearest-rank percentiles of ``values`` as ``{point: value}``: the
+    smallest value with at least ``point`` percent of the values at or below
+    it (0.0 for every point when empty)
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {p: 0.0 for p in points}
+    return {p: ordered[min(max(math.ceil(p / 100.0 * len(ordered)) - 1, 0), len(ordered) - 1)] for p in points}
+
+
+def percentile(values, point):
+    return percentiles(values, (point,))[point]
+
+
+class Histogram:
+    """Cumulative bucket counts for Prometheus plus a window of recent values for percentiles"""
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.bucket_counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentiles(self, points=(50, 95, 99)):
+        return percentiles(self.recent, points)
+
+
+class StageMetrics:
+    """
+    Per-stage timing histograms and classification counters of this process.
+    Each gunicorn worker (and the inference server) keeps its own.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.results = Counter()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, result):
+        """Count one classification request by outcome: 'ok', 'cached' or 'error'"""
+        with self._lock:
+            self.results[result] += 1
+
+    def summary(self):
+        """Request counts and p50/p95/p99 per stage, for ai_service_status"""
+        with self._lock:
+            stages = {}
+            for stage, histogram in self.histograms.items():
+                if not histogram.count:
+                    continue
+                percentiles = histogram.percentiles()
+                stages[stage] = {
+                    'count': histogram.count,
+                    'mean_ms': round(histogram.sum / histogram.count * 1000, 3),
+                    'p50_ms': round(percentiles[50] * 1000, 3),
+                    'p95_ms': round(percentiles[95] * 1000, 3),
+                    'p99_ms': round(percentiles[99] * 1000, 3),
+                }
+            return {
+                'requests': sum(self.results.values()),
+                'errors': self.results['error'],
+                'cache_hits': self.results['cached'],
+                'stages': stages,
+            }
+
+    def prometheus(self, gauges=()):
+        """
+        Prometheus text exposition of the histograms and counters.
+        ``gauges`` adds ``(name, help, [(labels, value)])`` entries, e.g. model load times.
+        """
+        lines = [
+            '# HELP ai_stage_duration_seconds Time spent in each image classification stage.',
+            '# TYPE ai_stage_duration_seconds histogram',
+        ]
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + ('+Inf',), histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'ai_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'ai_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'ai_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines += [
+                '# HELP ai_classifications_total Image classification requests by outcome.',
+                '# TYPE ai_classifications_total counter',
+            ]
+            for result in ('ok', 'cached', 'error'):
+                lines.append(f'ai_classifications_total{{result="{result}"}} {self.results[result]}')
+
+        for name, help_text, samples in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{str(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = StageMetrics()
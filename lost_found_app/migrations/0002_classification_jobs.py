@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='founditem',
+            name='ai_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='lostitem',
+            name='ai_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ClassificationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('lost', 'Lost Item'), ('found', 'Found Item')], max_length=10)),
+                ('item_id', models.UUIDField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('dead', 'Dead Letter')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='lost_found__status_95a1c7_idx'), models.Index(fields=['item_type', 'item_id'], name='lost_found__item_ty_b164ee_idx')],
+            },
+        ),
+    ]
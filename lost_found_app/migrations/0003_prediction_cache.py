@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0002_classification_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='founditem',
+            name='ai_image_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lostitem',
+            name='ai_image_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='PredictionCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=50)),
+                ('predicted_category', models.CharField(max_length=200)),
+                ('confidence_score', models.FloatField()),
+                ('top_predictions', models.JSONField(default=dict)),
+                ('processing_time', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('content_hash', 'model_version')},
+            },
+        ),
+    ]
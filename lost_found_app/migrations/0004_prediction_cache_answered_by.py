@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0003_prediction_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictioncacheentry',
+            name='answered_by',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='predictioncacheentry',
+            name='model_version',
+            field=models.CharField(max_length=100),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0004_prediction_cache_answered_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='founditem',
+            name='embedding_model_version',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='founditem',
+            name='image_embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lostitem',
+            name='embedding_model_version',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='lostitem',
+            name='image_embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictioncacheentry',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictioncacheentry',
+            name='embedding_model_version',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
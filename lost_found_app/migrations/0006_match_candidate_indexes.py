@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0005_image_embeddings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='founditem',
+            index=models.Index(fields=['status', 'found_date'], name='lost_found__status_bf1784_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='founditem',
+            index=models.Index(fields=['ai_suggested_category'], name='lost_found__ai_sugg_b1716a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lostitem',
+            index=models.Index(fields=['status', 'lost_date'], name='lost_found__status_573e43_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lostitem',
+            index=models.Index(fields=['ai_suggested_category'], name='lost_found__ai_sugg_e58c5c_idx'),
+        ),
+    ]
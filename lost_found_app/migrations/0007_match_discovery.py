@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0006_match_candidate_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchDiscoveryCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('lost', 'Lost Item'), ('found', 'Found Item')], max_length=10, unique=True)),
+                ('last_created_at', models.DateTimeField(blank=True, null=True)),
+                ('last_item_id', models.UUIDField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('notification_type', 'match_found')), fields=('user', 'lost_item', 'found_item'), name='unique_match_found_notification'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0007_match_discovery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='founditem',
+            name='ai_model_version',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='lostitem',
+            name='ai_model_version',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0008_ai_model_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIClassificationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('model_version', models.CharField(max_length=50)),
+                ('predicted_category', models.CharField(max_length=200)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean_confidence', models.FloatField(default=0.0)),
+                ('latency_p50', models.FloatField(default=0.0)),
+                ('latency_p95', models.FloatField(default=0.0)),
+                ('latency_p99', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date', 'model_version', '-count'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='aiclassificationlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='aiclassificationlog',
+            index=models.Index(fields=['created_at'], name='ai_log_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='aiclassificationdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'model_version', 'predicted_category'), name='unique_classification_rollup'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0009_classification_log_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='founditem',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='lostitem',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
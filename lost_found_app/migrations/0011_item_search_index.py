@@ -0,0 +1,87 @@
+from django.db import migrations
+
+# Full-text search for lost/found items (SQLite FTS5; other backends use the LIKE fallback in search.py).
+# <table>_search holds one row per item with the searchable text under a stable INTEGER PRIMARY KEY,
+# kept in sync by triggers on the item table (so bulk_create/bulk_update/update() are covered too);
+# <table>_fts is an external-content FTS5 index over it, kept in sync by triggers on the search table.
+# The item tables' own rowids are not used because VACUUM may renumber them (UUID primary keys).
+SEARCH_TABLES = {
+    'lost_found_app_lostitem': 'lost_location',
+    'lost_found_app_founditem': 'found_location',
+}
+COLUMNS = ['title', 'description', 'location', 'brand', 'color', 'category']
+
+
+def _statements(table, location):
+    search, fts = f'{table}_search', f'{table}_fts'
+    sources = ['title', 'description', location, 'brand', 'color', 'ai_suggested_category']
+    columns = ', '.join(COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in sources)
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in sources)
+    assignments = ', '.join(f'{column} = new.{source}' for column, source in zip(COLUMNS, sources))
+    fts_new = ', '.join(f'new.{column}' for column in COLUMNS)
+    fts_old = ', '.join(f'old.{column}' for column in COLUMNS)
+    return [
+        f'CREATE TABLE "{search}" (rowid INTEGER PRIMARY KEY, item_id char(32) NOT NULL UNIQUE, '
+        + ', '.join(f'{column} TEXT' for column in COLUMNS) + ')',
+        f'CREATE VIRTUAL TABLE "{fts}" USING fts5({columns}, content=\'{search}\', content_rowid=\'rowid\', '
+        f'tokenize=\'unicode61 remove_diacritics 2\', prefix=\'2 3\')',
+
+        f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{search}" BEGIN '
+        f'INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.rowid, {fts_new}); END',
+        f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{search}" BEGIN '
+        f'INSERT INTO "{fts}"("{fts}", rowid, {columns}) VALUES (\'delete\', old.rowid, {fts_old}); END',
+        f'CREATE TRIGGER "{fts}_au" AFTER UPDATE ON "{search}" BEGIN '
+        f'INSERT INTO "{fts}"("{fts}", rowid, {columns}) VALUES (\'delete\', old.rowid, {fts_old}); '
+        f'INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.rowid, {fts_new}); END',
+
+        f'CREATE TRIGGER "{table}_search_ai" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{search}"(item_id, {columns}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER "{table}_search_au" AFTER UPDATE ON "{table}" WHEN {changed} BEGIN '
+        f'UPDATE "{search}" SET {assignments} WHERE item_id = new.id; END',
+        f'CREATE TRIGGER "{table}_search_ad" AFTER DELETE ON "{table}" BEGIN '
+        f'DELETE FROM "{search}" WHERE item_id = old.id; END',
+
+        f'INSERT INTO "{search}"(item_id, {columns}) SELECT id, {", ".join(sources)} FROM "{table}"',
+    ]
+
+
+def fts5_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+        except Exception:
+            return False
+        cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    if not fts5_available(schema_editor.connection):
+        return
+    for table, location in SEARCH_TABLES.items():
+        for statement in _statements(table, location):
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in SEARCH_TABLES:
+        for trigger in ('ai', 'au', 'ad'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS "{table}_search_{trigger}"')
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{table}_fts"')
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{table}_search"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0010_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0011_item_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['created_at', 'id'], name='lost_found__created_f10446_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='lost_found__user_id_fdfdbd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='founditem',
+            index=models.Index(fields=['created_at', 'id'], name='lost_found__created_cd7924_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='founditem',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='lost_found__user_id_c9a91c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lostitem',
+            index=models.Index(fields=['created_at', 'id'], name='lost_found__created_721077_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lostitem',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='lost_found__user_id_6219cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='lost_found__user_id_1cf461_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:05
+
+import importlib
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+search_index = importlib.import_module('lost_found_app.migrations.0011_item_search_index')
+
+
+def _count_of(queryset, key):
+    counted = queryset.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    FoundItem = apps.get_model('lost_found_app', 'FoundItem')
+    User = apps.get_model('lost_found_app', 'User')
+    Claim = apps.get_model('lost_found_app', 'Claim')
+    Notification = apps.get_model('lost_found_app', 'Notification')
+    FoundItem.objects.update(claim_count=_count_of(Claim.objects.all(), 'found_item'))
+    User.objects.update(unread_notification_count=_count_of(Notification.objects.filter(is_read=False), 'user'))
+
+
+def restore_search_index(apps, schema_editor):
+    """
+    SQLite rebuilds lost_found_app_founditem to add or remove a column, which
+    drops the search triggers 0011 created on it: recreate them and
+    repopulate the search table and FTS5 index from the item table
+    """
+    table = 'lost_found_app_founditem'
+    search, fts = f'{table}_search', f'{table}_fts'
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or fts not in connection.introspection.table_names():
+        return
+    location = search_index.SEARCH_TABLES[table]
+    for statement in search_index._statements(table, location):
+        if statement.startswith(f'CREATE TRIGGER "{table}_search_'):
+            trigger = statement.split('"')[1]
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS "{trigger}"')
+            schema_editor.execute(statement)
+    sources = ['title', 'description', location, 'brand', 'color', 'ai_suggested_category']
+    schema_editor.execute(f'DELETE FROM "{search}"')
+    schema_editor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'delete-all\')')
+    schema_editor.execute(f'INSERT INTO "{search}"(item_id, {", ".join(search_index.COLUMNS)}) '
+                          f'SELECT id, {", ".join(sources)} FROM "{table}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lost_found_app', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        # Unapplying: restore the triggers after RemoveField has rebuilt the table
+        migrations.RunPython(migrations.RunPython.noop, restore_search_index),
+        migrations.AddField(
+            model_name='founditem',
+            name='claim_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.RunPython(restore_search_index, migrations.RunPython.noop),
+    ]
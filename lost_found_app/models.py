@@ -1,8 +1,130 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import FileExtensionValidator
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 import uuid
 from datetime import date
+
+AI_STATUS_CHOICES = (
+    ('pending', 'Pending'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
+
+def _needs_ai_classification(item):
+    """An item with an image but no AI results that is not already queued or given up on"""
+    if not item.item_image or (item.ai_suggested_category and item.ai_top_predictions):
+        return False
+    return item.ai_status not in ('pending', 'failed')
+
+
+def _reset_ai_fields_if_image_replaced(item):
+    """
+    Drop this item's AI results computed for an image that is being replaced.
+    Prediction cache entries stay: they are keyed by content, so they remain
+    valid for that image and for any other item sharing it.
+    """
+    loaded_name = getattr(item, '_loaded_image_name', None)
+    if loaded_name is None or item._state.adding:
+        return
+    image = item.item_image
+    replaced = (image.name or '') != loaded_name or (image and not image._committed)
+    if not replaced:
+        return
+
+    item.ai_suggested_category = ''
+    item.ai_confidence = None
+    item.ai_top_predictions = {}
+    item.ai_status = ''
+    item.ai_image_hash = ''
+    item.ai_model_version = ''
+    item.image_embedding = None
+    item.embedding_model_version = ''
+
+
+def _embedding_state(item):
+    """What the vector index holds for an item; compared before and after save()"""
+    return (item.image_embedding is not None, item.embedding_model_version, item.ai_image_hash)
+
+
+def _sync_vector_index(item):
+    """Add, replace or drop the item's row in the image similarity index when its embedding changed"""
+    state = _embedding_state(item)
+    if state == getattr(item, '_loaded_embedding_state', (False, '', '')):
+        return
+    from .vector_index import sync_item_embedding
+    item_type = 'lost' if isinstance(item, LostItem) else 'found'
+    sync_item_embedding(item_type, item.pk, item.image_embedding, item.embedding_model_version)
+    item._loaded_embedding_state = state
+
+
+def _ingest_image(item):
+    """
+    Normalise a newly uploaded image and write its thumbnails and model crop
+    (see image_derivatives). Returns ``(stale, written)``: the derivatives
+    being replaced and the ones just written, if any.
+    """
+    from .image_derivatives import ingest_item_image
+    before = item.image_derivatives
+    stale = ingest_item_image(item)
+    return stale, (item.image_derivatives if item.image_derivatives is not before else {})
+
+
+def _delete_stale_derivatives(derivatives):
+    if derivatives:
+        from .image_derivatives import delete_derivatives
+        delete_derivatives(derivatives)
+
+
+def _save_with_derivatives(item, save, stale, written):
+    """
+    Run the row write ``save()`` of an item whose image was just ingested.
+    If it fails, nothing references the derivatives just written and they
+    are deleted; the replaced ones are deleted only once the row is committed.
+    """
+    try:
+        save()
+    except Exception:
+        if written:
+            _delete_stale_derivatives(written)
+            item.image_derivatives = stale
+        raise
+    if stale:
+        transaction.on_commit(lambda: _delete_stale_derivatives(stale))
+
+
+def _without_counters(instance, kwargs, counters):
+    """
+    save() kwargs that leave the ``counters`` columns alone: they are
+    maintained with F() updates (see counters.py), so writing back the value
+    loaded with the instance would undo concurrent increments
+    """
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return kwargs
+    deferred = instance.get_deferred_fields()
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in counters and field.attname not in deferred
+    ]
+    return kwargs
+
+
+def _adjust_counter(model, pk, field, delta):
+    from .counters import adjust_counter
+    adjust_counter(model, pk, field, delta)
+
+
+def _schedule_ai_classification(item):
+    """Queue a background classification job once the item row is committed"""
+    if getattr(settings, 'AI_ASYNC_CLASSIFICATION', True):
+        transaction.on_commit(lambda: ClassificationJob.enqueue(item))
+    else:
+        from .jobs import classify_item
+        classify_item(item)
 ######################################################################################################################################################
 ######################################################################################################################################################
 class User(AbstractUser):
@@ -18,6 +140,14 @@ class User(AbstractUser):
     room_number = models.CharField(max_length=10, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained counter of the user's unread notifications (see counters.py)
+    unread_notification_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Login looks users up by email, which is neither unique nor indexed by AbstractUser
+            models.Index(fields=['email'], name='user_email_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -34,7 +164,7 @@ class User(AbstractUser):
             self.is_staff = False
             self.is_superuser = False
 
-        super().save(*args, **kwargs)
+        super().save(*args, **_without_counters(self, kwargs, {'unread_notification_count'}))
 
     def __str__(self):
         return f"{self.username} - {self.get_user_type_display()}"
@@ -49,7 +179,34 @@ class Category(models.Model):
         return self.name
 ######################################################################################################################################################
 ######################################################################################################################################################
-class LostItem(models.Model):
+class ImageChangeTrackingMixin:
+    """
+    Remembers the stored item_image name and embedding state so save() can
+    tell when the image was replaced or the embedding needs re-indexing
+    """
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'item_image' in field_names:
+            instance._loaded_image_name = instance.item_image.name or ''
+        if {'image_embedding', 'embedding_model_version', 'ai_image_hash'}.issubset(field_names):
+            instance._loaded_embedding_state = _embedding_state(instance)
+        else:
+            # Deferred fields: never touch the index from a partial instance
+            instance._loaded_embedding_state = None
+        return instance
+
+    def delete(self, *args, **kwargs):
+        item_id = self.pk
+        derivatives = self.image_derivatives
+        result = super().delete(*args, **kwargs)
+        _delete_stale_derivatives(derivatives)
+        from .vector_index import sync_item_embedding
+        sync_item_embedding('lost' if isinstance(self, LostItem) else 'found', item_id, None, '')
+        return result
+######################################################################################################################################################
+######################################################################################################################################################
+class LostItem(ImageChangeTrackingMixin, models.Model):
     STATUS_CHOICES = (
         ('lost', 'Lost'),
         ('found', 'Found'),
@@ -66,6 +223,13 @@ class LostItem(models.Model):
     ai_suggested_category = models.CharField(max_length=200, blank=True)
     ai_confidence = models.FloatField(null=True, blank=True)
     ai_top_predictions = models.JSONField(default=dict, blank=True)  # Store all top predictions
+    ai_status = models.CharField(max_length=20, choices=AI_STATUS_CHOICES, blank=True)
+    ai_image_hash = models.CharField(max_length=64, blank=True)  # Content hash the AI fields were computed from
+    ai_model_version = models.CharField(max_length=100, blank=True)  # Service configuration that computed them
+    
+    # L2-normalised pooled image features (float16 bytes) and the model that produced them
+    image_embedding = models.BinaryField(blank=True, null=True)
+    embedding_model_version = models.CharField(max_length=50, blank=True)
     
     # Location details
     lost_location = models.CharField(max_length=200)
@@ -83,6 +247,8 @@ class LostItem(models.Model):
         null=True,
         validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]
     )
+    # Thumbnails and the cached model input crop written at upload: {'source_hash', 'thumbnails', 'patch'}
+    image_derivatives = models.JSONField(default=dict, blank=True)
     
     # Status and tracking
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='lost')
@@ -94,29 +260,41 @@ class LostItem(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Candidate generation for lost<->found matching
+            models.Index(fields=['status', 'lost_date']),
+            models.Index(fields=['ai_suggested_category']),
+            # Keyset pagination (KeysetPagination): all items for admins, a resident's own otherwise
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+            # Open items of a category, newest first (potential_matches without an embedding)
+            models.Index(fields=['category', 'created_at'], condition=models.Q(status='lost'),
+                         name='lostitem_open_category_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
     
     def save(self, *args, **kwargs):
-        # Auto-classify image if it's being added/updated and AI fields are empty
-        if self.item_image and (not self.ai_suggested_category or not self.ai_top_predictions):
-            from .ai_service import PyTorchAIClassificationService
-            try:
-                ai_service = PyTorchAIClassificationService()
-                result = ai_service.classify_image(self.item_image.path)
-                
-                if result:
-                    self.ai_suggested_category = result.get('suggested_category', '')
-                    self.ai_confidence = result.get('confidence', 0.0)
-                    self.ai_top_predictions = result.get('top_predictions', {})
-            except Exception as e:
-                print(f"AI classification failed: {e}")
+        # Auto-classify image if it's being added/updated and AI fields are empty.
+        # Inference runs in a classification worker, so saving never blocks on it.
+        _reset_ai_fields_if_image_replaced(self)
+        stale_derivatives, written_derivatives = _ingest_image(self)
+        classify = _needs_ai_classification(self)
+        if classify:
+            self.ai_status = 'pending'
+        
+        _save_with_derivatives(self, lambda: super(LostItem, self).save(*args, **kwargs),
+                               stale_derivatives, written_derivatives)
+        self._loaded_image_name = self.item_image.name or ''
+        if getattr(self, '_loaded_embedding_state', ()) is not None:
+            _sync_vector_index(self)
         
-        super().save(*args, **kwargs)
+        if classify:
+            _schedule_ai_classification(self)
 ######################################################################################################################################################
 ######################################################################################################################################################
-class FoundItem(models.Model):
+class FoundItem(ImageChangeTrackingMixin, models.Model):
     STATUS_CHOICES = (
         ('found', 'Found'),
         ('returned', 'Returned'),
@@ -133,6 +311,13 @@ class FoundItem(models.Model):
     ai_suggested_category = models.CharField(max_length=200, blank=True)
     ai_confidence = models.FloatField(null=True, blank=True)
     ai_top_predictions = models.JSONField(default=dict, blank=True)
+    ai_status = models.CharField(max_length=20, choices=AI_STATUS_CHOICES, blank=True)
+    ai_image_hash = models.CharField(max_length=64, blank=True)  # Content hash the AI fields were computed from
+    ai_model_version = models.CharField(max_length=100, blank=True)  # Service configuration that computed them
+    
+    # L2-normalised pooled image features (float16 bytes) and the model that produced them
+    image_embedding = models.BinaryField(blank=True, null=True)
+    embedding_model_version = models.CharField(max_length=50, blank=True)
     
     # Finding details
     found_location = models.CharField(max_length=200)
@@ -150,10 +335,15 @@ class FoundItem(models.Model):
         null=True,
         validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]
     )
+    # Thumbnails and the cached model input crop written at upload: {'source_hash', 'thumbnails', 'patch'}
+    image_derivatives = models.JSONField(default=dict, blank=True)
     
     # Storage location
     storage_location = models.CharField(max_length=200, blank=True)
     
+    # Maintained counter of the item's claims (see counters.py)
+    claim_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='found')
     is_verified = models.BooleanField(default=False)
@@ -164,26 +354,37 @@ class FoundItem(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Candidate generation for lost<->found matching
+            models.Index(fields=['status', 'found_date']),
+            models.Index(fields=['ai_suggested_category']),
+            # Keyset pagination (KeysetPagination): all items for admins, a resident's own otherwise
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['category', 'created_at'], condition=models.Q(status='found'),
+                         name='founditem_open_category_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
     
     def save(self, *args, **kwargs):
-        # Auto-classify image if it's being added/updated and AI fields are empty
-        if self.item_image and (not self.ai_suggested_category or not self.ai_top_predictions):
-            from .ai_service import PyTorchAIClassificationService
-            try:
-                ai_service = PyTorchAIClassificationService()
-                result = ai_service.classify_image(self.item_image.path)
-                
-                if result:
-                    self.ai_suggested_category = result.get('suggested_category', '')
-                    self.ai_confidence = result.get('confidence', 0.0)
-                    self.ai_top_predictions = result.get('top_predictions', {})
-            except Exception as e:
-                print(f"AI classification failed: {e}")
+        # Auto-classify image if it's being added/updated and AI fields are empty.
+        # Inference runs in a classification worker, so saving never blocks on it.
+        _reset_ai_fields_if_image_replaced(self)
+        stale_derivatives, written_derivatives = _ingest_image(self)
+        classify = _needs_ai_classification(self)
+        if classify:
+            self.ai_status = 'pending'
         
-        super().save(*args, **kwargs)
+        _save_with_derivatives(self, lambda: super(FoundItem, self).save(*args, **_without_counters(self, kwargs, {'claim_count'})),
+                               stale_derivatives, written_derivatives)
+        self._loaded_image_name = self.item_image.name or ''
+        if getattr(self, '_loaded_embedding_state', ()) is not None:
+            _sync_vector_index(self)
+        
+        if classify:
+            _schedule_ai_classification(self)
 ######################################################################################################################################################
 ######################################################################################################################################################
 class Claim(models.Model):
@@ -220,9 +421,32 @@ class Claim(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['user', 'found_item']
+        indexes = [
+            # Keyset pagination (KeysetPagination): all claims for admins, a resident's own otherwise
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Claim by {self.user.username} for {self.found_item.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'found_item_id' in field_names:
+            instance._loaded_found_item_id = instance.found_item_id
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Keep FoundItem.claim_count in step, in the same transaction as the claim row
+        loaded_found_item_id = None if self._state.adding else getattr(self, '_loaded_found_item_id', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if loaded_found_item_id != self.found_item_id:
+                _adjust_counter(FoundItem, self.found_item_id, 'claim_count', 1)
+                if loaded_found_item_id is not None:
+                    _adjust_counter(FoundItem, loaded_found_item_id, 'claim_count', -1)
+        self._loaded_found_item_id = self.found_item_id
 ######################################################################################################################################################
 ######################################################################################################################################################
 class Notification(models.Model):
@@ -252,9 +476,59 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (KeysetPagination) of a user's notifications
+            models.Index(fields=['user', 'created_at', 'id']),
+            # A user's unread notifications (unread count, mark_all_read); read ones are not indexed
+            models.Index(fields=['user', 'created_at'], condition=models.Q(is_read=False),
+                         name='notification_unread_idx'),
+        ]
+        constraints = [
+            # Match discovery tells a resident about each lost/found pair at most once
+            models.UniqueConstraint(
+                fields=['user', 'lost_item', 'found_item'],
+                condition=models.Q(notification_type='match_found'),
+                name='unique_match_found_notification'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.notification_type} - {self.user.username}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'user_id', 'is_read'}.issubset(field_names):
+            instance._loaded_unread_owner = None if instance.is_read else instance.user_id
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Keep the owner's unread_notification_count in step, in the same transaction as the row
+        loaded_owner = None if self._state.adding else getattr(self, '_loaded_unread_owner', None)
+        unread_owner = None if self.is_read else self.user_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if loaded_owner != unread_owner:
+                if unread_owner is not None:
+                    _adjust_counter(User, unread_owner, 'unread_notification_count', 1)
+                if loaded_owner is not None:
+                    _adjust_counter(User, loaded_owner, 'unread_notification_count', -1)
+        self._loaded_unread_owner = unread_owner
+######################################################################################################################################################
+# Counters of deleted rows. Receivers rather than delete() overrides, because
+# they also run for rows removed by cascades and QuerySet.delete().
+######################################################################################################################################################
+@receiver(post_delete, sender=Claim)
+def _claim_deleted(sender, instance, **kwargs):
+    found_item_id = getattr(instance, '_loaded_found_item_id', instance.found_item_id)
+    _adjust_counter(FoundItem, found_item_id, 'claim_count', -1)
+
+
+@receiver(post_delete, sender=Notification)
+def _notification_deleted(sender, instance, **kwargs):
+    unread_owner = getattr(instance, '_loaded_unread_owner', None if instance.is_read else instance.user_id)
+    if unread_owner is not None:
+        _adjust_counter(User, unread_owner, 'unread_notification_count', -1)
 ######################################################################################################################################################
 ######################################################################################################################################################
 class AIClassificationLog(models.Model):
@@ -265,10 +539,135 @@ class AIClassificationLog(models.Model):
     top_predictions = models.JSONField(default=dict)
     model_version = models.CharField(max_length=50, default='resnet101')
     processing_time = models.FloatField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the classification ran; records are buffered and written in batches later
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='ai_log_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"AI Classification - {self.predicted_category} ({self.confidence_score:.2f})"
+######################################################################################################################################################
+######################################################################################################################################################
+class AIClassificationDailyRollup(models.Model):
+    """Per-day summary of AIClassificationLog, kept after the raw rows are archived"""
+    date = models.DateField()
+    model_version = models.CharField(max_length=50)
+    predicted_category = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+    mean_confidence = models.FloatField(default=0.0)
+    latency_p50 = models.FloatField(default=0.0)
+    latency_p95 = models.FloatField(default=0.0)
+    latency_p99 = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', 'model_version', '-count']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'model_version', 'predicted_category'],
+                                    name='unique_classification_rollup'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.model_version} {self.predicted_category}: {self.count}"
+######################################################################################################################################################
+######################################################################################################################################################
+class ClassificationJob(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('dead', 'Dead Letter'),
+    )
+    ITEM_TYPE_CHOICES = (
+        ('lost', 'Lost Item'),
+        ('found', 'Found Item'),
+    )
+    
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPE_CHOICES)
+    item_id = models.UUIDField()
+    
+    # Queue state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    
+    # Worker lease
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['item_type', 'item_id']),
+        ]
+    
+    def __str__(self):
+        return f"Classify {self.item_type} item {self.item_id} - {self.get_status_display()}"
+    
+    @classmethod
+    def enqueue(cls, item):
+        """Queue classification for ``item`` unless a job is already waiting for it"""
+        item_type = 'lost' if isinstance(item, LostItem) else 'found'
+        if cls.objects.filter(item_type=item_type, item_id=item.pk, status__in=['queued', 'running']).exists():
+            return None
+        return cls.objects.create(
+            item_type=item_type,
+            item_id=item.pk,
+            max_attempts=getattr(settings, 'AI_JOB_MAX_ATTEMPTS', 3)
+        )
+######################################################################################################################################################
+######################################################################################################################################################
+class PredictionCacheEntry(models.Model):
+    content_hash = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=100)  # Service (or cascade) configuration the result was cached for
+    answered_by = models.CharField(max_length=50, blank=True)  # Model that produced the answer
+    embedding = models.BinaryField(blank=True, null=True)
+    embedding_model_version = models.CharField(max_length=50, blank=True)
+    predicted_category = models.CharField(max_length=200)
+    confidence_score = models.FloatField()
+    top_predictions = models.JSONField(default=dict)
+    processing_time = models.FloatField(default=0.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['content_hash', 'model_version']
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.model_version}) - {self.predicted_category}"
+    
+    def as_result(self):
+        """Same shape as PyTorchAIClassificationService.classify_image results"""
+        result = {
+            'suggested_category': self.predicted_category,
+            'confidence': self.confidence_score,
+            'top_predictions': self.top_predictions,
+            'processing_time': self.processing_time,
+            'model_version': self.answered_by or self.model_version,
+            'content_hash': self.content_hash
+        }
+        if self.embedding is not None:
+            result['embedding'] = bytes(self.embedding)
+            result['embedding_model_version'] = self.embedding_model_version
+        return result
+######################################################################################################################################################
+######################################################################################################################################################
+class MatchDiscoveryCursor(models.Model):
+    """High-water mark (created_at, id) of the items match discovery has already processed"""
+    item_type = models.CharField(max_length=10, choices=ClassificationJob.ITEM_TYPE_CHOICES, unique=True)
+    last_created_at = models.DateTimeField(blank=True, null=True)
+    last_item_id = models.UUIDField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"AI Classification - {self.predicted_category} ({self.confidence_score:.2f})"
\ No newline at end of file
+        return f"{self.item_type} items up to {self.last_created_at}"
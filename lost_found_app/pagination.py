@@ -0,0 +1,175 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Largest rank position a cursor may hold (the OFFSET must fit SQLite's 64-bit INTEGER)
+MAX_OFFSET = 2 ** 63 - 1
+
+
+def _encode_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def _reject_constant(name):
+    raise ValueError(f'{name} in cursor')
+
+
+def _decode_cursor(cursor):
+    try:
+        # No NaN or Infinity: encoded cursors never hold them
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)), parse_constant=_reject_constant)
+    except (TypeError, ValueError, RecursionError):
+        raise NotFound('Invalid cursor')
+
+
+class _CursorLinks(BasePagination):
+    """Page size handling and the next/previous links shared by both paginators"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            pass
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_link(self, cursor):
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, _encode_cursor(cursor))
+
+    def first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        fields = [('next', self.next_link), ('previous', self.previous_link), ('results', data)]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'description': 'only with ?count=true'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPagination(_CursorLinks):
+    """
+    Cursor pagination on (created_at, id), newest first. Each page is one
+    index range scan continuing from the previous page's last row, so deep
+    pages cost the same as the first and rows inserted meanwhile never shift
+    or repeat entries. Cursors are opaque; there is no COUNT(*) unless the
+    client asks with ?count=true.
+    """
+    position_field = 'created_at'
+    tiebreak_field = 'id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, tiebreak = self.position_field, self.tiebreak_field
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        if cursor:
+            data = _decode_cursor(cursor)
+            try:
+                value, key, reverse = parse_datetime(data['p']), data['k'], bool(data.get('r'))
+                # A key of the wrong type for the tiebreak field fails here rather than in the query
+                key = queryset.model._meta.get_field(tiebreak).to_python(key)
+            except (KeyError, TypeError, ValueError, ValidationError):
+                raise NotFound('Invalid cursor')
+            if value is None:
+                raise NotFound('Invalid cursor')
+            # (position, tiebreak) < (value, key): the leading range keeps it a single index scan
+            if reverse:
+                page = queryset.filter(**{f'{position}__gte': value}).filter(
+                    Q(**{f'{position}__gt': value}) | Q(**{f'{tiebreak}__gt': key})
+                ).order_by(position, tiebreak)
+            else:
+                page = queryset.filter(**{f'{position}__lte': value}).filter(
+                    Q(**{f'{position}__lt': value}) | Q(**{f'{tiebreak}__lt': key})
+                ).order_by(f'-{position}', f'-{tiebreak}')
+        else:
+            page = queryset.order_by(f'-{position}', f'-{tiebreak}')
+
+        rows = list(page[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        def position_of(row, backwards):
+            return {'p': getattr(row, position).isoformat(), 'k': str(getattr(row, tiebreak)), 'r': int(backwards)}
+
+        # Paging backwards, the page after this one always exists; forwards, the page before does
+        self.next_link = self.encode_link(position_of(rows[-1], False)) if rows and (has_more or reverse) else None
+        has_previous = has_more if reverse else bool(cursor)
+        self.previous_link = self.encode_link(position_of(rows[0], True)) if rows and has_previous else None
+        return rows
+
+
+class RankedPagination(_CursorLinks):
+    """
+    Pagination of ranked results (search hits, matches), whose order is a
+    score rather than (created_at, id). The opaque cursor holds a rank
+    position; ``paginate(fetch, request)`` asks ``fetch(offset, limit)`` only
+    for the rows of the page (plus one, to know whether there is a next page).
+    """
+    def __init__(self, max_results=None):
+        self.max_results = max_results
+
+    def paginate(self, fetch, request):
+        self.request = request
+        self.count = None
+        page_size = self.get_page_size(request)
+        offset = 0
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            data = _decode_cursor(cursor)
+            offset = data.get('o') if isinstance(data, dict) else None
+            # Only what encode_link writes: an int (not a float or bool) within SQLite's INTEGER range
+            if type(offset) is not int or not 0 <= offset <= MAX_OFFSET:
+                raise NotFound('Invalid cursor')
+
+        limit = page_size + 1
+        if self.max_results is not None:
+            limit = max(min(limit, self.max_results - offset), 0)
+        rows = list(fetch(offset, limit)) if limit else []
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        self.next_link = self.encode_link({'o': offset + page_size}) if has_more else None
+        if offset <= 0:
+            self.previous_link = None
+        elif offset - page_size <= 0:
+            self.previous_link = self.first_link()
+        else:
+            self.previous_link = self.encode_link({'o': offset - page_size})
+        return rows
+
+    def paginate_list(self, items, request):
+        return self.paginate(lambda offset, limit: items[offset:offset + limit], request)
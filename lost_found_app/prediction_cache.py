@@ -0,0 +1,107 @@
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    """SHA-256 hex digest of raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of classification results keyed by (content hash, model version).
+    An in-process LRU bounded to ``max_entries`` sits in front of the
+    persistent PredictionCacheEntry table, so a given image is only run
+    through a given model once.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max(int(max_entries), 0)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, result):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, image_hash, model_version):
+        """Cached result for the image, or None on a miss"""
+        key = (image_hash, model_version)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(result)
+
+        try:
+            from .models import PredictionCacheEntry
+            entry = PredictionCacheEntry.objects.filter(content_hash=image_hash, model_version=model_version).first()
+        except Exception as e:
+            logger.warning(f"Prediction cache lookup failed: {str(e)}")
+            entry = None
+
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = entry.as_result()
+        self._remember(key, result)
+        with self._lock:
+            self.persistent_hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, image_hash, model_version, result):
+        """Store a fresh classification result in both tiers"""
+        self._remember((image_hash, model_version), copy.deepcopy(result))
+        try:
+            from .models import PredictionCacheEntry
+            PredictionCacheEntry.objects.update_or_create(
+                content_hash=image_hash,
+                model_version=model_version,
+                defaults={
+                    'predicted_category': result['suggested_category'],
+                    'confidence_score': result['confidence'],
+                    'top_predictions': result['top_predictions'],
+                    'processing_time': result['processing_time'],
+                    'answered_by': result.get('model_version', model_version),
+                    'embedding': result.get('embedding'),
+                    'embedding_model_version': result.get('embedding_model_version', ''),
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Failed to persist cached prediction: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                'entries_in_memory': len(self._entries),
+                'max_entries': self.max_entries,
+                'memory_hits': self.memory_hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+prediction_cache = PredictionCache(getattr(settings, 'AI_PREDICTION_CACHE_SIZE', 1024))
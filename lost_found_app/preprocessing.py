@@ -0,0 +1,73 @@
+from PIL import Image
+
+# ImageNet preprocessing used by every torchvision classification model we load
+RESIZE_SIZE = 256
+CROP_SIZE = 224
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+def open_image(source, target_size=RESIZE_SIZE):
+    """
+    Open an image as RGB for classification.
+    JPEGs are decoded with DCT scaling (PIL draft mode) at the smallest 1/2,
+    1/4 or 1/8 scale that still keeps both sides >= ``target_size``, so a
+    12 MP phone photo is never fully decoded just to be shrunk to 256 px.
+    Draft mode also decodes straight to RGB, skipping a separate conversion.
+    """
+    image = Image.open(source)
+    if image.format == 'JPEG':
+        image.draft('RGB', (target_size, target_size))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def crop_box(width, height, resize_size=RESIZE_SIZE, crop_size=CROP_SIZE):
+    """
+    Source-image box equivalent to Resize(resize_size) followed by
+    CenterCrop(crop_size), so both can be done by one resampling pass.
+    """
+    scale = resize_size / min(width, height)
+    scaled_w, scaled_h = width * scale, height * scale
+    left = (scaled_w - crop_size) / 2.0
+    top = (scaled_h - crop_size) / 2.0
+    return (left / scale, top / scale, (left + crop_size) / scale, (top + crop_size) / scale)
+
+
+def model_patch(image, resize_size=RESIZE_SIZE, crop_size=CROP_SIZE):
+    """
+    RGB PIL image -> the model's ``crop_size`` x ``crop_size`` uint8 HWC crop:
+    Resize(resize_size) + CenterCrop(crop_size) as one bilinear resize of
+    the source region crop_box() maps to the crop (torchvision's filter).
+    Stored at ingest (image_derivatives) so reclassification can skip decoding.
+    """
+    import numpy as np
+
+    box = crop_box(image.width, image.height, resize_size, crop_size)
+    return np.asarray(image.resize((crop_size, crop_size), Image.BILINEAR, box=box), dtype=np.uint8)
+
+
+def patch_to_tensor(patch):
+    """uint8 HWC crop from model_patch() -> normalised CHW float32 tensor"""
+    import numpy as np
+    import torch
+
+    # (x / 255 - mean) / std  ==  x * (1 / (255 * std)) - mean / std
+    scale = 1.0 / (255.0 * np.asarray(STD, dtype=np.float32))
+    shift = np.asarray(MEAN, dtype=np.float32) / np.asarray(STD, dtype=np.float32)
+    array = patch.astype(np.float32) * scale - shift
+    return torch.from_numpy(np.ascontiguousarray(array.transpose(2, 0, 1)))
+
+
+def to_model_input(image, resize_size=RESIZE_SIZE, crop_size=CROP_SIZE):
+    """
+    RGB PIL image -> normalised CHW float32 tensor.
+    Replaces the chained Resize/CenterCrop/ToTensor/Normalize Compose with a
+    single bilinear resize of the crop_box() region to the crop size and
+    one fused NumPy scale+shift.
+    A crop cached by model_patch() (a uint8 array) is only normalised.
+    """
+    if hasattr(image, 'dtype'):
+        return patch_to_tensor(image)
+    return patch_to_tensor(model_patch(image, resize_size, crop_size))
@@ -0,0 +1,190 @@
+import html
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+# Searchable text per item: FTS5 column -> model field (the location field differs per side)
+SEARCH_COLUMNS = ['title', 'description', 'location', 'brand', 'color', 'category']
+LOCATION_FIELDS = {'lostitem': 'lost_location', 'founditem': 'found_location'}
+# BM25 column weights, in SEARCH_COLUMNS order: a hit in the title counts most, one in the description least
+BM25_WEIGHTS = (10.0, 2.0, 4.0, 5.0, 3.0, 3.0)
+SNIPPET_TOKENS = 12
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Placeholders snippet() puts around matches; swapped for <mark> after the text is HTML-escaped
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+
+_fts_tables = {}
+
+
+def source_fields(model):
+    """Model fields indexed for ``model``, in SEARCH_COLUMNS order"""
+    location = LOCATION_FIELDS[model._meta.model_name]
+    return ['title', 'description', location, 'brand', 'color', 'ai_suggested_category']
+
+
+def fts_available(model, using='default'):
+    """Whether the FTS5 index of ``model`` exists (created by migration 0011 on SQLite builds with FTS5)"""
+    key = (using, model._meta.db_table)
+    if key not in _fts_tables:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                               [f'{model._meta.db_table}_fts'])
+                available = cursor.fetchone() is not None
+        _fts_tables[key] = available
+    return _fts_tables[key]
+
+
+def fts_query(text):
+    """
+    User input -> FTS5 MATCH expression: every word must occur, and the last
+    one may be incomplete (a prefix query), so results follow the keystrokes.
+    Words are quoted, so FTS5 operators in the input are treated as text.
+    Returns None when the input has no words.
+    """
+    words = TOKEN_RE.findall((text or '').lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= 2:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def fts_search(queryset, text, limit, offset=0):
+    """Items of ``queryset`` matching ``text``, best BM25 rank first: [(item, rank, snippet)]"""
+    match = fts_query(text)
+    if match is None:
+        return [(item, None, None) for item in queryset[offset:offset + limit]]
+
+    table = queryset.model._meta.db_table
+    fts, search = f'{table}_fts', f'{table}_search'
+    # The caller's filters (owner, category) are applied inside the ranked query, before the LIMIT;
+    # an unfiltered queryset (admins) needs no scope, which would otherwise list every item id
+    scope, scope_params = '', []
+    if queryset.query.where:
+        scope_sql, scope_params = queryset.order_by().values('pk').query.sql_with_params()
+        scope = f'AND s.item_id IN ({scope_sql}) '
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    sql = (
+        f'SELECT s.item_id, bm25("{fts}", {weights}) AS rank, '
+        f"snippet(\"{fts}\", -1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS}) "
+        f'FROM "{fts}" JOIN "{search}" AS s ON s.rowid = "{fts}".rowid '
+        f'WHERE "{fts}" MATCH %s {scope}'
+        f'ORDER BY rank LIMIT %s OFFSET %s'
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, [match, *scope_params, limit, offset])
+        rows = cursor.fetchall()
+
+    pk_field = queryset.model._meta.pk
+    ranked = [(pk_field.to_python(item_id), rank, snippet) for item_id, rank, snippet in rows]
+    items = queryset.in_bulk([pk for pk, _, _ in ranked])
+    return [(items[pk], rank, _highlight(snippet)) for pk, rank, snippet in ranked if pk in items]
+
+
+def like_search(queryset, text, limit, offset=0):
+    """Fallback without FTS5: case-insensitive substring match on every word, unranked"""
+    words = TOKEN_RE.findall(text or '')
+    for word in words:
+        condition = Q()
+        for field in source_fields(queryset.model):
+            condition |= Q(**{f'{field}__icontains': word})
+        queryset = queryset.filter(condition)
+    return [(item, None, None) for item in queryset[offset:offset + limit]]
+
+
+def search_items(queryset, text, limit=None, offset=0):
+    """
+    Full-text search within ``queryset``: FTS5 with BM25 ranking and
+    highlighted snippets where the index exists, LIKE matching otherwise.
+    Returns up to ``limit`` (default SEARCH_MAX_RESULTS) ``(item, rank, snippet)``
+    from rank ``offset`` on; rank and snippet are None without FTS5 or for an empty query.
+    """
+    limit = limit or getattr(settings, 'SEARCH_MAX_RESULTS', 100)
+    if fts_available(queryset.model, queryset.db):
+        return fts_search(queryset, text, limit, offset)
+    return like_search(queryset, text, limit, offset)
+
+
+def rebuild_search_index(model, using='default'):
+    """
+    Repopulate the search table of ``model`` from the item table and
+    rebuild its FTS5 index from scratch. Returns the number of items indexed.
+    """
+    table = model._meta.db_table
+    fts, search = f'{table}_fts', f'{table}_search'
+    columns = ', '.join(SEARCH_COLUMNS)
+    sources = ', '.join(source_fields(model))
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{search}"')
+        # Clears the index even if it had drifted from the search table
+        cursor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'delete-all\')')
+        cursor.execute(f'INSERT INTO "{search}"(item_id, {columns}) SELECT id, {sources} FROM "{table}"')
+        cursor.execute(f'SELECT COUNT(*) FROM "{search}"')
+        count = cursor.fetchone()[0]
+        cursor.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'optimize\')')
+    return count
+
+
+def check_search_index(model, using='default'):
+    """Raises django.db.DatabaseError if the FTS5 index of ``model`` does not match its search table"""
+    fts = f'{model._meta.db_table}_fts'
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{fts}"("{fts}", rank) VALUES (\'integrity-check\', 1)')
+
+
+def missing_sync_triggers(model, using='default'):
+    """
+    Names of the triggers migration 0011 created to keep the search table
+    and FTS5 index of ``model`` in sync that no longer exist (SQLite drops a
+    table's triggers when a migration rebuilds it)
+    """
+    table = model._meta.db_table
+    search, fts = f'{table}_search', f'{table}_fts'
+    expected = {f'{table}_search_{event}': table for event in ('ai', 'au', 'ad')}
+    expected.update({f'{fts}_{event}': search for event in ('ai', 'au', 'ad')})
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'trigger' AND name IN ("
+                       + ', '.join(['%s'] * len(expected)) + ')', list(expected))
+        present = dict(cursor.fetchall())
+    return sorted(name for name, on_table in expected.items() if present.get(name) != on_table)
+
+
+def check_search_triggers(app_configs=None, databases=None, **kwargs):
+    """
+    System check: every item table with an FTS5 index still has its sync
+    triggers. Without them saves silently stop reaching search results.
+    Runs where checks get a database (migrate, the test runner, check --database).
+    """
+    from django.core import checks
+
+    from .models import FoundItem, LostItem
+
+    errors = []
+    for using in databases or []:
+        if connections[using].vendor != 'sqlite':
+            continue
+        with connections[using].cursor() as cursor:
+            tables = set(connections[using].introspection.table_names(cursor))
+        for model in (LostItem, FoundItem):
+            if f'{model._meta.db_table}_fts' not in tables:
+                continue
+            missing = missing_sync_triggers(model, using)
+            if missing:
+                errors.append(checks.Error(
+                    f"Search sync triggers missing on database '{using}': {', '.join(missing)}",
+                    hint="A migration rebuilt the table without recreating them; recreate them the way "
+                         "migration 0014 does (restore_search_index), then run manage.py rebuild_search_index.",
+                    obj=model,
+                    id='lost_found_app.E001',
+                ))
+    return errors
@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db.models import Prefetch
 from .models import User, Category, LostItem, FoundItem, Claim, Notification, AIClassificationLog
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.tokens import RefreshToken
+from .image_derivatives import thumbnail_urls
 ########################################################################################################################################################
 ########################################################################################################################################################
 class RegisterSerializer(serializers.ModelSerializer):
@@ -172,38 +174,52 @@ class LostItemSerializer(serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     ai_predictions_display = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = LostItem
-        fields = '__all__'
-        read_only_fields = ['user', 'created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions']
+        exclude = ['image_embedding', 'image_derivatives']
+        read_only_fields = ['user', 'created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_status', 'ai_image_hash', 'ai_model_version', 'embedding_model_version']
+    
+    @staticmethod
+    def eager_load(queryset):
+        """``queryset`` fetching the owner and category this serializer reads in the same query"""
+        return queryset.select_related('user', 'category')
     
     def get_ai_predictions_display(self, obj):
         if obj.ai_top_predictions:
             return [f"{pred['category']}: {pred['confidence']:.2f}%" 
                    for pred in obj.ai_top_predictions.get('predictions', [])]
         return []
+    
+    def get_thumbnails(self, obj):
+        return thumbnail_urls(obj.image_derivatives, self.context.get('request'))
 ###########################################################################################################################################################
 #############################################################################################################################################################
 class FoundItemSerializer(serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
-    claim_count = serializers.SerializerMethodField()
     ai_predictions_display = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = FoundItem
-        fields = '__all__'
-        read_only_fields = ['user', 'created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions']
+        exclude = ['image_embedding', 'image_derivatives']
+        read_only_fields = ['user', 'created_at', 'updated_at', 'ai_suggested_category', 'ai_confidence', 'ai_top_predictions', 'ai_status', 'ai_image_hash', 'ai_model_version', 'embedding_model_version', 'claim_count']
     
-    def get_claim_count(self, obj):
-        return obj.claims.count()
+    @staticmethod
+    def eager_load(queryset):
+        """``queryset`` fetching the owner and category this serializer reads in the same query"""
+        return queryset.select_related('user', 'category')
     
     def get_ai_predictions_display(self, obj):
         if obj.ai_top_predictions:
             return [f"{pred['category']}: {pred['confidence']:.2f}%" 
                    for pred in obj.ai_top_predictions.get('predictions', [])]
         return []
+    
+    def get_thumbnails(self, obj):
+        return thumbnail_urls(obj.image_derivatives, self.context.get('request'))
 ###########################################################################################################################################################
 #############################################################################################################################################################
 class ClaimSerializer(serializers.ModelSerializer):
@@ -214,6 +230,13 @@ class ClaimSerializer(serializers.ModelSerializer):
         model = Claim
         fields = '__all__'
         read_only_fields = ['user', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def eager_load(queryset):
+        """``queryset`` loading the claimant with the claims and all found items of a page in one more query"""
+        return queryset.select_related('user').prefetch_related(
+            Prefetch('found_item', queryset=FoundItemSerializer.eager_load(FoundItem.objects.all()))
+        )
 ###########################################################################################################################################################
 #############################################################################################################################################################
 class NotificationSerializer(serializers.ModelSerializer):
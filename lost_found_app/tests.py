@@ -1,3 +1,2100 @@
+import io
+import os
+import re
+import uuid
+from unittest import mock
+from datetime import date, timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+from django.db import connection
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    AIClassificationLog,
+    Category,
+    Claim,
+    ClassificationJob,
+    FoundItem,
+    LostItem,
+    Notification,
+    PredictionCacheEntry,
+    User,
+)
+from .serializers import ClaimSerializer, FoundItemSerializer, LostItemSerializer
+
+# A plan step reading every row of a table, or of one of its indexes ("SCAN <table> USING [COVERING] INDEX ...")
+SCAN_RE = re.compile(r'\bSCAN (\w+)\b( USING)?')
+
+
+######################################################################################################################################################
+# Query plans of the hot queries (EXPLAIN QUERY PLAN on a seeded database)
+######################################################################################################################################################
+class HotQueryPlanTests(TestCase):
+    """
+    Every query the API, the matching engine and the workers run on each
+    request or batch must be served by an index. A test fails when SQLite
+    plans a full table scan, or sorts a page that the index should already
+    return in order. Walking a whole index is only accepted (``walk=True``)
+    for a LIMITed first page read in index order.
+    """
+    USERS = 20
+    CATEGORIES = 8
+    ITEMS = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f'resident{i}', email=f'resident{i}@example.com') for i in range(cls.USERS)
+        ])
+        cls.categories = Category.objects.bulk_create([Category(name=f'category{i}') for i in range(cls.CATEGORIES)])
+        today = date.today()
+        lost_statuses = ['lost', 'lost', 'lost', 'found', 'claimed']
+        found_statuses = ['found', 'found', 'returned', 'disposed']
+        LostItem.objects.bulk_create([
+            LostItem(user=cls.users[i % cls.USERS], category=cls.categories[i % cls.CATEGORIES],
+                     title=f'item {i}', description='seeded', lost_location='lobby',
+                     lost_date=today - timedelta(days=i % 120), status=lost_statuses[i % len(lost_statuses)],
+                     ai_suggested_category=f'label{i % 30}')
+            for i in range(cls.ITEMS)
+        ])
+        FoundItem.objects.bulk_create([
+            FoundItem(user=cls.users[(i + 1) % cls.USERS], category=cls.categories[i % cls.CATEGORIES],
+                      title=f'item {i}', description='seeded', found_location='lobby',
+                      found_date=today - timedelta(days=i % 120), status=found_statuses[i % len(found_statuses)],
+                      ai_suggested_category=f'label{i % 30}')
+            for i in range(cls.ITEMS)
+        ])
+        found_items = list(FoundItem.objects.all())
+        Claim.objects.bulk_create([
+            Claim(user=cls.users[i % cls.USERS], found_item=found_items[i], claim_description='mine')
+            for i in range(cls.ITEMS // 2)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=cls.users[i % cls.USERS], notification_type='system', title='Notice',
+                         message='seeded', is_read=i % 3 != 0)
+            for i in range(cls.ITEMS * 2)
+        ])
+        ClassificationJob.objects.bulk_create([
+            ClassificationJob(item_type='lost', item_id=uuid.uuid4(), status='done' if i % 4 else 'queued')
+            for i in range(cls.ITEMS)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        cls.user = cls.users[3]
+        cls.category = cls.categories[2]
+        cls.found_item = found_items[10]
+
+    def assertIndexed(self, queryset, ordered=False, walk=False, index=None):
+        plan = queryset.explain()
+        scans = [table for table, using_index in SCAN_RE.findall(plan) if not (walk and using_index)]
+        self.assertFalse(scans, f"full scan of {', '.join(scans)}:\n{queryset.query}\n{plan}")
+        if ordered:
+            self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan, f"sorted outside the index:\n{queryset.query}\n{plan}")
+        if index:
+            self.assertIn(index, plan, f"not served by {index}:\n{queryset.query}\n{plan}")
+
+    def _keyset_page(self, queryset):
+        """The second page, as KeysetPagination queries it"""
+        first = queryset.order_by('-created_at', '-id')[:20]
+        last = list(first)[-1] if first else None
+        position = last.created_at if last else timezone.now()
+        key = last.id if last else 0
+        return queryset.filter(created_at__lte=position).filter(
+            Q(created_at__lt=position) | Q(id__lt=key)
+        ).order_by('-created_at', '-id')[:21]
+
+    def test_item_lists(self):
+        for model in (LostItem, FoundItem, Claim):
+            with self.subTest(model=model.__name__):
+                self.assertIndexed(model.objects.order_by('-created_at', '-id')[:21], ordered=True, walk=True)
+                self.assertIndexed(model.objects.filter(user=self.user).order_by('-created_at', '-id')[:21], ordered=True)
+                self.assertIndexed(self._keyset_page(model.objects.all()), ordered=True)
+                self.assertIndexed(self._keyset_page(model.objects.filter(user=self.user)), ordered=True)
+
+    def test_serialised_item_lists(self):
+        # The related rows and claim counts the serializers read are joined or looked up per page row by index
+        for serializer, model in ((LostItemSerializer, LostItem), (FoundItemSerializer, FoundItem), (ClaimSerializer, Claim)):
+            with self.subTest(model=model.__name__):
+                queryset = serializer.eager_load(model.objects.all())
+                self.assertIndexed(queryset.order_by('-created_at', '-id')[:21], ordered=True, walk=True)
+                self.assertIndexed(self._keyset_page(queryset.filter(user=self.user)), ordered=True)
+
+    def test_notification_lists(self):
+        notifications = Notification.objects.filter(user=self.user)
+        self.assertIndexed(notifications.order_by('-created_at', '-id')[:21], ordered=True)
+        self.assertIndexed(self._keyset_page(notifications), ordered=True)
+        # Unread notifications come from the partial index, which holds no read ones
+        self.assertIndexed(notifications.filter(is_read=False), index='notification_unread_idx')
+        self.assertIndexed(notifications.filter(is_read=False).order_by('-created_at'), ordered=True,
+                           index='notification_unread_idx')
+
+    def test_open_items_of_a_category(self):
+        self.assertIndexed(
+            LostItem.objects.filter(category=self.category, status='lost').exclude(user=self.user).order_by('-created_at'),
+            ordered=True,
+        )
+        self.assertIndexed(FoundItem.objects.filter(category=self.category, status='found').order_by('-created_at'),
+                           ordered=True)
+
+    def test_match_candidates(self):
+        window = (date.today() - timedelta(days=30), date.today())
+        self.assertIndexed(LostItem.objects.filter(status='lost', lost_date__range=window).exclude(user=self.user))
+        self.assertIndexed(FoundItem.objects.filter(status='found', found_date__range=window)
+                           .filter(Q(category=self.category) | Q(ai_suggested_category='label3')))
+        self.assertIndexed(LostItem.objects.filter(ai_suggested_category='label3'))
+
+    def test_claims_of_a_found_item(self):
+        self.assertIndexed(Claim.objects.filter(found_item=self.found_item))
+        self.assertIndexed(Claim.objects.filter(user=self.user, found_item=self.found_item))
+
+    def test_login_lookup(self):
+        self.assertIndexed(User.objects.filter(email='resident3@example.com'))
+
+    def test_worker_queries(self):
+        self.assertIndexed(ClassificationJob.objects.filter(status='queued', run_after__lte=timezone.now())
+                           .order_by('run_after', 'id'))
+        self.assertIndexed(ClassificationJob.objects.filter(item_type='lost', item_id=uuid.uuid4(),
+                                                            status__in=['queued', 'running']))
+        self.assertIndexed(PredictionCacheEntry.objects.filter(content_hash='0' * 64, model_version='resnet101'))
+        now = timezone.now()
+        self.assertIndexed(AIClassificationLog.objects.filter(created_at__gte=now - timedelta(days=1), created_at__lt=now))
+
+    def test_match_discovery_batch(self):
+        position = timezone.now() - timedelta(hours=1)
+        self.assertIndexed(
+            LostItem.objects.filter(created_at__gte=position)
+            .filter(Q(created_at__gt=position) | Q(pk__gt=uuid.uuid4()))
+            .order_by('created_at', 'pk')[:100],
+            ordered=True,
+        )
+
+
+######################################################################################################################################################
+# Queries per list endpoint (a page costs the same whatever its size)
+######################################################################################################################################################
+class QueryCountTests(TestCase):
+    """
+    Every list endpoint must read a page in a fixed number of queries:
+    owners, categories and the found items nested in claims
+    are loaded with the page, never once per row. Each endpoint is requested
+    with a small and a large page and both must take the same queries.
+    """
+    ITEMS = 60
+    PAGE_SIZES = (5, 25)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', user_type='admin')
+        cls.users = User.objects.bulk_create([
+            User(username=f'resident{i}', email=f'resident{i}@example.com') for i in range(30)
+        ])
+        cls.resident = cls.users[0]
+        cls.category = Category.objects.create(name='bags')
+        categories = [cls.category, *Category.objects.bulk_create([Category(name=f'category{i}') for i in range(3)])]
+        today = date.today()
+        LostItem.objects.bulk_create([
+            LostItem(user=cls.resident if i % 2 else cls.users[i % 30], category=categories[i % 4],
+                     title=f'black bag {i}', description='leather bag', lost_location='lobby', lost_date=today)
+            for i in range(cls.ITEMS)
+        ])
+        FoundItem.objects.bulk_create([
+            FoundItem(user=cls.resident if i % 2 else cls.admin, category=categories[i % 4],
+                      title=f'black bag {i}', description='leather bag', found_location='lobby', found_date=today)
+            for i in range(cls.ITEMS)
+        ])
+        found_items = list(FoundItem.objects.all())
+        cls.found_item = FoundItem.objects.create(user=cls.admin, category=cls.category, title='bag',
+                                                  description='bag', found_location='lobby', found_date=today)
+        Claim.objects.bulk_create([
+            Claim(user=cls.resident if i % 2 else cls.users[i % 30], found_item=found_items[i],
+                  claim_description='mine')
+            for i in range(cls.ITEMS)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=cls.resident, notification_type='system', title='Notice', message='seeded')
+            for i in range(cls.ITEMS)
+        ])
+
+    def assertConstantQueries(self, user, url):
+        """Returns the queries per page and the results of the larger page"""
+        client = APIClient()
+        client.force_authenticate(user)
+        # The page size is added to the URL's own query string (a data argument would replace it)
+        parts = urlsplit(url)
+        params = dict(parse_qsl(parts.query))
+        # Once-per-process lookups (e.g. whether the FTS5 index exists) are not part of a page's cost
+        client.get(parts.path, params)
+        counts = []
+        for page_size in self.PAGE_SIZES:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(parts.path, {**params, 'page_size': page_size})
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(len(response.data['results']), page_size, url)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1], f'{url}: {counts[0]} queries for {self.PAGE_SIZES[0]} rows, '
+                                               f'{counts[1]} for {self.PAGE_SIZES[1]}')
+        return counts[0], response.data['results']
+
+    def test_list_endpoints(self):
+        for url in ('/api/api/lost-items/', '/api/api/found-items/', '/api/api/claims/'):
+            for user in (self.admin, self.resident):
+                with self.subTest(url=url, user=user.username):
+                    self.assertConstantQueries(user, url)
+        self.assertConstantQueries(self.resident, '/api/api/notifications/')
+        self.assertConstantQueries(self.admin, '/api/api/users/')
+
+    def test_list_endpoints_query_budget(self):
+        # The page itself, plus one query for the found items nested in the claims
+        self.assertEqual(self.assertConstantQueries(self.admin, '/api/api/lost-items/')[0], 1)
+        self.assertEqual(self.assertConstantQueries(self.admin, '/api/api/found-items/')[0], 1)
+        self.assertEqual(self.assertConstantQueries(self.admin, '/api/api/claims/')[0], 2)
+
+    def test_search(self):
+        for url in ('/api/api/lost-items/search/?q=bag', '/api/api/found-items/search/?q=black+ba'):
+            for user in (self.admin, self.resident):
+                with self.subTest(url=url, user=user.username):
+                    _, results = self.assertConstantQueries(user, url)
+                    # Ranked FTS5 hits, not the unfiltered list
+                    for result in results:
+                        self.assertIsNotNone(result['search_rank'])
+                        self.assertIn('<mark>', result['search_snippet'])
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        results = client.get('/api/api/found-items/search/', {'q': 'bag 29'}).data['results']
+        self.assertEqual([result['title'] for result in results], ['black bag 29'])
+
+    def test_potential_matches(self):
+        # Without an embedding: open lost items of the same category
+        LostItem.objects.update(category=self.category)
+        self.assertConstantQueries(self.admin, f'/api/api/found-items/{self.found_item.pk}/potential_matches/')
+
+
+######################################################################################################################################################
+# Denormalised counters (FoundItem.claim_count, User.unread_notification_count)
+######################################################################################################################################################
+class CounterTests(TestCase):
+    """The counters follow every path that adds, removes or reads claims and notifications"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', user_type='admin')
+        cls.resident = User.objects.create(username='resident', email='resident@example.com')
+        cls.found_item = FoundItem.objects.create(user=cls.admin, title='umbrella', description='black',
+                                                  found_location='lobby', found_date=date.today())
+
+    def assertCounters(self, claims, unread):
+        self.assertEqual(FoundItem.objects.get(pk=self.found_item.pk).claim_count, claims)
+        self.assertEqual(User.objects.get(pk=self.resident.pk).unread_notification_count, unread)
+
+    def notify(self, **fields):
+        return Notification.objects.create(user=self.resident, notification_type='system', title='Notice',
+                                           message='hello', **fields)
+
+    def test_claims(self):
+        claim = Claim.objects.create(user=self.resident, found_item=self.found_item, claim_description='mine')
+        other = Claim.objects.create(user=self.admin, found_item=self.found_item, claim_description='mine too')
+        self.assertCounters(claims=2, unread=0)
+        claim.status = 'approved'
+        claim.save()
+        self.assertCounters(claims=2, unread=0)
+        other.delete()
+        self.assertCounters(claims=1, unread=0)
+        # Cascade: the claimant's account is removed
+        self.resident.delete()
+        self.assertEqual(FoundItem.objects.get(pk=self.found_item.pk).claim_count, 0)
+
+    def test_notifications(self):
+        first, second, third = self.notify(), self.notify(), self.notify(is_read=True)
+        self.assertCounters(claims=0, unread=2)
+        first.is_read = True
+        first.save()
+        first.save()
+        self.assertCounters(claims=0, unread=1)
+        third.delete()
+        self.assertCounters(claims=0, unread=1)
+        second.delete()
+        self.assertCounters(claims=0, unread=0)
+
+    def test_cascaded_notifications(self):
+        claim = Claim.objects.create(user=self.resident, found_item=self.found_item, claim_description='mine')
+        self.notify(claim=claim, found_item=self.found_item)
+        self.notify(found_item=self.found_item)
+        self.assertCounters(claims=1, unread=2)
+        Notification.objects.filter(claim=claim).delete()
+        self.assertCounters(claims=1, unread=1)
+        self.found_item.delete()
+        self.assertEqual(User.objects.get(pk=self.resident.pk).unread_notification_count, 0)
+
+    def test_saves_do_not_overwrite_counters(self):
+        found_item = FoundItem.objects.get(pk=self.found_item.pk)
+        resident = User.objects.get(pk=self.resident.pk)
+        Claim.objects.create(user=self.resident, found_item=self.found_item, claim_description='mine')
+        self.notify()
+        # Instances loaded before the increments, saved after them
+        found_item.status = 'returned'
+        found_item.save()
+        resident.room_number = '12'
+        resident.save()
+        self.assertCounters(claims=1, unread=1)
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.resident)
+        notifications = [self.notify() for _ in range(3)]
+        # As JWT authentication loads it on each request; the count comes with it, no further query
+        client.force_authenticate(User.objects.get(pk=self.resident.pk))
+        with self.assertNumQueries(0):
+            response = client.get('/api/api/notifications/unread-count/')
+        self.assertEqual(response.data, {'unread_count': 3})
+
+        client.post(f'/api/api/notifications/{notifications[0].pk}/mark_read/')
+        self.assertCounters(claims=0, unread=2)
+        client.post('/api/api/notifications/mark_all_read/')
+        self.assertCounters(claims=0, unread=0)
+
+        response = client.post('/api/api/claims/', {'found_item': self.found_item.pk, 'claim_description': 'mine'})
+        self.assertEqual(response.status_code, 201, response.content)
+        response = client.get(f'/api/api/found-items/{self.found_item.pk}/')
+        self.assertEqual(response.status_code, 404)
+        client.force_authenticate(self.admin)
+        self.assertEqual(client.get(f'/api/api/found-items/{self.found_item.pk}/').data['claim_count'], 1)
+
+    def test_reconcile(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        Claim.objects.create(user=self.resident, found_item=self.found_item, claim_description='mine')
+        self.notify()
+        # Writes that bypass the models, e.g. raw SQL or a restored backup
+        FoundItem.objects.update(claim_count=7)
+        Notification.objects.update(is_read=True)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('FoundItem.claim_count: 1 row(s) drifted', out.getvalue())
+        self.assertCounters(claims=7, unread=1)
+        call_command('reconcile_counters', stdout=out)
+        self.assertCounters(claims=1, unread=0)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertNotIn('drifted', out.getvalue())
+
+
+######################################################################################################################################################
+# Full-text search index kept in sync with the item tables
+######################################################################################################################################################
+class SearchIndexTests(TestCase):
+    """Items saved through the ORM are found by the search actions (the migrations keep the sync triggers)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', user_type='admin')
+
+    def test_new_items_are_searchable(self):
+        LostItem.objects.create(user=self.admin, title='striped umbrella', description='left behind',
+                                lost_location='lobby', lost_date=date.today())
+        FoundItem.objects.create(user=self.admin, title='striped umbrella', description='by the door',
+                                 found_location='lobby', found_date=date.today())
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for url in ('/api/api/lost-items/search/', '/api/api/found-items/search/'):
+            with self.subTest(url=url):
+                results = client.get(url, {'q': 'umbre'}).data['results']
+                self.assertEqual([result['title'] for result in results], ['striped umbrella'])
+
+    def test_system_check_reports_missing_sync_triggers(self):
+        from django.core import checks
+
+        from .search import fts_available
+
+        if not fts_available(FoundItem):
+            self.skipTest('SQLite without FTS5')
+        self.assertEqual(checks.run_checks(tags=[checks.Tags.database], databases=['default']), [])
+        # What a migration rebuilding the table without restoring the triggers leaves behind
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER "lost_found_app_founditem_search_au"')
+        [error] = checks.run_checks(tags=[checks.Tags.database], databases=['default'])
+        self.assertEqual((error.id, error.obj), ('lost_found_app.E001', FoundItem))
+        self.assertIn('lost_found_app_founditem_search_au', error.msg)
+
+
+######################################################################################################################################################
+# Image embeddings
+######################################################################################################################################################
+def _temporary_vector_indexes(test):
+    """Point the shared per-process vector indexes at a fresh directory for the duration of ``test``"""
+    import shutil
+    import tempfile
+
+    from . import vector_index
+
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    index_dir = test.settings(AI_VECTOR_INDEX_DIR=directory)
+    index_dir.enable()
+    test.addCleanup(index_dir.disable)
+    indexes = mock.patch.dict(vector_index._indexes, clear=True)
+    indexes.start()
+    test.addCleanup(indexes.stop)
+    return directory
+
+
+def _embedding(*values):
+    """Packed unit-length float16 embedding, as classify_image stores it"""
+    import numpy as np
+
+    vector = np.asarray(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).astype(np.float16).tobytes()
+
+
+class EmbeddingBackfillTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='resident', email='resident@example.com')
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        _temporary_vector_indexes(self)
+
+    def item(self, name, **fields):
+        item = LostItem.objects.create(user=self.user, title=name, description=name, lost_location='lobby')
+        LostItem.objects.filter(pk=item.pk).update(item_image=f'lost_items/{name}.jpg', **fields)
+        return item
+
+    def test_backfill(self):
+        import numpy as np
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+
+        buffer = io.BytesIO()
+        np.save(buffer, np.zeros((224, 224, 3), dtype=np.uint8))
+        patch = default_storage.save('derivatives/patch224.npy', ContentFile(buffer.getvalue()))
+        cached = self.item('cached', image_derivatives={'source_hash': 'a', 'patch': patch})
+        missing = self.item('missing', image_derivatives={'source_hash': 'b', 'patch': 'derivatives/gone.npy'})
+        plain = self.item('plain')
+        current = self.item('current', image_embedding=_embedding(1, 0, 0, 0), embedding_model_version='resnet18')
+
+        class RemoteCascade:
+            """A remote service fronting a cascade: its own label is not its embeddings' label"""
+            model_version = 'resnet18>resnet101@60'
+            embedding_model_version = 'resnet18'
+            embedding_dim = 4
+
+            def __init__(self):
+                self.inputs = []
+
+            @property
+            def embedding_service(self):
+                return self
+
+            def ensure_loaded(self):
+                return True
+
+            def preprocess_image(self, path):
+                return f'decoded {os.path.basename(path)}'
+
+            def predict_batch(self, images, with_embeddings=False):
+                self.inputs += ['patch' if hasattr(image, 'shape') else image for image in images]
+                return [([], 0.0, _embedding(0, 1, 0, 0)) for _ in images]
+
+        service = RemoteCascade()
+        with mock.patch('lost_found_app.ai_service.get_ai_service', return_value=service):
+            call_command('backfill_embeddings', stdout=io.StringIO(), stderr=io.StringIO())
+            # Everything is current now, so a second run has nothing to do
+            output = io.StringIO()
+            call_command('backfill_embeddings', stdout=output, stderr=io.StringIO())
+        self.assertIn('LostItem: 0 embedded, 0 failed', output.getvalue())
+        # The cached crop is used when it exists; a missing one falls back to decoding the master
+        self.assertEqual(sorted(service.inputs), ['decoded missing.jpg', 'decoded plain.jpg', 'patch'])
+        for item in (cached, missing, plain):
+            item.refresh_from_db()
+            self.assertEqual((bytes(item.image_embedding), item.embedding_model_version),
+                             (_embedding(0, 1, 0, 0), 'resnet18'))
+        current.refresh_from_db()
+        self.assertEqual(bytes(current.image_embedding), _embedding(1, 0, 0, 0))
+
+        from .vector_index import get_vector_index
+        self.assertEqual({key: get_vector_index('lost').stats()[key] for key in ('size', 'model_version')},
+                         {'size': 3, 'model_version': 'resnet18'})
+
+
+######################################################################################################################################################
+# Memory-mapped vector index
+######################################################################################################################################################
+class VectorIndexTests(TestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def index(self, **kwargs):
+        from .vector_index import VectorIndex
+
+        return VectorIndex('items', self.directory, **kwargs)
+
+    def vectors(self, count, dim=16, clusters=0, seed=0):
+        """``count`` unit vectors (around ``clusters`` centres when given) and an id for each"""
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        if clusters:
+            centres = rng.normal(size=(clusters, dim))
+            vectors = centres[rng.integers(clusters, size=count)] + rng.normal(scale=0.3, size=(count, dim))
+        else:
+            vectors = rng.normal(size=(count, dim))
+        vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        return [str(uuid.UUID(int=i + 1)) for i in range(count)], vectors
+
+    def brute_force(self, ids, vectors, query, k):
+        import numpy as np
+
+        scores = vectors @ (query / np.linalg.norm(query))
+        return [(ids[i], float(scores[i])) for i in np.argsort(-scores)[:k]]
+
+    def test_add_replace_remove_and_reuse(self):
+        ids, vectors = self.vectors(4)
+        index = self.index()
+        for item_id, vector in zip(ids[:3], vectors):
+            self.assertTrue(index.add(item_id, vector, 'resnet18'))
+        self.assertEqual(index.search(vectors[1], k=1)[0][0], ids[1])
+
+        # Replacing keeps the item's row
+        self.assertTrue(index.add(ids[1], vectors[3], 'resnet18'))
+        self.assertEqual((index.stats()['size'], index.meta['size']), (3, 3))
+        self.assertEqual(index.search(vectors[3], k=1)[0][0], ids[1])
+
+        self.assertTrue(index.remove(ids[1]))
+        self.assertFalse(index.remove(ids[1]))
+        self.assertNotIn(ids[1], [item_id for item_id, _ in index.search(vectors[3], k=5)])
+        self.assertEqual(index.stats()['size'], 2)
+
+        # The freed row is reused before the files grow
+        self.assertTrue(index.add(ids[3], vectors[3], 'resnet18'))
+        self.assertEqual((index.stats()['size'], index.meta['size']), (3, 3))
+        self.assertEqual(index.search(vectors[3], k=1)[0][0], ids[3])
+        # Packed float16 embeddings, as stored on the items, are accepted too
+        self.assertTrue(index.add(ids[1], _embedding(*vectors[1]), 'resnet18'))
+        self.assertEqual(index.search(_embedding(*vectors[1]), k=1)[0][0], ids[1])
+
+    def test_grows_past_its_capacity(self):
+        ids, vectors = self.vectors(1100)
+        index = self.index()
+        for item_id, vector in zip(ids, vectors):
+            index.add(item_id, vector, 'resnet18')
+        self.assertEqual((index.meta['capacity'], index.stats()['size']), (2048, 1100))
+        # Rows written before the files grew are still found
+        for i in (0, 1023, 1024, 1099):
+            [(item_id, score)] = index.search(vectors[i], k=1)
+            self.assertEqual(item_id, ids[i])
+            self.assertAlmostEqual(score, 1.0, places=5)
+
+    def test_refuses_another_embedding_model(self):
+        ids, vectors = self.vectors(2)
+        index = self.index()
+        index.add(ids[0], vectors[0], 'resnet18')
+        with self.assertLogs('lost_found_app.vector_index', 'WARNING'):
+            self.assertFalse(index.add(ids[1], vectors[1], 'resnet101'))
+            self.assertFalse(index.add(ids[1], vectors[1][:8], 'resnet18'))
+        self.assertEqual(index.stats()['size'], 1)
+        self.assertEqual(index.model_version, 'resnet18')
+        # A query of another dimension matches nothing
+        self.assertEqual(index.search(vectors[1][:8]), [])
+
+    def test_search_matches_brute_force(self):
+        import numpy as np
+
+        ids, vectors = self.vectors(500)
+        index = self.index()
+        index.rebuild(zip(ids, vectors), 16, 'resnet18')
+        # Queries need not be unit length
+        for query in self.vectors(5, seed=1)[1] * 3:
+            found = index.search(query, k=10)
+            expected = self.brute_force(ids, vectors, query, 10)
+            self.assertEqual([item_id for item_id, _ in found], [item_id for item_id, _ in expected])
+            np.testing.assert_allclose([score for _, score in found], [score for _, score in expected], rtol=1e-5)
+
+    def test_partitioned_search_recall(self):
+        from .vector_index import train_partitions
+
+        ids, vectors = self.vectors(3000, clusters=24)
+        centroids = train_partitions(vectors, 16)
+        self.assertEqual(centroids.shape, (16, 16))
+        self.assertTrue(all(abs(float((c * c).sum()) - 1.0) < 1e-5 for c in centroids))
+
+        index = self.index(nprobe=4)
+        self.assertEqual(index.rebuild(zip(ids, vectors), 16, 'resnet18', partitions=16), 3000)
+        self.assertEqual(index.stats()['partitions'], 16)
+        queries = self.vectors(30, clusters=24, seed=0)[1]
+        hits = 0
+        for query in queries:
+            expected = {item_id for item_id, _ in self.brute_force(ids, vectors, query, 10)}
+            hits += len(expected & {item_id for item_id, _ in index.search(query, k=10)})
+        self.assertGreaterEqual(hits / (10 * len(queries)), 0.9)
+
+        # Probing every partition is exact
+        exhaustive = self.index(nprobe=16)
+        for query in queries[:5]:
+            self.assertEqual([item_id for item_id, _ in exhaustive.search(query, k=10)],
+                             [item_id for item_id, _ in self.brute_force(ids, vectors, query, 10)])
+
+        # Queries searched together each still see only their own partitions
+        for found, query in zip(index.search_many(queries, k=10), queries):
+            self.assertEqual([item_id for item_id, _ in found], [item_id for item_id, _ in index.search(query, k=10)])
+
+    def test_other_instances_pick_up_writes_and_rebuilds(self):
+        ids, vectors = self.vectors(6)
+        writer, reader = self.index(), self.index()
+        writer.add(ids[0], vectors[0], 'resnet18')
+        self.assertEqual(reader.search(vectors[0], k=1)[0][0], ids[0])
+
+        writer.rebuild(zip(ids[1:4], vectors[1:4]), 16, 'resnet18')
+        self.assertEqual(sorted(item_id for item_id, _ in reader.search(vectors[0], k=10)), sorted(ids[1:4]))
+        # Either instance keeps writing to the rebuilt files
+        self.assertTrue(reader.remove(ids[1]))
+        self.assertTrue(reader.add(ids[4], vectors[4], 'resnet18'))
+        self.assertTrue(writer.add(ids[5], vectors[5], 'resnet18'))
+        for index in (writer, reader):
+            self.assertEqual(sorted(item_id for item_id, _ in index.search(vectors[0], k=10)),
+                             sorted([ids[2], ids[3], ids[4], ids[5]]))
+        self.assertEqual(writer.meta['size'], 4)
+
+
+class PotentialMatchesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner', email='owner@example.com')
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', user_type='admin')
+        cls.bags = Category.objects.create(name='bags')
+
+    def setUp(self):
+        _temporary_vector_indexes(self)
+
+    def test_image_urls_are_absolute(self):
+        from .vector_index import get_vector_index
+
+        lost = LostItem.objects.create(user=self.owner, category=self.bags, title='bag', description='bag',
+                                       lost_location='lobby')
+        LostItem.objects.filter(pk=lost.pk).update(
+            item_image='lost_items/bag.jpg', image_embedding=_embedding(1, 0, 0, 0), embedding_model_version='resnet18',
+            image_derivatives={'thumbnails': {'160': {'jpeg': 'derivatives/lost_items/bag_160.jpeg'}}})
+        get_vector_index('lost').add(lost.pk, _embedding(1, 0, 0, 0), 'resnet18')
+        found = FoundItem.objects.create(user=self.admin, category=self.bags, title='bag', description='bag',
+                                         found_location='lobby')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        # Ranked by the image index, then (without an embedding) by category
+        for embedding in (_embedding(0.9, 0.1, 0, 0), None):
+            with self.subTest(embedding=embedding is not None):
+                FoundItem.objects.filter(pk=found.pk).update(image_embedding=embedding,
+                                                             embedding_model_version='resnet18' if embedding else '')
+                response = client.get(f'/api/api/found-items/{found.pk}/potential_matches/')
+                self.assertEqual(response.status_code, 200)
+                [item] = response.data['results']
+                self.assertEqual(item['id'], str(lost.pk))
+                self.assertEqual('similarity' in item, embedding is not None)
+                self.assertTrue(item['item_image'].startswith('http://testserver/'), item['item_image'])
+                self.assertTrue(item['thumbnails']['160']['jpeg'].startswith('http://testserver/'))
+
+
+######################################################################################################################################################
+# Lost<->found matching
+######################################################################################################################################################
+class MatchingTests(TestCase):
+    """Scoring, candidate selection and background discovery of lost/found matches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner', email='owner@example.com')
+        cls.finder = User.objects.create(username='finder', email='finder@example.com')
+        cls.bags = Category.objects.create(name='bags')
+        cls.keys = Category.objects.create(name='keys')
+
+    def lost(self, **fields):
+        fields = {'title': 'black leather bag', 'description': 'black leather bag', 'lost_location': 'lobby',
+                  'lost_date': date.today(), 'color': 'black', **fields}
+        return LostItem.objects.create(user=self.owner, **fields)
+
+    def found(self, **fields):
+        fields = {'title': 'black leather bag', 'description': 'black leather bag', 'found_location': 'lobby',
+                  'found_date': date.today(), 'color': 'black', **fields}
+        return FoundItem.objects.create(user=self.finder, **fields)
+
+    def profiles(self, lost, found):
+        from .matching import MatchProfile
+
+        return MatchProfile(lost, 'lost'), MatchProfile(found, 'found')
+
+    def test_score_pair(self):
+        from .matching import score_pair
+
+        lost = self.lost(brand='Samsonite')
+        score, breakdown = score_pair(*self.profiles(lost, self.found(brand='samsonite')), 90)
+        self.assertAlmostEqual(score, 1.0)
+        self.assertEqual(breakdown, {'text': 1.0, 'location': 1.0, 'color': 1.0, 'brand': 1.0, 'date': 1.0})
+
+        # Signals missing on one side (no brand) are left out rather than counted as a mismatch
+        _, breakdown = score_pair(*self.profiles(lost, self.found()), 90)
+        self.assertNotIn('brand', breakdown)
+
+        different = self.found(title='silver keys', description='car keys', found_location='gym', color='silver',
+                               brand='Toyota', found_date=date.today() + timedelta(days=45))
+        score, breakdown = score_pair(*self.profiles(lost, different), 90)
+        self.assertEqual((breakdown['text'], breakdown['color'], breakdown['brand']), (0.0, 0.0, 0.0))
+        self.assertAlmostEqual(breakdown['date'], 0.5)
+        self.assertLess(score, 0.1)
+
+    def test_score_pair_dates(self):
+        from .matching import score_pair
+
+        lost = self.lost()
+        early = self.found(found_date=date.today() - timedelta(days=5))
+        self.assertEqual(score_pair(*self.profiles(lost, early), 90)[1]['date'], 0.0)
+        later = self.found(found_date=date.today() + timedelta(days=3))
+        self.assertEqual(score_pair(*self.profiles(lost, later), 0)[1]['date'], 0.0)
+        self.assertEqual(score_pair(*self.profiles(lost, self.found()), 0)[1]['date'], 1.0)
+
+    def test_ai_labels(self):
+        from .matching import score_pair
+
+        predictions = {'predictions': [{'category': 'backpack', 'confidence': 60.0}, {'category': 'purse', 'confidence': 30.0}]}
+        lost = self.lost(ai_top_predictions=predictions)
+        same = self.found(ai_top_predictions={'predictions': [{'category': 'backpack', 'confidence': 80.0}]})
+        other = self.found(ai_top_predictions={'predictions': [{'category': 'wallet', 'confidence': 90.0}]})
+        self.assertEqual(score_pair(*self.profiles(lost, same), 90)[1]['ai_label'], 1.0)
+        self.assertEqual(score_pair(*self.profiles(lost, other), 90)[1]['ai_label'], 0.0)
+
+    def test_find_matches(self):
+        from .matching import find_matches
+
+        lost = self.lost(category=self.bags)
+        best = self.found(category=self.bags)
+        weaker = self.found(category=self.bags, title='brown bag', description='canvas bag', color='brown')
+        # Not candidates: another category, outside the date window, no longer open, found by the owner
+        self.found(category=self.keys)
+        self.found(category=self.bags, found_date=date.today() + timedelta(days=200))
+        self.found(category=self.bags, status='returned')
+        FoundItem.objects.create(user=self.owner, category=self.bags, title='black leather bag',
+                                 description='black leather bag', found_location='lobby', found_date=date.today())
+        with self.settings(MATCH_MIN_SCORE=0):
+            matches = find_matches(lost, 'lost')
+        self.assertEqual([candidate for candidate, _, _ in matches], [best, weaker])
+        self.assertGreater(matches[0][1], matches[1][1])
+
+        with self.settings(MATCH_MIN_SCORE=0.9):
+            self.assertEqual([candidate for candidate, _, _ in find_matches(lost, 'lost')], [best])
+        # Found items rank lost ones the same way
+        with self.settings(MATCH_MIN_SCORE=0):
+            self.assertEqual([candidate for candidate, _, _ in find_matches(best, 'found')], [lost])
+
+    def test_zero_day_window(self):
+        from .matching import find_matches
+
+        lost = self.lost(category=self.bags)
+        found = self.found(category=self.bags)
+        with self.settings(MATCH_DATE_WINDOW_DAYS=0, MATCH_MIN_SCORE=0):
+            self.assertEqual([candidate for candidate, _, _ in find_matches(lost, 'lost')], [found])
+
+    def test_batch_keeps_the_filter_of_related_items(self):
+        from .matching import find_matches_batch
+
+        bag, key = self.found(category=self.bags), self.found(category=self.keys, title='keys', description='keys')
+        related = self.lost(category=self.bags)
+        unrelated = self.lost(category=None)
+        results = find_matches_batch([related, unrelated], 'lost', min_score=0)
+        # The uncategorised item does not widen the related item's candidates to every open item
+        self.assertEqual([candidate for candidate, _, _ in results[related.pk]], [bag])
+        self.assertEqual({candidate for candidate, _, _ in results[unrelated.pk]}, {bag, key})
+
+    def test_batch_caps_candidates(self):
+        from .matching import find_matches_batch
+
+        for _ in range(5):
+            self.found(category=self.bags)
+            self.found(category=None)
+        with self.settings(MATCH_MAX_CANDIDATES=2):
+            results = find_matches_batch([self.lost(category=self.bags), self.lost(category=None)], 'lost', min_score=0)
+        self.assertEqual([len(matches) for matches in results.values()], [2, 2])
+
+    def test_batch_matches_each_item_alone(self):
+        from .matching import find_matches, find_matches_batch
+
+        today = date.today()
+        for offset in range(-10, 300, 7):
+            self.found(category=self.bags if offset % 2 else self.keys, found_date=today + timedelta(days=offset),
+                       ai_suggested_category='backpack' if offset % 3 else '')
+        # Windows far apart and overlapping, with category, label or nothing to relate on
+        items = [
+            self.lost(category=self.bags, lost_date=today),
+            self.lost(category=self.keys, lost_date=today + timedelta(days=60)),
+            self.lost(category=None, ai_suggested_category='backpack', lost_date=today + timedelta(days=200)),
+            self.lost(category=None, lost_date=today + timedelta(days=30)),
+            self.lost(category=self.bags, lost_date=today + timedelta(days=45)),
+        ]
+        for max_candidates in (3, 500):
+            with self.subTest(max_candidates=max_candidates), self.settings(MATCH_MAX_CANDIDATES=max_candidates):
+                with self.assertNumQueries(1):
+                    batched = find_matches_batch(items, 'lost')
+                expected = {item.pk: find_matches(item, 'lost') for item in items}
+                self.assertEqual(
+                    {pk: [(candidate.pk, score) for candidate, score, _ in matches] for pk, matches in batched.items()},
+                    {pk: [(candidate.pk, score) for candidate, score, _ in matches] for pk, matches in expected.items()}
+                )
+
+    def test_discovery_counts_inserted_notifications(self):
+        from . import match_discovery
+
+        lost = self.lost(category=self.bags)
+        match_discovery.discover_matches_for('found', backfill=True)
+        found = self.found(category=self.bags)
+        build = match_discovery._build_notifications
+
+        def build_during_concurrent_run(*args):
+            notifications = build(*args)
+            # Another run sends the same pair in the meantime: bulk_create skips it
+            Notification.objects.create(user=self.owner, notification_type='match_found', title='Match',
+                                        message='sent', lost_item=lost, found_item=found)
+            return notifications
+
+        with mock.patch.object(match_discovery, '_build_notifications', build_during_concurrent_run):
+            self.assertEqual(match_discovery.discover_matches_for('found'), (1, 0))
+        self.assertEqual(Notification.objects.filter(lost_item=lost, found_item=found).count(), 1)
+        self.assertEqual(User.objects.get(pk=self.owner.pk).unread_notification_count, 1)
+
+
+######################################################################################################################################################
+# Lazy model loading
+######################################################################################################################################################
+class ModelLoadingTests(TestCase):
+
+    def test_startup_does_not_import_torch(self):
+        import subprocess
+        import sys
+
+        from django.conf import settings
+
+        # A fresh interpreter: this one has torch loaded by other tests
+        code = ("import sys, django; django.setup(); import lost_found_project.urls; "
+                "from lost_found_app.ai_service import get_ai_service; get_ai_service(); "
+                "print(sorted(name for name in ('torch', 'torchvision') if name in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'lost_found_project.settings'}, check=True)
+        self.assertEqual(output.stdout.strip(), '[]', output.stderr)
+
+    def test_model_is_loaded_once_on_first_use(self):
+        import threading
+        import time
+        from .ai_service import PyTorchAIClassificationService
+
+        service = PyTorchAIClassificationService('resnet18')
+        self.assertEqual((service.load_attempted, service.model_loaded, service.model), (False, False, None))
+        loads = []
+
+        def load_model():
+            loads.append(threading.get_ident())
+            time.sleep(0.05)
+            service.model_loaded = True
+
+        results = []
+        with mock.patch.object(service, 'load_model', load_model):
+            threads = [threading.Thread(target=lambda: results.append(service.ensure_loaded())) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(service.ensure_loaded())
+        self.assertEqual((len(loads), results), (1, [True] * 8))
+
+    def test_a_failed_load_is_not_retried(self):
+        from .ai_service import PyTorchAIClassificationService
+
+        service = PyTorchAIClassificationService('resnet18')
+        with mock.patch.object(service, 'load_model') as load_model:
+            self.assertFalse(service.ensure_loaded())
+            self.assertFalse(service.ensure_loaded())
+            with self.assertRaisesRegex(Exception, 'Model not loaded'):
+                service.predict(None)
+        self.assertEqual(load_model.call_count, 1)
+
+    def test_warm_up(self):
+        from . import ai_service
+
+        service = ai_service.PyTorchAIClassificationService('resnet18')
+
+        def load_model():
+            service.model_loaded = True
+
+        with mock.patch.object(ai_service, 'get_ai_service', return_value=service), \
+                mock.patch.object(service, 'load_model', load_model), \
+                mock.patch.object(service, 'predict') as predict:
+            self.assertTrue(ai_service.warm_up())
+            self.assertTrue(ai_service.warm_up(run_inference=False))
+        self.assertEqual(predict.call_count, 1)
+
+
+######################################################################################################################################################
+# Offline, memory-mapped model weights
+######################################################################################################################################################
+def _mapped_file(tensor):
+    """Path of the file mapping that holds ``tensor``'s data in this process, or None"""
+    address = tensor.data_ptr()
+    with open('/proc/self/maps') as maps:
+        for line in maps:
+            fields = line.split()
+            start, end = (int(value, 16) for value in fields[0].split('-'))
+            if start <= address < end:
+                return fields[5] if len(fields) > 5 else None
+    return None
+
+
+class WeightLoadingTests(TestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.weights_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.weights_dir, ignore_errors=True)
+        weights = self.settings(AI_MODEL_WEIGHTS_DIR=self.weights_dir, AI_ALLOW_WEIGHT_DOWNLOAD=False)
+        weights.enable()
+        self.addCleanup(weights.disable)
+
+    def tiny_models(self):
+        """Stands in for torchvision.models with one small architecture, 'tiny'"""
+        import types
+        import torch
+
+        def tiny(weights=None, pretrained=False):
+            return torch.nn.Sequential(torch.nn.Linear(4, 8), torch.nn.ReLU(), torch.nn.Linear(8, 3))
+
+        return types.SimpleNamespace(tiny=mock.Mock(wraps=tiny))
+
+    def test_weights_are_mapped_from_the_local_file(self):
+        import torch
+        from .ai_service import PyTorchAIClassificationService
+
+        models = self.tiny_models()
+        expected = models.tiny().state_dict()
+        torch.save(expected, os.path.join(self.weights_dir, 'tiny.pth'))
+
+        service = PyTorchAIClassificationService('tiny')
+        model = service._build_model(models)
+        self.assertEqual(service.weights_source, f"mmap:{os.path.join(self.weights_dir, 'tiny.pth')}")
+        for name, tensor in model.state_dict().items():
+            self.assertEqual(tensor.device.type, 'cpu', name)
+            self.assertTrue(torch.equal(tensor, expected[name]), name)
+            # Assigned, not copied: the parameters are the mapped file's pages
+            self.assertEqual(_mapped_file(tensor), service.weights_path(), name)
+        self.assertNotIn(mock.call(pretrained=True), models.tiny.call_args_list)
+
+    def test_missing_weights(self):
+        from .ai_service import PyTorchAIClassificationService
+
+        models = self.tiny_models()
+        service = PyTorchAIClassificationService('tiny')
+        with self.assertRaisesRegex(FileNotFoundError, 'export_model_weights --model tiny'):
+            service._build_model(models)
+        with self.settings(AI_ALLOW_WEIGHT_DOWNLOAD=True):
+            service._build_model(models)
+        self.assertEqual(models.tiny.call_args, mock.call(pretrained=True))
+        self.assertEqual(service.weights_source, 'torchvision-download')
+
+    def test_exported_weights_load_into_the_architecture(self):
+        import torch
+        from django.conf import settings
+        from django.core.management import CommandError, call_command
+        from torchvision import models
+        from .ai_service import PyTorchAIClassificationService
+
+        checkpoint = os.path.join(settings.BASE_DIR, 'ai_models', 'resnet18.pth')
+        if not os.path.exists(checkpoint):
+            self.skipTest('no local resnet18 checkpoint')
+        call_command('export_model_weights', model='resnet18', from_file=checkpoint, stdout=io.StringIO())
+        with self.assertRaisesRegex(CommandError, 'already exists'):
+            call_command('export_model_weights', model='resnet18', from_file=checkpoint, stdout=io.StringIO())
+
+        service = PyTorchAIClassificationService('resnet18')
+        model = service._build_model(models)
+        expected = torch.load(checkpoint, map_location='cpu', weights_only=True)
+        self.assertTrue(torch.equal(model.fc.weight, expected['fc.weight']))
+        self.assertEqual(_mapped_file(model.fc.weight), service.weights_path())
+
+
+######################################################################################################################################################
+# Confidence-gated model cascade
+######################################################################################################################################################
+class FakeStage:
+    """A cascade stage whose top-1 confidence for each image (a string) is looked up in ``confidences``"""
+    backend = 'eager'
+    classes = ['backpack']
+    transform = batcher = None
+    load_time = parameter_bytes = rss_delta_bytes = 0
+    embedding_dim = 4
+    model_loaded = True
+
+    def __init__(self, architecture, confidences):
+        self.architecture = self.model_version = architecture
+        self.confidences = confidences
+        self.seen = []
+
+    def ensure_loaded(self):
+        return True
+
+    def _result(self, image):
+        self.seen.append(image)
+        return [{'category': f'{image} by {self.architecture}', 'confidence': self.confidences[image]}], 0.01, \
+            f'{self.architecture}:{image}'.encode()
+
+    def predict(self, image, with_embedding=False):
+        result = self._result(image)
+        return result if with_embedding else result[:2]
+
+    def predict_batch(self, images, with_embeddings=False):
+        return [self._result(image) if with_embeddings else self._result(image)[:2] for image in images]
+
+    def load_info(self):
+        return {'model_version': self.model_version, 'backend': self.backend}
+
+
+class CascadeTests(TestCase):
+
+    def setUp(self):
+        from .ai_service import CascadeClassificationService
+
+        self.small = FakeStage('resnet18', {'sure': 95.0, 'edge': 60.0, 'unsure': 30.0})
+        self.large = FakeStage('resnet101', {'sure': 99.0, 'edge': 99.0, 'unsure': 45.0})
+        self.cascade = CascadeClassificationService([self.small, self.large], threshold=60.0)
+
+    def test_version_label(self):
+        self.assertEqual(self.cascade.model_version, 'resnet18>resnet101@60')
+        self.assertIs(self.cascade.embedding_service, self.small)
+
+    def test_low_confidence_is_escalated(self):
+        for image, answered_by in (('sure', 'resnet18'), ('edge', 'resnet18'), ('unsure', 'resnet101')):
+            with self.subTest(image=image):
+                predictions, _, version, embedding = self.cascade._predict_with_version(image)
+                self.assertEqual((predictions[0]['category'], version), (f'{image} by {answered_by}', answered_by))
+                # Embeddings always come from the first stage
+                self.assertEqual(embedding, f'resnet18:{image}'.encode())
+        # The final stage answers even when it is not confident either
+        self.assertEqual(self.large.seen, ['unsure'])
+        stats = self.cascade.cascade_stats()
+        self.assertEqual((stats['requests'], stats['escalation_rate']), (3, round(1 / 3, 4)))
+        self.assertEqual([(stage['calls'], stage['answered']) for stage in stats['stages']], [(3, 2), (1, 1)])
+
+    def test_batches_escalate_only_their_unsure_images(self):
+        results = self.cascade.predict_batch(['unsure', 'sure', 'edge', 'unsure'], with_embeddings=True)
+        self.assertEqual([predictions[0]['category'] for predictions, _, _ in results],
+                         ['unsure by resnet101', 'sure by resnet18', 'edge by resnet18', 'unsure by resnet101'])
+        self.assertEqual([embedding for _, _, embedding in results],
+                         [f'resnet18:{image}'.encode() for image in ('unsure', 'sure', 'edge', 'unsure')])
+        self.assertEqual(self.large.seen, ['unsure', 'unsure'])
+        self.assertEqual(len(self.cascade.predict_batch(['sure'])[0]), 2)
+
+    def test_threshold(self):
+        from .ai_service import CascadeClassificationService
+
+        strict = CascadeClassificationService([self.small, self.large], threshold=99.0)
+        self.assertEqual(strict.model_version, 'resnet18>resnet101@99')
+        self.assertEqual(strict._predict_with_version('sure')[2], 'resnet101')
+
+
+######################################################################################################################################################
+# Classifying uploads from their buffer
+######################################################################################################################################################
+class UploadClassificationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='resident', email='resident@example.com')
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from .prediction_cache import prediction_cache
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(prediction_cache.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def classify(self, upload, **settings):
+        from . import views
+
+        service = views.pytorch_ai_service
+        decoded = []
+
+        def classify_bytes(data):
+            decoded.append(data)
+            return [{'category': 'backpack', 'confidence': 88.0}], 0.02, 'resnet101', None
+
+        with self.settings(MEDIA_ROOT=self.media_root, **settings), \
+                mock.patch.object(service, 'ensure_loaded', return_value=True), \
+                mock.patch.object(service, '_classify_bytes', side_effect=classify_bytes), \
+                mock.patch.object(service, 'log_classification') as log, \
+                mock.patch.object(service, 'classify_image', wraps=service.classify_image) as classify_image:
+            response = self.client.post('/api/api/real-time-classify/', {'image': upload}, format='multipart')
+        # Handed the upload itself, never a path to a copy of it
+        self.assertNotIsInstance(classify_image.call_args.args[0], (str, os.PathLike))
+        return response, decoded, log
+
+    def test_uploads_are_classified_without_temporary_files(self):
+        from .prediction_cache import content_hash
+
+        for spooled in (False, True):
+            with self.subTest(spooled=spooled):
+                # A fresh image each time, so the prediction cache does not answer
+                upload = _jpeg_upload(color=(10, 200 if spooled else 100, 30))
+                data = upload.read()
+                upload.seek(0)
+                # Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are spooled by Django, not read into memory
+                settings = {'FILE_UPLOAD_MAX_MEMORY_SIZE': 0} if spooled else {}
+                response, decoded, log = self.classify(upload, **settings)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.data['model_version'], 'resnet101')
+                # The validated upload is rewound and read in full, then logged by content
+                self.assertEqual(decoded, [data])
+                self.assertEqual(log.call_args.args[0], f'sha256:{content_hash(data)}')
+                self.assertEqual([files for _, _, files in os.walk(self.media_root) if files], [])
+
+
+######################################################################################################################################################
+# Image preprocessing (reduced-size decode, fused resize/crop, cached model crops)
+######################################################################################################################################################
+class PreprocessingTests(TestCase):
+
+    def test_crop_box(self):
+        from .preprocessing import crop_box
+
+        # 640x480 -> Resize(256) gives 341.33x256, then the centre 224x224
+        left, top, right, bottom = crop_box(640, 480)
+        scale = 256 / 480
+        self.assertAlmostEqual((right - left) * scale, 224)
+        self.assertAlmostEqual((bottom - top) * scale, 224)
+        self.assertAlmostEqual(left + right, 640)
+        self.assertAlmostEqual(top + bottom, 480)
+
+    def test_jpegs_are_decoded_at_reduced_size(self):
+        from .management.commands.benchmark_preprocessing import _synthetic_jpeg
+        from .preprocessing import open_image
+
+        image = open_image(io.BytesIO(_synthetic_jpeg(3)))
+        # 2000x1500 decoded at 1/4 scale: the smallest that keeps both sides >= 256
+        self.assertEqual((image.size, image.mode), ((500, 375), 'RGB'))
+
+    def test_matches_the_torchvision_pipeline(self):
+        from .management.commands.benchmark_preprocessing import _synthetic_jpeg, fast_pipeline, legacy_pipeline
+
+        for megapixels in (0.3, 3):
+            with self.subTest(megapixels=megapixels):
+                data = _synthetic_jpeg(megapixels)
+                legacy, fast = legacy_pipeline(data), fast_pipeline(data)
+                self.assertEqual((fast.shape, fast.dtype), (legacy.shape, legacy.dtype))
+                difference = (legacy - fast).abs()
+                self.assertLess(difference.mean().item(), 0.05)
+                self.assertLess(difference.max().item(), 0.3)
+
+    def test_cached_patch_matches_a_full_decode(self):
+        import shutil
+        import tempfile
+
+        import torch
+
+        from .image_derivatives import load_patch, write_derivatives
+        from .management.commands.benchmark_preprocessing import _synthetic_jpeg, fast_pipeline
+        from .preprocessing import to_model_input
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        data = _synthetic_jpeg(1)
+        with self.settings(MEDIA_ROOT=media_root):
+            patch = load_patch(write_derivatives(data, 'derivatives/test'))
+        self.assertEqual((patch.shape, str(patch.dtype)), ((224, 224, 3), 'uint8'))
+        self.assertTrue(torch.equal(to_model_input(patch), fast_pipeline(data)))
+
+    def test_same_top1_as_torchvision(self):
+        import torch
+        from django.conf import settings
+
+        from .ai_service import PyTorchAIClassificationService
+        from .management.commands.benchmark_preprocessing import fast_pipeline, legacy_pipeline
+
+        service = PyTorchAIClassificationService('resnet18')
+        if not os.path.exists(service.weights_path()):
+            self.skipTest('no local resnet18 weights')
+        with self.assertLogs('lost_found_app.ai_service', 'INFO'):
+            self.assertTrue(service.ensure_loaded())
+        with open(os.path.join(settings.BASE_DIR, 'media', 'chair.jpeg'), 'rb') as f:
+            data = f.read()
+        with torch.no_grad():
+            logits = service.model(torch.stack([legacy_pipeline(data), fast_pipeline(data)]))
+        self.assertEqual(logits[0].argmax().item(), logits[1].argmax().item())
+
+
+######################################################################################################################################################
+# Prediction cache (in-process LRU in front of PredictionCacheEntry)
+######################################################################################################################################################
+def _prediction(category, confidence=80.0, model_version='resnet18'):
+    return {'suggested_category': category, 'confidence': confidence, 'processing_time': 0.1,
+            'top_predictions': {'predictions': [{'category': category, 'confidence': confidence}], 'count': 1},
+            'model_version': model_version}
+
+
+class PredictionCacheTests(TestCase):
+
+    def test_miss_then_hits_from_both_tiers(self):
+        from .prediction_cache import PredictionCache
+
+        cache = PredictionCache(max_entries=4)
+        self.assertIsNone(cache.get('a' * 64, 'resnet18'))
+        cache.put('a' * 64, 'resnet18', _prediction('backpack'))
+        result = cache.get('a' * 64, 'resnet18')
+        self.assertEqual(result['suggested_category'], 'backpack')
+        # Callers get copies: changing one does not change the cached result
+        result['top_predictions']['predictions'].clear()
+        self.assertEqual(cache.get('a' * 64, 'resnet18')['top_predictions']['count'], 1)
+        self.assertIsNone(cache.get('a' * 64, 'resnet50'))
+
+        # Another process (an empty LRU) is answered from the table, then from memory
+        other = PredictionCache(max_entries=4)
+        self.assertEqual(other.get('a' * 64, 'resnet18')['suggested_category'], 'backpack')
+        self.assertEqual(other.get('a' * 64, 'resnet18')['content_hash'], 'a' * 64)
+        self.assertEqual({key: other.stats()[key] for key in ('memory_hits', 'persistent_hits', 'misses')},
+                         {'memory_hits': 1, 'persistent_hits': 1, 'misses': 0})
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        from .prediction_cache import PredictionCache
+
+        cache = PredictionCache(max_entries=2)
+        for image_hash in 'abc':
+            cache.put(image_hash, 'resnet18', _prediction(image_hash))
+            if image_hash == 'b':
+                cache.get('a', 'resnet18')  # 'b' becomes the least recently used
+        self.assertEqual(cache.stats()['entries_in_memory'], 2)
+        for image_hash, tier in (('a', 'memory_hits'), ('c', 'memory_hits'), ('b', 'persistent_hits')):
+            before = cache.stats()[tier]
+            self.assertEqual(cache.get(image_hash, 'resnet18')['suggested_category'], image_hash)
+            self.assertEqual(cache.stats()[tier], before + 1, image_hash)
+
+        # Size 0 keeps only the persistent tier
+        table_only = PredictionCache(max_entries=0)
+        table_only.put('d', 'resnet18', _prediction('d'))
+        self.assertEqual(table_only.get('d', 'resnet18')['suggested_category'], 'd')
+        self.assertEqual(table_only.stats()['entries_in_memory'], 0)
+
+    def test_results_are_cached_under_the_loaded_version(self):
+        from .ai_service import PyTorchAIClassificationService
+        from .prediction_cache import content_hash, prediction_cache
+
+        data = b'not really a jpeg'
+        service = PyTorchAIClassificationService('resnet18', 'bf16')
+        self.assertEqual(service.model_version, 'resnet18+bf16')
+
+        def fall_back_to_eager():
+            service.backend, service.model_version, service.model_loaded = 'eager', 'resnet18', True
+
+        # An entry left by a run with working bf16 is not this configuration's answer
+        prediction_cache.put(content_hash(data), 'resnet18+bf16', _prediction('stale'))
+        self.addCleanup(prediction_cache.clear)
+        fresh = ([{'category': 'backpack', 'confidence': 90.0}], 0.1, 'resnet18', None)
+        with mock.patch.object(service, 'load_model', fall_back_to_eager), \
+                mock.patch.object(service, '_classify_bytes', return_value=fresh) as classify, \
+                mock.patch.object(service, 'log_classification'):
+            first = service.classify_image(io.BytesIO(data))
+            second = service.classify_image(io.BytesIO(data))
+        self.assertEqual((first['suggested_category'], first['cached']), ('backpack', False))
+        self.assertEqual((second['suggested_category'], second['cached']), ('backpack', True))
+        self.assertEqual(classify.call_count, 1)
+        self.assertTrue(PredictionCacheEntry.objects.filter(content_hash=content_hash(data), model_version='resnet18')
+                        .exists())
+
+    def test_cached_crop_shares_entries_with_its_image(self):
+        import numpy as np
+
+        from .ai_service import PyTorchAIClassificationService
+        from .prediction_cache import content_hash, prediction_cache
+
+        data = b'not really a jpeg'
+        patch = np.zeros((224, 224, 3), dtype=np.uint8)
+        service = PyTorchAIClassificationService('resnet18')
+        service.model_loaded = service.load_attempted = True
+        self.addCleanup(prediction_cache.clear)
+        fresh = ([{'category': 'backpack', 'confidence': 90.0}], 0.1, 'resnet18', None)
+        with mock.patch.object(service, '_predict_with_version', return_value=fresh) as predict, \
+                mock.patch.object(service, '_classify_bytes') as classify_bytes, \
+                mock.patch.object(service, 'log_classification') as log:
+            first = service.classify_patch(patch, content_hash(data), 'lost_items/bag.jpg')
+            # The image the crop was cut from is answered from the same entry
+            second = service.classify_image(io.BytesIO(data))
+        self.assertEqual((first['suggested_category'], first['cached'], first['content_hash']),
+                         ('backpack', False, content_hash(data)))
+        self.assertIs(predict.call_args.args[0], patch)
+        log.assert_called_once_with('lost_items/bag.jpg', mock.ANY)
+        self.assertEqual((second['suggested_category'], second['cached']), ('backpack', True))
+        classify_bytes.assert_not_called()
+
+
+######################################################################################################################################################
+# Micro-batching of concurrent predictions
+######################################################################################################################################################
+class MicroBatcherTests(TestCase):
+
+    def _batcher(self, batch_fn, **kwargs):
+        from .batching import MicroBatcher
+
+        batches = []
+
+        def record(items):
+            batches.append(list(items))
+            return batch_fn(items)
+
+        return MicroBatcher(record, **kwargs), batches
+
+    def test_concurrent_submissions_share_a_batch(self):
+        batcher, batches = self._batcher(lambda items: [item * 10 for item in items], max_batch_size=4, max_wait=5)
+        futures = [batcher.submit(item) for item in range(4)]
+        # A full batch runs at once rather than after max_wait
+        self.assertEqual([future.result(timeout=2) for future in futures], [0, 10, 20, 30])
+        self.assertEqual(batches, [[0, 1, 2, 3]])
+        self.assertEqual(batcher.stats()['mean_batch_size'], 4.0)
+
+    def test_partial_batch_is_flushed_after_max_wait(self):
+        import time
+
+        batcher, batches = self._batcher(lambda items: [-item for item in items], max_batch_size=8, max_wait=0.05)
+        started = time.perf_counter()
+        futures = [batcher.submit(item) for item in (1, 2)]
+        self.assertEqual([future.result(timeout=2) for future in futures], [-1, -2])
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+        self.assertEqual(batches, [[1, 2]])
+        self.assertEqual(batcher.run(3, timeout=2), -3)
+        self.assertEqual(batches, [[1, 2], [3]])
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        def fail(items):
+            if len(items) > 1:
+                raise ValueError('out of memory')
+            return items[:0]
+
+        batcher, batches = self._batcher(fail, max_batch_size=3, max_wait=5)
+        with self.assertLogs('lost_found_app.batching', 'ERROR'):
+            futures = [batcher.submit(item) for item in 'abc']
+            for future in futures:
+                with self.assertRaisesRegex(ValueError, 'out of memory'):
+                    future.result(timeout=2)
+            self.assertEqual(batches, [['a', 'b', 'c']])
+            # A batch_fn returning the wrong number of results fails its callers too
+            batcher, batches = self._batcher(fail, max_batch_size=1)
+            with self.assertRaisesRegex(RuntimeError, '0 results for 1 items'):
+                batcher.run('d', timeout=2)
+        self.assertEqual(batches, [['d']])
+        self.assertEqual(batcher.stats()['batches_run'], 0)
+
+
+######################################################################################################################################################
+# Inference backends
+######################################################################################################################################################
+class InferenceBackendTests(TestCase):
+
+    def test_bf16_needs_native_instructions(self):
+        from . import inference_backends
+
+        for flags, supported in (({'avx2', 'avx512f', 'avx512bw', 'avx512vl'}, False),
+                                 ({'avx512f', 'avx512_bf16'}, True), ({'avx512f', 'amx_tile', 'amx_bf16'}, True),
+                                 ({'fp', 'asimd', 'bf16'}, True)):
+            with self.subTest(flags=flags), mock.patch.object(inference_backends, '_cpu_flags', return_value=flags):
+                self.assertEqual(inference_backends.bf16_supported(), supported)
+
+    def test_thread_budget(self):
+        from . import inference_backends
+
+        self.addCleanup(setattr, inference_backends, '_web_workers', inference_backends._web_workers)
+        with self.settings(AI_TORCH_INTRA_OP_THREADS=0, AI_INFERENCE_POOL_SIZE=0), \
+                mock.patch.object(inference_backends.os, 'cpu_count', return_value=8):
+            # A management command (or the inference server) uses every core
+            self.assertEqual(inference_backends.thread_budget(), (8, 1))
+            inference_backends.mark_web_worker(2)
+            self.assertEqual(inference_backends.thread_budget(), (4, 1))
+            with self.settings(AI_INFERENCE_POOL_SIZE=2):
+                self.assertEqual(inference_backends.thread_budget(), (2, 1))
+            with self.settings(AI_TORCH_INTRA_OP_THREADS=3):
+                self.assertEqual(inference_backends.thread_budget(), (3, 1))
+
+
+######################################################################################################################################################
+# Inference server protocol
+######################################################################################################################################################
+class SizedStage(FakeStage):
+    """A FakeStage for decoded images sent over the wire, told apart by their width"""
+    def _result(self, image):
+        return super()._result(f'{image.width}px')
+
+
+class InferenceServerTests(TestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from .ai_service import CascadeClassificationService
+        from .inference_server import InferenceServer
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.socket_path = os.path.join(directory, 'inference.sock')
+        self.cascade = CascadeClassificationService([
+            SizedStage('resnet18', {'8px': 95.0, '16px': 30.0}),
+            SizedStage('resnet101', {'16px': 99.0}),
+        ], threshold=60.0)
+        self.cascade.ensure_loaded()
+        self.server = InferenceServer(self.socket_path, self.cascade)
+        self.addCleanup(self.server.server_close)
+
+    def serve(self):
+        """Client end of a socketpair whose other end is served by the server's request handler"""
+        import socket
+        import threading
+
+        from .inference_server import InferenceRequestHandler
+
+        client_end, server_end = socket.socketpair()
+        client_end.settimeout(5)
+        thread = threading.Thread(target=InferenceRequestHandler, args=(server_end, None, self.server), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(client_end.close)
+        return client_end
+
+    def inference_client(self, sock, timeout=5):
+        from .inference_server import InferenceClient
+
+        client = InferenceClient(self.socket_path, timeout)
+        client._local.sock, client._local.pid = sock, os.getpid()
+        return client
+
+    def image(self, width):
+        from PIL import Image
+
+        return Image.new('RGB', (width, 4), (10, 20, 30))
+
+    def test_frames_round_trip(self):
+        import numpy as np
+
+        from .inference_server import decode_pixels, decode_results, encode_pixels, encode_results
+
+        results = [
+            ([{'category': 'sac à dos', 'confidence': 91.5}, {'category': 'purse', 'confidence': 4.0}], 0.25, 'resnet18', b'\x01\x02'),
+            ([], 0.5, 'resnet101', None),
+        ]
+        self.assertEqual(decode_results(encode_results(results)), results)
+
+        patch = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+        image, decoded = decode_pixels(encode_pixels([self.image(5), patch]))
+        self.assertEqual((image.size, image.getpixel((4, 3))), ((5, 4), (10, 20, 30)))
+        np.testing.assert_array_equal(decoded, patch)
+
+    def test_version_handshake_and_answering_stage(self):
+        from .ai_service import RemoteClassificationService
+
+        remote = RemoteClassificationService(self.socket_path)
+        remote.client = self.inference_client(self.serve())
+        self.assertTrue(remote.ensure_loaded())
+        # The client takes its labels from the server's status reply
+        self.assertEqual((remote.model_version, remote.embedding_model_version, remote.classes),
+                         ('resnet18>resnet101@60', 'resnet18', ['backpack']))
+
+        # Each image reports the stage that answered it, not the cascade's label
+        results = remote.client.classify_images([self.image(8), self.image(16)], with_embeddings=True)
+        self.assertEqual([(predictions[0]['category'], answered_by, embedding)
+                          for predictions, _, answered_by, embedding in results],
+                         [('8px by resnet18', 'resnet18', b'resnet18:8px'),
+                          ('16px by resnet101', 'resnet101', b'resnet18:16px')])
+        self.assertEqual(remote._predict_with_version(self.image(16))[2], 'resnet101')
+        self.assertEqual(self.server.status()['images'], 3)
+
+    def test_error_frame(self):
+        import json
+
+        from .inference_server import OP_STATUS, InferenceServerError
+
+        client = self.inference_client(self.serve())
+        with self.assertLogs('lost_found_app.inference_server', 'ERROR'), \
+                self.assertRaisesMessage(InferenceServerError, 'unknown opcode 99'):
+            client.request(99)
+        # The connection stays usable after an error reply
+        self.assertEqual(json.loads(client.request(OP_STATUS))['errors'], 1)
+
+    def test_retries_only_requests_never_sent(self):
+        import socket
+
+        from .inference_server import InferenceServerUnavailable
+
+        # A connection the server closed (e.g. on restart) fails the send: the request goes out again on a new one
+        stale, peer = socket.socketpair()
+        peer.close()
+        self.addCleanup(stale.close)
+        client = self.inference_client(None)
+        with mock.patch.object(client, '_connection', side_effect=[stale, self.serve()]):
+            self.assertEqual(client.status()['model_version'], 'resnet18>resnet101@60')
+
+        # A request that was sent and then timed out may still be running: it is not sent again
+        silent, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        silent.settimeout(0.05)
+        with mock.patch.object(client, '_connection', side_effect=[silent]) as connection, \
+                self.assertRaises(InferenceServerUnavailable):
+            client.status()
+        self.assertEqual(connection.call_count, 1)
+
+
+######################################################################################################################################################
+# Cursor pagination
+######################################################################################################################################################
+class PaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', user_type='admin')
+
+    def test_tampered_cursors_are_not_found(self):
+        from .pagination import _encode_cursor
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        now = timezone.now().isoformat()
+        for cursor in ({'p': '2024-02-30T10:00:00', 'k': str(uuid.uuid4())}, {'p': now, 'k': 'not-a-uuid'},
+                       {'p': now}, {'p': 'yesterday', 'k': str(uuid.uuid4())}, ['p', now]):
+            with self.subTest(cursor=cursor):
+                response = client.get('/api/api/lost-items/', {'cursor': _encode_cursor(cursor)})
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(client.get('/api/api/lost-items/', {'cursor': '%%%'}).status_code, 404)
+
+    def test_tampered_ranked_cursors_are_not_found(self):
+        import base64
+
+        from .pagination import _encode_cursor
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        LostItem.objects.create(user=self.admin, title='black bag', description='bag', lost_location='lobby')
+        url = '/api/api/lost-items/search/'
+        self.assertEqual(client.get(url, {'q': 'bag', 'cursor': _encode_cursor({'o': 0})}).status_code, 200)
+        raw = ['{"o":Infinity}', '{"o":-Infinity}', '{"o":NaN}', '{"o":1e999}', '[' * 5000 + ']' * 5000]
+        encoded = [base64.urlsafe_b64encode(text.encode()).decode() for text in raw]
+        for cursor in [_encode_cursor(data) for data in ({'o': 2.5}, {'o': 2.0}, {'o': True}, {'o': '20'}, {'o': None},
+                                                          {'o': -20}, {'o': 2 ** 63}, {}, ['o', 20], 20)] + encoded:
+            with self.subTest(cursor=cursor[:40]):
+                self.assertEqual(client.get(url, {'q': 'bag', 'cursor': cursor}).status_code, 404)
+
+
+######################################################################################################################################################
+# Classification job queue (claims, leases, retries)
+######################################################################################################################################################
+class FakeClassificationService:
+    """Answers classify_image() and classify_patch() from a list of results (an Exception is raised)"""
+    model_version = 'fake'
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.inputs = []
+
+    def classify_image(self, path, include_embedding=False):
+        self.inputs.append(path)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def classify_patch(self, patch, image_hash, source, include_embedding=False):
+        return self.classify_image(f'patch of {image_hash}', include_embedding)
+
+
+CLASSIFIED = {'suggested_category': 'backpack', 'confidence': 91.0, 'top_predictions': {}, 'content_hash': 'abc'}
+
+
+class JobQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='resident', email='resident@example.com')
+
+    def setUp(self):
+        self.item = LostItem.objects.create(user=self.user, title='bag', description='bag', lost_location='lobby')
+        # An image name without a file: classification is faked, nothing reads it
+        LostItem.objects.filter(pk=self.item.pk).update(item_image='lost_items/bag.jpg', ai_status='pending')
+        self.job = ClassificationJob.objects.create(item_type='lost', item_id=self.item.pk, max_attempts=2)
+
+    def expire_lease(self):
+        ClassificationJob.objects.filter(pk=self.job.pk).update(locked_at=timezone.now() - timedelta(minutes=10))
+
+    def test_a_job_is_claimed_once(self):
+        from .jobs import claim_jobs
+
+        [job] = claim_jobs('worker-1', limit=5)
+        self.assertEqual((job.pk, job.status, job.locked_by, job.attempts), (self.job.pk, 'running', 'worker-1', 1))
+        self.assertEqual(claim_jobs('worker-2', limit=5), [])
+
+    def test_jobs_wait_for_run_after(self):
+        from .jobs import claim_jobs
+
+        ClassificationJob.objects.filter(pk=self.job.pk).update(run_after=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(claim_jobs('worker-1'), [])
+
+    def test_success(self):
+        from .jobs import claim_jobs, process_job
+
+        [job] = claim_jobs('worker-1')
+        self.assertTrue(process_job(job, service=FakeClassificationService(CLASSIFIED)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.locked_at), ('done', '', None))
+        item = LostItem.objects.get(pk=self.item.pk)
+        self.assertEqual((item.ai_status, item.ai_suggested_category, item.ai_model_version), ('done', 'backpack', 'fake'))
+
+    def test_classified_from_the_cached_crop(self):
+        import shutil
+        import tempfile
+
+        import numpy as np
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        from .jobs import claim_jobs, process_job
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        buffer = io.BytesIO()
+        np.save(buffer, np.zeros((224, 224, 3), dtype=np.uint8))
+        patch = default_storage.save('derivatives/patch224.npy', ContentFile(buffer.getvalue()))
+        master = os.path.join(media_root, 'lost_items', 'bag.jpg')
+
+        for derivatives, expected in (({'source_hash': 'abc', 'patch': patch}, 'patch of abc'),
+                                      # A crop missing on disk falls back to the master
+                                      ({'source_hash': 'abc', 'patch': 'derivatives/gone.npy'}, master),
+                                      ({}, master)):
+            with self.subTest(derivatives=derivatives):
+                LostItem.objects.filter(pk=self.item.pk).update(image_derivatives=derivatives)
+                ClassificationJob.objects.filter(pk=self.job.pk).update(status='queued', attempts=0)
+                [job] = claim_jobs('worker-1')
+                service = FakeClassificationService(CLASSIFIED)
+                self.assertTrue(process_job(job, service=service))
+                self.assertEqual(service.inputs, [expected])
+
+    def test_expired_lease_is_requeued_for_another_worker(self):
+        from .jobs import claim_jobs, release_stale_jobs
+
+        claim_jobs('worker-1')
+        self.assertEqual(release_stale_jobs(lease_seconds=300), 0)
+        self.expire_lease()
+        self.assertEqual(release_stale_jobs(lease_seconds=300), 1)
+        [job] = claim_jobs('worker-2')
+        self.assertEqual((job.locked_by, job.attempts), ('worker-2', 2))
+
+    def test_slow_worker_does_not_overwrite_the_new_claim(self):
+        from .jobs import claim_jobs, process_job, release_stale_jobs
+
+        [slow] = claim_jobs('worker-1')
+        self.expire_lease()
+        release_stale_jobs(lease_seconds=300)
+        [current] = claim_jobs('worker-2')
+        # The first worker finishes (or fails) after losing its lease
+        with self.assertLogs('lost_found_app.jobs', 'WARNING') as logs:
+            process_job(slow, service=FakeClassificationService(CLASSIFIED))
+            process_job(slow, service=FakeClassificationService(RuntimeError('timeout')))
+        self.assertEqual(len([line for line in logs.output if 'lost its lease' in line]), 2)
+        job = ClassificationJob.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.locked_by, job.locked_at), ('running', 'worker-2', current.locked_at))
+
+    def test_image_replaced_during_classification(self):
+        from .jobs import claim_jobs, process_job
+
+        test = self
+
+        class ReplacingService(FakeClassificationService):
+            """The owner uploads another image while the first one is on the model"""
+            def classify_image(self, path, include_embedding=False):
+                item = LostItem.objects.get(pk=test.item.pk)
+                item.item_image = 'lost_items/other-bag.jpg'
+                with test.captureOnCommitCallbacks(execute=True):
+                    item.save()
+                return super().classify_image(path, include_embedding)
+
+        for outcome in (CLASSIFIED, RuntimeError('timeout')):
+            with self.subTest(outcome=outcome):
+                LostItem.objects.filter(pk=self.item.pk).update(item_image='lost_items/bag.jpg', ai_status='pending')
+                [job] = claim_jobs('worker-1')
+                self.assertFalse(process_job(job, service=ReplacingService(outcome)))
+                # Nothing of the old image's result lands on the new one, and the job runs again for it
+                item = LostItem.objects.get(pk=self.item.pk)
+                self.assertEqual((item.ai_status, item.ai_suggested_category), ('pending', ''))
+                self.assertEqual(ClassificationJob.objects.filter(item_id=self.item.pk).count(), 1)
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts, job.last_error),
+                                 ('queued', 0, 'Image replaced during classification'))
+
+        [job] = claim_jobs('worker-1')
+        self.assertTrue(process_job(job, service=FakeClassificationService(CLASSIFIED)))
+        item = LostItem.objects.get(pk=self.item.pk)
+        self.assertEqual((item.item_image.name, item.ai_status), ('lost_items/other-bag.jpg', 'done'))
+
+    def test_retry_with_backoff_then_dead_letter(self):
+        from .jobs import claim_jobs, process_job
+
+        [job] = claim_jobs('worker-1')
+        with self.settings(AI_JOB_RETRY_BACKOFF_SECONDS=30), self.assertLogs('lost_found_app.jobs', 'WARNING'):
+            self.assertFalse(process_job(job, service=FakeClassificationService(RuntimeError('timeout'))))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error, job.locked_by), ('queued', 'timeout', ''))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+        self.assertEqual(claim_jobs('worker-1'), [])
+
+        ClassificationJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        [job] = claim_jobs('worker-1')
+        with self.assertLogs('lost_found_app.jobs', 'ERROR'):
+            self.assertFalse(process_job(job, service=FakeClassificationService({'error': 'unreadable image'})))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('dead', 2, 'unreadable image'))
+        self.assertEqual(LostItem.objects.get(pk=self.item.pk).ai_status, 'failed')
+
+
+######################################################################################################################################################
+# Resumable bulk reclassification
+######################################################################################################################################################
+class ReclassifyItemsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='resident', email='resident@example.com')
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        import numpy as np
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.checkpoint = os.path.join(media_root, 'checkpoint.json')
+
+        buffer = io.BytesIO()
+        np.save(buffer, np.zeros((224, 224, 3), dtype=np.uint8))
+        patch = default_storage.save('derivatives/patch224.npy', ContentFile(buffer.getvalue()))
+        self.items = []
+        for i in range(5):
+            item = LostItem.objects.create(user=self.user, title=f'item {i}', description='bag', lost_location='lobby')
+            # The source hash tells the fake service which item an input came from
+            LostItem.objects.filter(pk=item.pk).update(
+                item_image=f'lost_items/{i}.jpg', image_derivatives={'source_hash': str(item.pk), 'patch': patch}
+            )
+            self.items.append(item)
+        self.items.sort(key=lambda item: item.pk)
+
+    class Service:
+        model_version = 'resnet18'
+
+        def __init__(self, fail_on_batch=None):
+            self.fail_on_batch = fail_on_batch
+            self.batches = 0
+            self.classified = []
+
+        def ensure_loaded(self):
+            return True
+
+        def predict_batch(self, images, with_embeddings=False):
+            self.batches += 1
+            if self.batches == self.fail_on_batch:
+                raise RuntimeError('interrupted')
+            return [([{'category': 'backpack', 'confidence': 90.0}], 0.0, None) for _ in images]
+
+        def build_result(self, predictions, processing_time, model_version, image_hash, embedding):
+            self.classified.append(image_hash)
+            return {'suggested_category': predictions[0]['category'], 'confidence': predictions[0]['confidence'],
+                    'top_predictions': {'predictions': predictions}, 'content_hash': image_hash, 'embedding': embedding}
+
+    def reclassify(self, service, **options):
+        from django.core.management import call_command
+
+        with mock.patch('lost_found_app.ai_service.get_ai_service', return_value=service):
+            call_command('reclassify_items', item_type='lost', batch_size=1, chunk_size=2, workers=1,
+                         checkpoint=self.checkpoint, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def write_checkpoint(self, model_version, last_pk):
+        import json
+
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'model_version': model_version, 'last_pk': {'lost': str(last_pk)}}, f)
+
+    def test_interrupted_run_resumes_from_its_checkpoint(self):
+        import json
+
+        # The third forward pass fails after the first chunk of two items was written and checkpointed
+        with self.assertRaisesMessage(RuntimeError, 'interrupted'):
+            self.reclassify(self.Service(fail_on_batch=3))
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f), {'model_version': 'resnet18', 'last_pk': {'lost': str(self.items[1].pk)}})
+        self.assertEqual(LostItem.objects.filter(ai_status='done').count(), 2)
+
+        service = self.Service()
+        self.reclassify(service)
+        self.assertEqual(service.classified, [str(item.pk) for item in self.items[2:]])
+        self.assertEqual(set(LostItem.objects.values_list('ai_status', 'ai_model_version')), {('done', 'resnet18')})
+        # A finished run leaves nothing to resume
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_ignored_on_restart_or_model_change(self):
+        for model_version, options in (('resnet18', {'restart': True}), ('resnet101', {})):
+            with self.subTest(model_version=model_version, **options):
+                self.write_checkpoint(model_version, self.items[3].pk)
+                service = self.Service()
+                self.reclassify(service, **options)
+                self.assertEqual(service.classified, [str(item.pk) for item in self.items])
+                self.assertFalse(os.path.exists(self.checkpoint))
+
+
+######################################################################################################################################################
+# Prometheus metrics endpoint
+######################################################################################################################################################
+class MetricsEndpointTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', user_type='admin')
+        cls.resident = User.objects.create(username='resident', email='resident@example.com')
+
+    def get(self, user=None, token=None):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        if user is not None:
+            token = str(RefreshToken.for_user(user).access_token)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.get('/api/api/metrics/', **headers).status_code
+
+    def test_staff_only_without_a_token(self):
+        with self.settings(AI_METRICS_TOKEN=''):
+            self.assertEqual(self.get(), 403)
+            self.assertEqual(self.get(token='guess'), 403)
+            self.assertEqual(self.get(self.resident), 403)
+            self.assertEqual(self.get(self.admin), 200)
+
+    def test_token(self):
+        with self.settings(AI_METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.get(token='scrape-secret'), 200)
+            self.assertEqual(self.get(token='guess'), 403)
+            self.assertEqual(self.get(token='scrape-secreT'), 403)
+            self.assertEqual(self.get(token='scrape-sécret'), 403)
+            self.assertEqual(self.get(), 403)
+
+
+######################################################################################################################################################
+# Buffered classification log, daily rollups and archives
+######################################################################################################################################################
+class ClassificationLogTests(TestCase):
+
+    day = date(2026, 3, 14)
+
+    def record(self, hour, category='backpack', confidence=80.0, latency=0.1, model_version='resnet18', day=None):
+        from datetime import datetime
+
+        created_at = timezone.make_aware(datetime.combine(day or self.day, datetime.min.time()) + timedelta(hours=hour))
+        return AIClassificationLog(image_path='sha256:abc', predicted_category=category, confidence_score=confidence,
+                                   top_predictions={}, model_version=model_version, processing_time=latency,
+                                   created_at=created_at)
+
+    def test_nearest_rank_percentiles(self):
+        from .metrics import percentiles
+
+        self.assertEqual(percentiles([4, 1, 3, 2], (25, 50, 75, 99, 100)), {25: 1, 50: 2, 75: 3, 99: 4, 100: 4})
+        self.assertEqual(percentiles(range(1, 101), (0, 50, 95, 99)), {0: 1, 50: 50, 95: 95, 99: 99})
+        self.assertEqual(percentiles([]), {50: 0.0, 95: 0.0, 99: 0.0})
+
+    def test_flush(self):
+        from .classification_log import ClassificationLogBuffer
+
+        buffer = ClassificationLogBuffer(max_size=10, flush_interval=60)
+        for hour in range(3):
+            buffer.add(self.record(hour))
+        self.assertEqual(AIClassificationLog.objects.count(), 0)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(AIClassificationLog.objects.count(), 3)
+        self.assertEqual(buffer.flush(), 0)
+
+        # Records are kept while the database is unavailable, up to max_pending
+        buffer.max_pending = 2
+        buffer.add(self.record(3))
+        buffer.add(self.record(4))
+        buffer.add(self.record(5))
+        with mock.patch.object(AIClassificationLog.objects, 'bulk_create', side_effect=Exception('database is locked')), \
+                self.assertLogs('lost_found_app.classification_log', 'WARNING'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.stats()['records_written'], 5)
+        self.assertEqual(buffer.stats()['records_dropped'], 1)
+        self.assertEqual(AIClassificationLog.objects.count(), 5)
+
+    def test_flush_thread(self):
+        import threading
+
+        from .classification_log import ClassificationLogBuffer
+
+        for max_size, flush_interval, added in ((2, 60, 2), (100, 0.05, 1)):
+            # A full buffer wakes the thread at once; otherwise it flushes every flush_interval
+            with self.subTest(max_size=max_size, flush_interval=flush_interval):
+                buffer = ClassificationLogBuffer(max_size=max_size, flush_interval=flush_interval)
+                flushed = threading.Event()
+                with mock.patch.object(buffer, 'flush', side_effect=flushed.set):
+                    for hour in range(added):
+                        buffer.add(self.record(hour))
+                    self.assertTrue(flushed.wait(5))
+                    # The thread outlives the test: leave it nothing to write from outside the test transaction
+                    buffer._records.clear()
+                self.assertEqual(buffer._thread.name, 'classification-log-writer')
+
+    def test_rollup_day(self):
+        from .classification_log import rollup_day
+        from .models import AIClassificationDailyRollup
+
+        latencies = [0.4, 0.1, 0.3, 0.2]
+        AIClassificationLog.objects.bulk_create(
+            [self.record(hour, confidence=60.0 + 10 * hour, latency=latency) for hour, latency in enumerate(latencies)]
+            + [self.record(5, category='wallet', model_version='resnet101'),
+               # The next day is not part of this day's rollup
+               self.record(1, day=self.day + timedelta(days=1))]
+        )
+        for _ in range(2):
+            # Rolling a day up again replaces its rows
+            self.assertEqual(rollup_day(self.day), 2)
+        rollups = {(r.model_version, r.predicted_category): r for r in AIClassificationDailyRollup.objects.filter(date=self.day)}
+        self.assertEqual(set(rollups), {('resnet18', 'backpack'), ('resnet101', 'wallet')})
+        backpack = rollups[('resnet18', 'backpack')]
+        self.assertEqual((backpack.count, backpack.mean_confidence), (4, 75.0))
+        self.assertEqual((backpack.latency_p50, backpack.latency_p95, backpack.latency_p99), (0.2, 0.4, 0.4))
+        self.assertEqual(rollups[('resnet101', 'wallet')].count, 1)
+        self.assertEqual(AIClassificationDailyRollup.objects.count(), 2)
+
+    def test_archive_day(self):
+        import gzip
+        import json
+        import shutil
+        import tempfile
+
+        from .classification_log import archive_day
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        AIClassificationLog.objects.bulk_create(
+            [self.record(hour, latency=hour / 10) for hour in (9, 2)] + [self.record(1, day=self.day + timedelta(days=1))]
+        )
+        rows, path = archive_day(self.day, directory)
+        self.assertEqual((rows, os.path.basename(path)), (2, 'ai_classification_log-2026-03-14.ndjson.gz'))
+        with gzip.open(path, 'rt') as f:
+            archived = [json.loads(line) for line in f]
+        # Oldest first, one JSON object per line
+        self.assertEqual([row['created_at'] for row in archived], ['2026-03-14T02:00:00+00:00', '2026-03-14T09:00:00+00:00'])
+        self.assertEqual([row['processing_time'] for row in archived], [0.2, 0.9])
+        self.assertEqual(set(archived[0]), {'id', 'created_at', 'image_path', 'predicted_category', 'confidence_score',
+                                            'top_predictions', 'model_version', 'processing_time'})
+        # The archived rows left the table; the next day's did not
+        self.assertEqual(list(AIClassificationLog.objects.values_list('created_at__date', flat=True)),
+                         [self.day + timedelta(days=1)])
+        self.assertEqual(archive_day(self.day, directory), (0, None))
+        self.assertEqual(os.listdir(directory), [os.path.basename(path)])
+
+
+######################################################################################################################################################
+# Image derivatives written at upload
+######################################################################################################################################################
+def _jpeg_upload(name='photo.jpg', color=(200, 40, 40)):
+    from io import BytesIO
+
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageDerivativeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='resident', email='resident@example.com')
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def stored(self, derivatives):
+        from django.core.files.storage import default_storage
+
+        from .image_derivatives import derivative_paths
+
+        paths = list(derivative_paths(derivatives))
+        self.assertTrue(paths)
+        return [default_storage.exists(path) for path in paths]
+
+    def test_failed_save_leaves_no_derivatives(self):
+        from django.db import IntegrityError, transaction
+
+        from . import image_derivatives
+
+        write = image_derivatives.write_derivatives
+        written = {}
+
+        def write_and_remember(*args):
+            written.update(write(*args))
+            return written
+
+        # No title: the INSERT fails after the upload was ingested
+        item = LostItem(user=self.user, title=None, description='bag', lost_location='lobby', item_image=_jpeg_upload())
+        with mock.patch.object(image_derivatives, 'write_derivatives', write_and_remember), \
+                self.assertRaises(IntegrityError), transaction.atomic():
+            item.save()
+        self.assertFalse(any(self.stored(written)))
+        self.assertEqual(item.image_derivatives, {})
 
-# Create your tests here.
+    def test_replaced_derivatives_are_deleted_on_commit(self):
+        item = LostItem.objects.create(user=self.user, title='bag', description='bag', lost_location='lobby',
+                                       item_image=_jpeg_upload())
+        first = item.image_derivatives
+        item.item_image = _jpeg_upload('other.jpg', (20, 20, 200))
+        with self.captureOnCommitCallbacks() as callbacks:
+            item.save()
+            self.assertTrue(all(self.stored(first)))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(self.stored(first)))
+        self.assertTrue(all(self.stored(item.image_derivatives)))
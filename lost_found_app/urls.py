@@ -23,6 +23,7 @@ urlpatterns = [
     path('api/classify-image/', views.classify_image, name='classify_image'),
     path('api/real-time-classify/', views.real_time_classify, name='real_time_classify'),
     path('api/ai-service-status/', views.ai_service_status, name='ai_service_status'),
+    path('api/metrics/', views.ai_metrics, name='ai_metrics'),
 #####################################################################################################################################################
     path('api/profile/', UserProfileView.as_view(), name='user-profile'),
     path('profile/change-password/', UpdatePasswordView.as_view(), name='change-password'),
@@ -0,0 +1,365 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+from .embeddings import decode_embedding
+
+logger = logging.getLogger(__name__)
+
+# Rows are kept as float32 even though the DB stores float16: widening float16 costs
+# several times more than the matrix-vector product itself on every query
+VECTOR_DTYPE = np.float32
+ID_DTYPE = 'S32'           # uuid hex; b'' marks a free slot
+SEARCH_CHUNK_ROWS = 65536  # rows scored per matmul
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_PARTITION = 64
+
+
+def _as_key(item_id):
+    return uuid.UUID(str(item_id)).hex.encode()
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def train_partitions(vectors, partitions, seed=0):
+    """Spherical k-means centroids (unit length) over a sample of ``vectors``"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), partitions * KMEANS_SAMPLE_PER_PARTITION)
+    sample = _normalise(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, partitions, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for p in range(partitions):
+            members = sample[assignment == p]
+            if len(members):
+                centroids[p] = members.sum(axis=0)
+        centroids = _normalise(centroids)
+    return centroids
+######################################################################################################################################################
+######################################################################################################################################################
+class VectorIndex:
+    """
+    Nearest-neighbour index over unit-length image embeddings.
+
+    Rows live in raw memory-mapped files under ``directory`` so every worker
+    process shares one page-cached copy:
+
+        <name>.vectors   float32 [capacity, dim]
+        <name>.ids       uuid hex per row (empty = free slot)
+        <name>.assign    int32 coarse partition per row (-1 = none)
+        <name>.centroids float32 [partitions, dim] (coarse mode only)
+        <name>.meta.json dim, size, capacity, model_version, partitions
+
+    Items are added and removed one row at a time; removed rows are reused.
+    Without partitions a search is one brute-force cosine pass over all
+    rows. With partitions (see ``rebuild``) only the ``nprobe`` partitions
+    whose centroids are closest to the query are scanned.
+    Writers serialise on an flock'd lock file; readers pick up other
+    processes' writes when the meta file changes.
+    """
+    def __init__(self, name, directory=None, nprobe=None):
+        self.name = name
+        self.directory = str(directory or getattr(settings, 'AI_VECTOR_INDEX_DIR', settings.BASE_DIR / 'vector_index'))
+        self.nprobe = nprobe or getattr(settings, 'AI_VECTOR_INDEX_NPROBE', 8)
+        self.meta = None
+        self.vectors = None
+        self.ids = None
+        self.assign = None
+        self.centroids = None
+        self._meta_mtime = None
+        # uuid hex -> row and the freed rows, built on the first write after (re)mapping
+        self._rows = None
+        self._free = None
+        self._lock = threading.Lock()
+
+    def _path(self, suffix):
+        return os.path.join(self.directory, f'{self.name}.{suffix}')
+
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self._path('lock'), 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _refresh(self):
+        """(Re)map the files when another process (or this one) changed them"""
+        try:
+            stat = os.stat(self._path('meta.json'))
+        except FileNotFoundError:
+            self.meta = None
+            self._meta_mtime = None
+            self._rows = self._free = None
+            return False
+        # The meta file is always replaced, never rewritten, so a new inode means new state
+        mtime = (stat.st_ino, stat.st_mtime_ns)
+        if mtime == self._meta_mtime:
+            return True
+
+        with open(self._path('meta.json')) as f:
+            meta = json.load(f)
+        self._map(meta)
+        self._rows = self._free = None
+        self._meta_mtime = mtime
+        return True
+
+    def _slots(self):
+        """
+        The key -> row map and free rows, so a write does not scan every id.
+        Rebuilt only after the files were remapped (another process wrote or
+        rebuilt the index); this instance's own writes keep them current.
+        """
+        if self._rows is None:
+            ids = self.ids[:self.meta['size']].tolist()
+            self._rows = {key: row for row, key in enumerate(ids) if key}
+            self._free = [row for row, key in enumerate(ids) if not key]
+        return self._rows, self._free
+
+    def _map(self, meta):
+        capacity, dim = meta['capacity'], meta['dim']
+        self.vectors = np.memmap(self._path('vectors'), dtype=VECTOR_DTYPE, mode='r+', shape=(capacity, dim))
+        self.ids = np.memmap(self._path('ids'), dtype=ID_DTYPE, mode='r+', shape=(capacity,))
+        self.assign = np.memmap(self._path('assign'), dtype=np.int32, mode='r+', shape=(capacity,))
+        self.centroids = np.load(self._path('centroids.npy')) if meta['partitions'] else None
+        self.meta = meta
+
+    def _write_meta(self):
+        tmp_path = self._path('meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._path('meta.json'))
+        # Written under the lock from this instance's state, so the maps are already current
+        stat = os.stat(self._path('meta.json'))
+        self._meta_mtime = (stat.st_ino, stat.st_mtime_ns)
+
+    def _create(self, dim, model_version, capacity=1024, partitions=0):
+        self.meta = {
+            'dim': dim, 'size': 0, 'capacity': 0,
+            'model_version': model_version, 'partitions': partitions,
+        }
+        for suffix in ('vectors', 'ids', 'assign'):
+            open(self._path(suffix), 'wb').close()
+        self._rows, self._free = {}, []
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """Extend the row files in place; existing rows keep their offsets"""
+        dim = self.meta['dim']
+        old_capacity = self.meta['capacity']
+        with open(self._path('vectors'), 'r+b') as f:
+            f.truncate(capacity * dim * np.dtype(VECTOR_DTYPE).itemsize)
+        with open(self._path('ids'), 'r+b') as f:
+            f.truncate(capacity * np.dtype(ID_DTYPE).itemsize)
+        with open(self._path('assign'), 'r+b') as f:
+            f.truncate(capacity * 4)
+        self.meta['capacity'] = capacity
+        self._write_meta()
+        self._map(self.meta)
+        self.assign[old_capacity:] = -1
+
+    def add(self, item_id, embedding, model_version):
+        """Insert or replace one item's embedding (packed float16 bytes or a vector)"""
+        vector = embedding if isinstance(embedding, np.ndarray) else decode_embedding(embedding)
+        key = _as_key(item_id)
+        with self._lock:
+            lock_file = self._write_lock()
+            try:
+                if not self._refresh():
+                    self._create(len(vector), model_version)
+                if self.meta['model_version'] != model_version or self.meta['dim'] != len(vector):
+                    logger.warning(
+                        f"Not indexing {item_id} in '{self.name}': embedding from {model_version}, "
+                        f"index built for {self.meta['model_version']} (run build_vector_index)"
+                    )
+                    return False
+
+                rows, free = self._slots()
+                row = rows.get(key)
+                if row is None:
+                    if free:
+                        row = free.pop()
+                    else:
+                        size = self.meta['size']
+                        if size >= self.meta['capacity']:
+                            self._grow(self.meta['capacity'] * 2)
+                        row = size
+                        self.meta['size'] = size + 1
+                    rows[key] = row
+
+                self.vectors[row] = vector
+                self.ids[row] = key
+                self.assign[row] = int(np.argmax(self.centroids @ vector)) if self.centroids is not None else -1
+                self._write_meta()
+                return True
+            finally:
+                lock_file.close()
+
+    def remove(self, item_id):
+        """Free an item's row (a no-op when it is not indexed)"""
+        key = _as_key(item_id)
+        with self._lock:
+            lock_file = self._write_lock()
+            try:
+                if not self._refresh():
+                    return False
+                rows, free = self._slots()
+                row = rows.pop(key, None)
+                if row is None:
+                    return False
+                self.ids[row] = b''
+                self.vectors[row] = 0
+                self.assign[row] = -1
+                free.append(row)
+                self._write_meta()
+                return True
+            finally:
+                lock_file.close()
+
+    def rebuild(self, entries, dim, model_version, partitions=0):
+        """
+        Replace the whole index with ``entries`` (an iterable of
+        ``(item_id, packed_embedding)``), training ``partitions`` coarse
+        centroids when asked for. The new files are written under a staging
+        name and renamed into place, so processes still mapping the old
+        files keep reading them until they notice the new meta file.
+        """
+        staging = VectorIndex(f'{self.name}.staging', self.directory)
+        with self._lock:
+            lock_file = self._write_lock()
+            try:
+                staging._create(dim, model_version)
+                size = 0
+                for item_id, embedding in entries:
+                    if size >= staging.meta['capacity']:
+                        staging._grow(staging.meta['capacity'] * 2)
+                    staging.vectors[size] = embedding if isinstance(embedding, np.ndarray) else decode_embedding(embedding)
+                    staging.ids[size] = _as_key(item_id)
+                    size += 1
+                staging.meta['size'] = size
+
+                partitions = min(partitions, size)
+                if partitions > 1:
+                    centroids = train_partitions(staging.vectors[:size], partitions)
+                    np.save(staging._path('centroids.npy'), centroids)
+                    for start in range(0, size, SEARCH_CHUNK_ROWS):
+                        chunk = staging.vectors[start:min(start + SEARCH_CHUNK_ROWS, size)]
+                        staging.assign[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+                    staging.meta['partitions'] = partitions
+                staging.vectors.flush()
+                staging.ids.flush()
+                staging.assign.flush()
+                staging._write_meta()
+
+                suffixes = ['vectors', 'ids', 'assign'] + (['centroids.npy'] if partitions > 1 else [])
+                for suffix in suffixes + ['meta.json']:
+                    os.replace(staging._path(suffix), self._path(suffix))
+                self._refresh()
+                return size
+            finally:
+                lock_file.close()
+
+    def search(self, query, k=10):
+        """Top-``k`` ``(item_id, cosine_similarity)`` pairs for a packed or NumPy query vector"""
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries, k=10):
+        """
+        search() for several query vectors at once: one pass over the rows
+        scores them all (a matrix product instead of one scan per query).
+        Returns one top-``k`` list per query.
+        """
+        queries = _normalise([query if isinstance(query, np.ndarray) else decode_embedding(query) for query in queries])
+        with self._lock:
+            if not len(queries) or not self._refresh() or self.meta['dim'] != queries.shape[1]:
+                return [[] for _ in queries]
+            size = self.meta['size']
+            ids = self.ids[:size]
+
+            if self.centroids is not None:
+                nprobe = min(self.nprobe, len(self.centroids))
+                probed = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+                rows = np.flatnonzero(np.isin(self.assign[:size], probed))
+            else:
+                rows = None
+
+            scores = []
+            total = size if rows is None else len(rows)
+            for start in range(0, total, SEARCH_CHUNK_ROWS):
+                if rows is None:
+                    chunk = self.vectors[start:min(start + SEARCH_CHUNK_ROWS, size)]
+                else:
+                    chunk = self.vectors[rows[start:start + SEARCH_CHUNK_ROWS]]
+                scores.append(chunk @ queries.T)
+            if not scores:
+                return [[] for _ in queries]
+            scores = np.concatenate(scores)
+            candidate_ids = ids if rows is None else ids[rows]
+            scores[candidate_ids == b''] = -np.inf
+            if rows is not None:
+                # Each query only sees the rows of its own probed partitions
+                assigned = self.assign[rows]
+                for column, partitions in enumerate(probed):
+                    scores[~np.isin(assigned, partitions), column] = -np.inf
+
+            k = min(k, len(scores))
+            results = []
+            for column in scores.T:
+                top = np.argpartition(-column, k - 1)[:k]
+                top = top[np.argsort(-column[top])]
+                results.append([
+                    (str(uuid.UUID(candidate_ids[i].decode())), float(column[i]))
+                    for i in top if column[i] != -np.inf
+                ])
+            return results
+
+    @property
+    def model_version(self):
+        """Embedding model the indexed vectors came from ('' while the index is empty)"""
+        with self._lock:
+            return self.meta['model_version'] if self._refresh() else ''
+
+    def stats(self):
+        with self._lock:
+            if not self._refresh():
+                return {'name': self.name, 'size': 0}
+            return {
+                'name': self.name,
+                'size': int(np.count_nonzero(self.ids[:self.meta['size']] != b'')),
+                'dim': self.meta['dim'],
+                'model_version': self.meta['model_version'],
+                'partitions': self.meta['partitions'],
+                'nprobe': self.nprobe if self.meta['partitions'] else None,
+            }
+######################################################################################################################################################
+######################################################################################################################################################
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(item_type):
+    """Shared per-process index for 'lost' or 'found' items"""
+    with _indexes_lock:
+        if item_type not in _indexes:
+            _indexes[item_type] = VectorIndex(f'{item_type}_items')
+        return _indexes[item_type]
+
+
+def sync_item_embedding(item_type, item_id, embedding, model_version):
+    """Mirror an item's stored embedding into its index (removing the item when it has none)"""
+    try:
+        index = get_vector_index(item_type)
+        if embedding is not None and model_version:
+            index.add(item_id, embedding, model_version)
+        else:
+            index.remove(item_id)
+    except Exception as e:
+        logger.warning(f"Vector index update failed for {item_type} item {item_id}: {str(e)}")
@@ -2,14 +2,24 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import transaction
 from django.db.models import Q
+import hmac
 import time
+import uuid
 from django.shortcuts import render
+from django.http import HttpResponse
+from django.conf import settings
 from django.contrib import messages
 from django.db.models import Count
 import logging
 from .serializers import *
-from .ai_service import pytorch_ai_service
+from .ai_service import pytorch_ai_service, model_registry
+from .prediction_cache import prediction_cache
+from .metrics import metrics
+from .classification_log import classification_log
+from .jobs import classification_fields
+from .pagination import RankedPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import generics, permissions, status
 ######################################################################################################################################################
@@ -150,6 +160,55 @@ class CategoryViewSet(viewsets.ModelViewSet):  # changed here ✅
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 ###########################################################################################################################################################
+# Ranked lost<->found matches (shared by both item viewsets)
+###########################################################################################################################################################
+def ranked_matches_response(view, item, item_type):
+    """One page of find_matches() results; only the items on the page are loaded in full and serialised"""
+    from .matching import SIDES, find_matches
+    
+    matches = find_matches(item, item_type)
+    paginator = RankedPagination()
+    page = paginator.paginate_list(matches, view.request)
+    
+    target_type = 'found' if item_type == 'lost' else 'lost'
+    target_model = SIDES[target_type]['model']
+    serializer_class = FoundItemSerializer if target_type == 'found' else LostItemSerializer
+    items = serializer_class.eager_load(target_model.objects.all()).in_bulk([candidate.pk for candidate, _, _ in page])
+    
+    data = [
+        {
+            'score': round(score, 4),
+            'breakdown': breakdown,
+            'item': serializer_class(items[candidate.pk], context={'request': view.request}).data,
+        }
+        for candidate, score, breakdown in page if candidate.pk in items
+    ]
+    return paginator.get_paginated_response(data)
+###########################################################################################################################################################
+# Full-text item search (shared by both item viewsets)
+###########################################################################################################################################################
+def search_response(view, request):
+    """
+    One page of the items matching ?q= ranked by BM25, each with its search_rank
+    and a search_snippet highlighting the matched words (both null without FTS5)
+    """
+    from .search import search_items
+    
+    query = request.query_params.get('q', '')
+    category = request.query_params.get('category', '')
+    
+    queryset = view.get_queryset()
+    if category:
+        queryset = queryset.filter(category__name__iexact=category)
+    
+    paginator = RankedPagination(max_results=getattr(settings, 'SEARCH_MAX_RESULTS', 100))
+    results = paginator.paginate(lambda offset, limit: search_items(queryset, query, limit, offset), request)
+    data = view.get_serializer([item for item, _, _ in results], many=True).data
+    for entry, (_, rank, snippet) in zip(data, results):
+        entry['search_rank'] = round(rank, 4) if rank is not None else None
+        entry['search_snippet'] = snippet
+    return paginator.get_paginated_response(data)
+###########################################################################################################################################################
 #############################################################################################################################################################
 class LostItemViewSet(viewsets.ModelViewSet):
     serializer_class = LostItemSerializer
@@ -158,28 +217,21 @@ class LostItemViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'admin':
-            return LostItem.objects.all()
-        return LostItem.objects.filter(user=user)
+            return LostItemSerializer.eager_load(LostItem.objects.all())
+        return LostItemSerializer.eager_load(LostItem.objects.filter(user=user))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        query = request.query_params.get('q', '')
-        category = request.query_params.get('category', '')
-        
-        queryset = self.get_queryset().filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(lost_location__icontains=query)
-        )
-        
-        if category:
-            queryset = queryset.filter(category__name__iexact=category)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        """Full-text search (?q=, optional ?category= and ?limit=), best matches first"""
+        return search_response(self, request)
+    
+    @action(detail=True, methods=['get'])
+    def matches(self, request, pk=None):
+        """Open found items ranked by match score against this lost item (paginated, with score breakdown)"""
+        return ranked_matches_response(self, self.get_object(), 'lost')
     
     @action(detail=True, methods=['post'])
     def classify_image(self, request, pk=None):
@@ -191,19 +243,18 @@ class LostItemViewSet(viewsets.ModelViewSet):
                           status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            result = pytorch_ai_service.classify_image(lost_item.item_image.path)
+            result = pytorch_ai_service.classify_image(lost_item.item_image.path, include_embedding=True)
             
             # Update the lost item with new AI data
             if result and 'error' not in result:
-                lost_item.ai_suggested_category = result.get('suggested_category', '')
-                lost_item.ai_confidence = result.get('confidence', 0.0)
-                lost_item.ai_top_predictions = result.get('top_predictions', {})
+                for field, value in classification_fields(result, pytorch_ai_service.model_version).items():
+                    setattr(lost_item, field, value)
                 lost_item.save()
                 
                 serializer = self.get_serializer(lost_item)
                 return Response({
                     'message': 'Image classified successfully',
-                    'ai_results': result,
+                    'ai_results': {key: value for key, value in result.items() if key != 'embedding'},
                     'item': serializer.data
                 })
             else:
@@ -223,40 +274,57 @@ class FoundItemViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'admin':
-            return FoundItem.objects.all()
-        return FoundItem.objects.filter(user=user)
+            return FoundItemSerializer.eager_load(FoundItem.objects.all())
+        return FoundItemSerializer.eager_load(FoundItem.objects.filter(user=user))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        query = request.query_params.get('q', '')
-        category = request.query_params.get('category', '')
-        
-        queryset = self.get_queryset().filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(found_location__icontains=query)
-        )
-        
-        if category:
-            queryset = queryset.filter(category__name__iexact=category)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        """Full-text search (?q=, optional ?category= and ?limit=), best matches first"""
+        return search_response(self, request)
+    
+    @action(detail=True, methods=['get'])
+    def matches(self, request, pk=None):
+        """Open lost items ranked by match score against this found item (paginated, with score breakdown)"""
+        return ranked_matches_response(self, self.get_object(), 'found')
     
     @action(detail=True, methods=['get'])
     def potential_matches(self, request, pk=None):
+        """One page of the open lost items ranked by image similarity to this found item (the best 100)"""
         found_item = self.get_object()
-        # Simple matching logic based on category and keywords
-        lost_items = LostItem.objects.filter(
-            category=found_item.category,
-            status='lost'
-        ).exclude(user=found_item.user)
         
-        serializer = LostItemSerializer(lost_items, many=True)
-        return Response(serializer.data)
+        from .vector_index import get_vector_index
+        
+        candidates = LostItemSerializer.eager_load(LostItem.objects.filter(status='lost').exclude(user=found_item.user))
+        index = get_vector_index('lost')
+        paginator = RankedPagination(max_results=100)
+        if found_item.image_embedding is not None and index.model_version == found_item.embedding_model_version:
+            def nearest(offset, limit):
+                # Over-fetch from the index, then drop neighbours that are closed or belong to the finder
+                wanted = offset + limit
+                fetch = wanted * 4
+                while True:
+                    hits = index.search(found_item.image_embedding, k=fetch)
+                    items = candidates.in_bulk([item_id for item_id, _ in hits])
+                    matches = [(items[uuid.UUID(item_id)], score) for item_id, score in hits if uuid.UUID(item_id) in items]
+                    if len(matches) >= wanted or len(hits) < fetch:
+                        break
+                    fetch *= 4
+                return matches[offset:wanted]
+            
+            data = []
+            for lost_item, score in paginator.paginate(nearest, request):
+                item_data = LostItemSerializer(lost_item, context={'request': request}).data
+                item_data['similarity'] = round(score, 4)
+                data.append(item_data)
+            return paginator.get_paginated_response(data)
+        
+        # No usable embedding yet: fall back to matching on category
+        lost_items = paginator.paginate_list(candidates.filter(category=found_item.category), request)
+        serializer = LostItemSerializer(lost_items, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def classify_image(self, request, pk=None):
@@ -268,19 +336,18 @@ class FoundItemViewSet(viewsets.ModelViewSet):
                           status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            result = pytorch_ai_service.classify_image(found_item.item_image.path)
+            result = pytorch_ai_service.classify_image(found_item.item_image.path, include_embedding=True)
             
             # Update the found item with new AI data
             if result and 'error' not in result:
-                found_item.ai_suggested_category = result.get('suggested_category', '')
-                found_item.ai_confidence = result.get('confidence', 0.0)
-                found_item.ai_top_predictions = result.get('top_predictions', {})
+                for field, value in classification_fields(result, pytorch_ai_service.model_version).items():
+                    setattr(found_item, field, value)
                 found_item.save()
                 
                 serializer = self.get_serializer(found_item)
                 return Response({
                     'message': 'Image classified successfully',
-                    'ai_results': result,
+                    'ai_results': {key: value for key, value in result.items() if key != 'embedding'},
                     'item': serializer.data
                 })
             else:
@@ -300,8 +367,8 @@ class ClaimViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'admin':
-            return Claim.objects.all()
-        return Claim.objects.filter(user=user)
+            return ClaimSerializer.eager_load(Claim.objects.all())
+        return ClaimSerializer.eager_load(Claim.objects.filter(user=user))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -366,15 +433,27 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        from .counters import adjust_counter
+        
+        with transaction.atomic():
+            marked = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+            adjust_counter(User, request.user.pk, 'unread_notification_count', -marked)
         return Response({'status': 'all notifications marked as read'})
+    
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """The unread badge: the counter maintained on the user row, no COUNT query"""
+        return Response({'unread_count': request.user.unread_notification_count})
 ###########################################################################################################################################################
 #############################################################################################################################################################
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def classify_image(request):
     """Standalone image classification endpoint"""
-    serializer = AIClassificationRequestSerializer(data=request.data)
+    # Parsing the multipart body reads (and for large files spools) the upload
+    with metrics.timer('upload'):
+        data = request.data
+    serializer = AIClassificationRequestSerializer(data=data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -405,7 +484,9 @@ def classify_image(request):
 @permission_classes([permissions.IsAuthenticated])
 def real_time_classify(request):
     """Real-time classification endpoint (similar to Streamlit app)"""
-    serializer = RealTimeClassificationSerializer(data=request.data)
+    with metrics.timer('upload'):
+        data = request.data
+    serializer = RealTimeClassificationSerializer(data=data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -441,15 +522,73 @@ def real_time_classify(request):
 @permission_classes([permissions.IsAuthenticated])
 def ai_service_status(request):
     """Check AI service status"""
+    from .vector_index import get_vector_index
+    
     status_info = {
         'model_loaded': pytorch_ai_service.model_loaded,
+        'load_attempted': pytorch_ai_service.load_attempted,
         'model_version': pytorch_ai_service.model_version,
         'classes_loaded': len(pytorch_ai_service.classes) > 0,
-        'service_ready': pytorch_ai_service.model_loaded and len(pytorch_ai_service.classes) > 0
+        'service_ready': pytorch_ai_service.model_loaded and len(pytorch_ai_service.classes) > 0,
+        'model_load_time': round(pytorch_ai_service.load_time, 4),
+        'model_memory_mb': round(pytorch_ai_service.parameter_bytes / (1024 * 1024), 2),
+        'registry': model_registry.status(),
+        'batching': pytorch_ai_service.batcher.stats() if pytorch_ai_service.batcher else None,
+        'prediction_cache': prediction_cache.stats(),
+        'cascade': pytorch_ai_service.cascade_stats(),
+        'inference_server': pytorch_ai_service.server_status(),
+        'metrics': metrics.summary(),
+        'classification_log': classification_log.stats(),
+        'vector_index': {item_type: get_vector_index(item_type).stats() for item_type in ('lost', 'found')},
     }
     return Response(status_info)
 ###########################################################################################################################################################
 #############################################################################################################################################################
+def _is_staff_request(request):
+    """A staff user signed in to the admin or presenting a valid JWT access token"""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    return bool(authenticated and authenticated[0].is_staff)
+
+
+def ai_metrics(request):
+    """
+    Prometheus text metrics of this worker process: per-stage timing
+    histograms, classification counts and model load times.
+    Protected by a bearer token when AI_METRICS_TOKEN is set, and limited
+    to staff users otherwise.
+    """
+    token = getattr(settings, 'AI_METRICS_TOKEN', '')
+    if token:
+        # Constant-time, so response timing does not reveal how much of a guess was right
+        allowed = hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    else:
+        allowed = _is_staff_request(request)
+    if not allowed:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+
+    models = model_registry.status()['models']
+    gauges = [
+        ('ai_model_load_seconds', 'Time taken to load each model in this process.',
+         [({'model': info['model_version']}, info['load_time']) for info in models if info['load_attempted']]),
+        ('ai_model_loaded', 'Whether each model loaded successfully.',
+         [({'model': info['model_version']}, int(info['model_loaded'])) for info in models if info['load_attempted']]),
+    ]
+    if pytorch_ai_service.batcher is not None:
+        gauges.append(('ai_batch_queue_depth', 'Images waiting for a batched forward pass.',
+                       [({}, pytorch_ai_service.batcher.queue_depth())]))
+    return HttpResponse(metrics.prometheus(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+###########################################################################################################################################################
+#############################################################################################################################################################
 def home(request):
     """
     View function for the home page of the Lost and Found Application.
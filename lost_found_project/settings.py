@@ -126,7 +126,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Cursor pagination on (created_at, id): no COUNT(*) (unless ?count=true) and no OFFSET on deep pages
+    'DEFAULT_PAGINATION_CLASS': 'lost_found_app.pagination.KeysetPagination',
     'PAGE_SIZE': 20
 }
 
@@ -150,4 +151,83 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only in development
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
\ No newline at end of file
+DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
+# Most results the lost/found search actions return across all pages (FTS5 ranked on SQLite; see lost_found_app/search.py)
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=100, cast=int)
+# Item image ingest: uploads are stored without metadata, with the longest side capped at
+# IMAGE_MASTER_MAX_SIDE, plus WebP/JPEG thumbnails (longest side, px) and the model's 224x224 input
+# crop under MEDIA_ROOT/IMAGE_DERIVATIVES_DIR (backfill existing items: manage.py build_image_derivatives)
+IMAGE_INGEST_DERIVATIVES = config('IMAGE_INGEST_DERIVATIVES', default=True, cast=bool)
+IMAGE_MASTER_MAX_SIDE = config('IMAGE_MASTER_MAX_SIDE', default=2048, cast=int)
+IMAGE_MASTER_QUALITY = config('IMAGE_MASTER_QUALITY', default=88, cast=int)
+IMAGE_THUMBNAIL_SIZES = config('IMAGE_THUMBNAIL_SIZES', default='160,480')
+IMAGE_DERIVATIVES_DIR = config('IMAGE_DERIVATIVES_DIR', default='derivatives')
+
+# AI classification service
+# Torchvision model name loaded once per process by the model registry
+AI_MODEL_VERSION = config('AI_MODEL_VERSION', default='resnet101')
+# Micro-batching of concurrent predictions: off by default (1), since each prediction then waits up to
+# AI_BATCH_MAX_WAIT_MS for others to join its batch; set e.g. 8 on servers that see concurrent uploads
+AI_BATCH_MAX_SIZE = config('AI_BATCH_MAX_SIZE', default=1, cast=int)
+AI_BATCH_MAX_WAIT_MS = config('AI_BATCH_MAX_WAIT_MS', default=10, cast=float)
+# Background classification jobs (run: python manage.py run_classification_worker)
+AI_ASYNC_CLASSIFICATION = config('AI_ASYNC_CLASSIFICATION', default=True, cast=bool)
+AI_JOB_MAX_ATTEMPTS = config('AI_JOB_MAX_ATTEMPTS', default=3, cast=int)
+AI_JOB_RETRY_BACKOFF_SECONDS = config('AI_JOB_RETRY_BACKOFF_SECONDS', default=30, cast=int)
+# In-process LRU size of the content-hash prediction cache (0 keeps only the DB tier)
+AI_PREDICTION_CACHE_SIZE = config('AI_PREDICTION_CACHE_SIZE', default=1024, cast=int)
+# Load the model when a web worker boots (wsgi.py) rather than on the first classification
+AI_WARMUP_ON_STARTUP = config('AI_WARMUP_ON_STARTUP', default=False, cast=bool)
+# Model weights are read from AI_MODEL_WEIGHTS_DIR/<model>.pth (memory-mapped, shared by all workers).
+# Create them once with: python manage.py export_model_weights
+AI_MODEL_WEIGHTS_DIR = config('AI_MODEL_WEIGHTS_DIR', default=str(BASE_DIR / 'ai_models'))
+AI_ALLOW_WEIGHT_DOWNLOAD = config('AI_ALLOW_WEIGHT_DOWNLOAD', default=False, cast=bool)
+# Load weights in the gunicorn master before forking workers (see gunicorn.conf.py)
+AI_PRELOAD_MODEL = config('AI_PRELOAD_MODEL', default=False, cast=bool)
+# CPU inference backend: eager, torchscript, channels_last, int8_dynamic, int8_static or bf16
+AI_INFERENCE_BACKEND = config('AI_INFERENCE_BACKEND', default='eager')
+# Local images used to calibrate int8_static (compare backends with: manage.py evaluate_backends)
+AI_CALIBRATION_DIR = config('AI_CALIBRATION_DIR', default=str(MEDIA_ROOT))
+AI_CALIBRATION_MAX_IMAGES = config('AI_CALIBRATION_MAX_IMAGES', default=32, cast=int)
+# Model cascade, cheapest first (e.g. "resnet18,resnet101"): a stage answers when its top-1
+# confidence reaches AI_CASCADE_THRESHOLD percent, otherwise the image goes to the next stage
+AI_MODEL_CASCADE = config('AI_MODEL_CASCADE', default='')
+AI_CASCADE_THRESHOLD = config('AI_CASCADE_THRESHOLD', default=60.0, cast=float)
+# torch threads per inference process. AI_TORCH_INTRA_OP_THREADS=0 divides the cores between the
+# gunicorn web workers (and their pool processes) so they do not oversubscribe the CPU, while management
+# commands use every core; AI_MAX_CONCURRENT_FORWARD bounds the forward passes running at once in one process
+AI_TORCH_INTRA_OP_THREADS = config('AI_TORCH_INTRA_OP_THREADS', default=0, cast=int)
+AI_TORCH_INTER_OP_THREADS = config('AI_TORCH_INTER_OP_THREADS', default=1, cast=int)
+AI_MAX_CONCURRENT_FORWARD = config('AI_MAX_CONCURRENT_FORWARD', default=1, cast=int)
+# Run forward passes in N dedicated inference processes per web worker (0 runs them in the worker).
+# Compare settings with: manage.py load_test_inference
+AI_INFERENCE_POOL_SIZE = config('AI_INFERENCE_POOL_SIZE', default=0, cast=int)
+# Standalone inference server (run: python manage.py run_inference_server). When set, web workers and
+# commands send images to this Unix socket instead of loading the model themselves
+AI_INFERENCE_SERVER_SOCKET = config('AI_INFERENCE_SERVER_SOCKET', default='')
+AI_INFERENCE_SERVER_TIMEOUT = config('AI_INFERENCE_SERVER_TIMEOUT', default=30, cast=float)
+# Bearer token required by the Prometheus endpoint /api/metrics/ (empty: staff users only)
+AI_METRICS_TOKEN = config('AI_METRICS_TOKEN', default='')
+# AIClassificationLog rows are buffered and bulk-written every AI_LOG_FLUSH_SECONDS or AI_LOG_BUFFER_SIZE records.
+# Rows older than AI_LOG_RETENTION_DAYS are rolled up per day and moved to AI_LOG_ARCHIVE_DIR as gzipped
+# NDJSON (run daily: python manage.py archive_classification_logs)
+AI_LOG_BUFFER_SIZE = config('AI_LOG_BUFFER_SIZE', default=200, cast=int)
+AI_LOG_FLUSH_SECONDS = config('AI_LOG_FLUSH_SECONDS', default=5.0, cast=float)
+AI_LOG_RETENTION_DAYS = config('AI_LOG_RETENTION_DAYS', default=30, cast=int)
+AI_LOG_ARCHIVE_DIR = config('AI_LOG_ARCHIVE_DIR', default=str(BASE_DIR / 'log_archive'))
+# Image similarity index used by potential_matches (rebuild with: manage.py build_vector_index).
+# Built with --partitions N, searches scan only the AI_VECTOR_INDEX_NPROBE closest partitions.
+AI_VECTOR_INDEX_DIR = config('AI_VECTOR_INDEX_DIR', default=str(BASE_DIR / 'vector_index'))
+AI_VECTOR_INDEX_NPROBE = config('AI_VECTOR_INDEX_NPROBE', default=8, cast=int)
+# Lost<->found matching (the matches endpoints): candidates must fall within MATCH_DATE_WINDOW_DAYS,
+# at most MATCH_MAX_CANDIDATES are scored and matches below MATCH_MIN_SCORE (0-1) are dropped
+MATCH_DATE_WINDOW_DAYS = config('MATCH_DATE_WINDOW_DAYS', default=90, cast=int)
+MATCH_MAX_CANDIDATES = config('MATCH_MAX_CANDIDATES', default=500, cast=int)
+MATCH_MIN_SCORE = config('MATCH_MIN_SCORE', default=0.15, cast=float)
+MATCH_IMAGE_CANDIDATES = config('MATCH_IMAGE_CANDIDATES', default=50, cast=int)
+# Background match discovery (run_classification_worker, or: manage.py discover_matches --loop):
+# owners of lost items get one match_found notification per pair scoring at least MATCH_NOTIFY_MIN_SCORE
+MATCH_NOTIFY_MIN_SCORE = config('MATCH_NOTIFY_MIN_SCORE', default=0.5, cast=float)
+MATCH_NOTIFY_MAX_PER_ITEM = config('MATCH_NOTIFY_MAX_PER_ITEM', default=5, cast=int)
+MATCH_DISCOVERY_BATCH_SIZE = config('MATCH_DISCOVERY_BATCH_SIZE', default=100, cast=int)
+MATCH_DISCOVERY_MAX_WAIT_SECONDS = config('MATCH_DISCOVERY_MAX_WAIT_SECONDS', default=600, cast=int)
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lost_found_project.settings')
 
 application = get_wsgi_application()
+
+# Opt-in: load the classification model while the worker boots instead of on the first request.
+# With AI_PRELOAD_MODEL (gunicorn preload_app) this runs once in the master before fork.
+from django.conf import settings
+
+if settings.AI_WARMUP_ON_STARTUP or settings.AI_PRELOAD_MODEL:
+    from lost_found_app.ai_service import warm_up
+
+    warm_up(run_inference=not settings.AI_PRELOAD_MODEL)